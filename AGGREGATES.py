@@ -0,0 +1,83 @@
+import argparse
+
+# Everything the admin dashboard shows, read from the *_STATS tables that the
+# triggers in static/AGGREGATES.sql keep current, in one round trip
+DASHBOARD_QUERY = """
+    SELECT 'MOVIE', m.MOVIE_ID, m.MOVIE_NAME, m.RDATE, COALESCE(s.REVENUE, 0)
+    FROM MOVIES m LEFT JOIN MOVIE_STATS s ON s.MOVIE_ID = m.MOVIE_ID
+    UNION ALL
+    SELECT 'THEATER', t.THEATER_ID, t.THEATER_NAME, t.LOCATION, COALESCE(s.REVENUE, 0)
+    FROM THEATERS t LEFT JOIN THEATER_STATS s ON s.THEATER_ID = t.THEATER_ID
+    UNION ALL
+    SELECT 'USERS', COUNT(*), NULL, NULL, NULL FROM USER_STATS
+"""
+
+# The same totals recomputed from BOOKINGS, for verify()
+RECOMPUTE_QUERIES = {
+    'MOVIE_STATS': """SELECT movie_id, COUNT(*), SUM(no_of_elite_seats), SUM(no_of_premium_seats),
+                             SUM(seat_total)
+                      FROM BOOKINGS GROUP BY movie_id""",
+    'THEATER_STATS': """SELECT theater_id, COUNT(*), SUM(no_of_elite_seats), SUM(no_of_premium_seats),
+                               SUM(seat_total)
+                        FROM BOOKINGS GROUP BY theater_id""",
+    'USER_STATS': "SELECT user_id, COUNT(*) FROM BOOKINGS GROUP BY user_id",
+}
+STORED_QUERIES = {
+    'MOVIE_STATS': "SELECT MOVIE_ID, BOOKINGS, ELITE_SEATS, PREMIUM_SEATS, REVENUE FROM MOVIE_STATS",
+    'THEATER_STATS': "SELECT THEATER_ID, BOOKINGS, ELITE_SEATS, PREMIUM_SEATS, REVENUE FROM THEATER_STATS",
+    'USER_STATS': "SELECT USER_ID, BOOKINGS FROM USER_STATS",
+}
+
+
+def load_dashboard(cursor):
+    # Returns (movie_detail, theater_detail, movie_count, theater_count, user_count)
+    # shaped like the old calculate_*_revenue / calculate_*_count / active_users results
+    cursor.execute(DASHBOARD_QUERY)
+    movie_detail, theater_detail, active = [], [], 0
+    for kind, key, name, extra, revenue in cursor.fetchall():
+        if kind == 'MOVIE':
+            movie_detail.append((key, name, extra, revenue))
+        elif kind == 'THEATER':
+            theater_detail.append((key, name, extra, revenue))
+        else:
+            active = key
+    return movie_detail, theater_detail, len(movie_detail), len(theater_detail), 'Total active users: %s' % active
+
+
+def rebuild(cursor):
+    cursor.callproc('rebuild_dashboard_stats')
+
+
+def verify(cursor):
+    # Rows whose stored totals differ from a fresh GROUP BY over BOOKINGS,
+    # as (table, key, stored, expected); an empty list means the tables are exact
+    mismatches = []
+    for table, query in RECOMPUTE_QUERIES.items():
+        cursor.execute(query)
+        expected = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+        cursor.execute(STORED_QUERIES[table])
+        stored = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+        for key in sorted(expected.keys() | stored.keys()):
+            if expected.get(key) != stored.get(key):
+                mismatches.append((table, key, stored.get(key), expected.get(key)))
+    return mismatches
+
+
+if __name__ == '__main__':
+    from USER_BACK import db_pool
+
+    parser = argparse.ArgumentParser(description="Rebuild or verify the admin dashboard aggregate tables")
+    parser.add_argument('mode', choices=['rebuild', 'verify'])
+    args = parser.parse_args()
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        if args.mode == 'rebuild':
+            rebuild(cursor)
+            conn.commit()
+            print("dashboard stats rebuilt")
+        else:
+            problems = verify(cursor)
+            for table, key, stored, expected in problems:
+                print("%s %s: stored %s, expected %s" % (table, key, stored, expected))
+            print("%d mismatched rows" % len(problems))
+            raise SystemExit(1 if problems else 0)
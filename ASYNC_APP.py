@@ -0,0 +1,200 @@
+# ASGI serving mode. The read-heavy browsing routes (all_movies, all_theaters,
+# avail_theater, mt_movies, tm_movies and the seat map) run as coroutines on one
+# event loop over an aiomysql pool, so a slow query no longer ties up a thread
+# per request. Every other route is served by the Flask app in USER_BACK through
+# a WSGI bridge that runs it on the loop's thread pool.
+#
+# Both apps share USER_BACK's caches (rendered pages included), hold store,
+# session store and request metrics, so a user can move between async and sync
+# routes freely and /metrics covers both. Optional dependencies:
+#
+#   pip install quart aiomysql hypercorn
+#   hypercorn --workers 1 ASYNC_APP:app
+#
+# BENCH_ASYNC.py compares this mode with the threaded sync server.
+from datetime import date
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, abort, render_template, request, session
+from quart.sessions import SessionInterface
+from werkzeug.exceptions import HTTPException
+
+import USER_BACK
+from ASYNC_DB import AsyncConnectionPool
+from CATALOG import AsyncCatalog, THEATERS_QUERY
+from DB_METRICS import init_async_app
+from GEO_INDEX import TheaterGeoIndex
+from SCHEDULE import AsyncScheduleService, WINDOW_DAYS, day_label, parse_day
+from SEAT_HOLDS import show_key
+
+async_app = Quart(__name__, template_folder=USER_BACK.app.template_folder, static_folder=USER_BACK.app.static_folder)
+async_app.secret_key = USER_BACK.app.secret_key
+async_app.permanent_session_lifetime = USER_BACK.app.permanent_session_lifetime
+async_app.jinja_env.filters['zip_lists'] = USER_BACK.zip_lists
+
+class SharedSessionInterface(SessionInterface):
+    # USER_BACK's server-side session store, behind Quart's async interface
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def open_session(self, app, request):
+        return self.inner.open_session(app, request)
+
+    async def save_session(self, app, session, response):
+        self.inner.save_session(app, session, response)
+
+async_app.session_interface = SharedSessionInterface(USER_BACK.app.session_interface)
+
+# Queries, DB time and Server-Timing per route, into the sync app's metrics
+init_async_app(async_app, USER_BACK.request_metrics)
+
+# Async counterpart of USER_BACK.db_pool; the sync routes keep using that one
+db_pool = AsyncConnectionPool(USER_BACK.db_config, size=10, timeout=5.0, max_idle=30.0)
+
+# Same cache entries as the sync catalog, so admin invalidations apply to both
+catalog = AsyncCatalog(USER_BACK.catalog_cache, db_pool)
+schedule = AsyncScheduleService(catalog)
+
+def hold_owner():
+    return session.get('id') or session.get('email')
+
+def details(*extra):
+    return (session.get('name'), session.get('email'), session.get('phone'), session.get('location')) + extra
+
+async def theater_geo_index():
+    # Built once per process and shared with the sync theater write routes, which keep it current
+    if USER_BACK.geo_index is None:
+        rows = await db_pool.query(THEATERS_QUERY)
+        if USER_BACK.geo_index is None:
+            USER_BACK.geo_index = TheaterGeoIndex(rows)
+    return USER_BACK.geo_index
+
+@async_app.after_serving
+async def close_pool():
+    await db_pool.close()
+
+# The browsing pages go through USER_BACK.pages under the same keys as the sync
+# routes, with the same ETags and 304s
+
+@async_app.route('/all_movies')
+async def all_movies():
+    async def render(details):
+        movie = await catalog.movies()
+        return await render_template('ALL_MOVIES.html', details = details, movies = movie)
+
+    key = ('ALL_MOVIES', USER_BACK.catalog_cache.version('MOVIES'), date.today())
+    return await USER_BACK.pages.arespond(key, render, details())
+
+@async_app.route('/all_theaters')
+async def theaters():
+    location = session.get('location')
+
+    async def render(details):
+        index = await theater_geo_index()
+        return await render_template('ALL_THEATERS.html', theaters=index.nearest(location), details = details)
+
+    key = ('ALL_THEATERS', USER_BACK.catalog_cache.version('THEATERS'), location, date.today())
+    return await USER_BACK.pages.arespond(key, render, details())
+
+@async_app.route('/avail_theater/<int:movie_id>', methods=['GET'])
+async def avail_theater(movie_id):
+    session['selected_movie'] = movie_id
+    records = await db_pool.query("""
+    SELECT DISTINCT t.theater_id
+    FROM THEATERS t
+    JOIN TM tm ON t.theater_id = tm.theater_id
+    WHERE tm.movie_id = %s
+    """, (movie_id, ))
+    index = await theater_geo_index()
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    radius = request.args.get('km', type=float)
+    per_page = USER_BACK.THEATERS_PER_PAGE
+    rendering_theaters, has_more = index.search(session.get('location'), {record[0] for record in records}, radius_km = radius, offset = (page - 1) * per_page, limit = per_page)
+    return await render_template('PARTIAL_THEATERS.html', theaters=rendering_theaters, details = details(movie_id), page = page, has_more = has_more, radius = radius)
+
+def schedule_window():
+    # USER_BACK.schedule_window() on Quart's request
+    try:
+        start = date.fromisoformat(request.args.get('start', ''))
+    except ValueError:
+        start = None
+    days = min(max(request.args.get('days', WINDOW_DAYS, type=int), 1), 31)
+    return start, days
+
+async def schedule_page(theater_id, detail):
+    # MOVIES.html for a theater's window of days, like USER_BACK.schedule_page
+    start, days = schedule_window()
+    today = date.today()
+
+    async def render(details):
+        return await render_template('MOVIES.html', days = await schedule.window(theater_id, start, days), today = today, theater_id = theater_id, details=details)
+
+    key = ('MOVIES', USER_BACK.catalog_cache.version('MOVIES', 'TM'), theater_id, start, days, today)
+    return await USER_BACK.pages.arespond(key, render, detail)
+
+@async_app.route('/mt_movies/<int:theater_id>')
+async def mt_movies(theater_id):
+    session['selected_theater'] = theater_id
+    return await schedule_page(theater_id, details(session.get('selected_movie')))
+
+@async_app.route('/tm_movies/<int:theater_id>/<int:movie_id>')
+async def tm_movies(theater_id, movie_id):
+    session['selected_theater'] = theater_id
+    return await schedule_page(theater_id, details(movie_id))
+
+@async_app.route('/bookings/<int:theater_id>/<int:movie_id>/<int:screen_id>/<string:time>/<string:day>')
+async def booking(theater_id, movie_id, screen_id, time, day):
+    ti = theater_id
+    try:
+        show_day = parse_day(day)
+    except ValueError:
+        # Neither an ISO date nor a day label: an old or hand-edited link
+        abort(404)
+    session['mv_s'] = movie_id
+    session['th_s'] = ti
+    session['sc_s'] = screen_id
+    session['ti_s'] = time
+    session['da_s'] = day_label(show_day)
+    date_obj = show_day.isoformat()
+    session['date_iso'] = date_obj
+
+    show = show_key(ti, screen_id, date_obj, time)
+    movie_row = await catalog.movie(movie_id)
+    theater_row = await catalog.theater(ti)
+    screen_row = await catalog.screen(ti, screen_id)
+    row = movie_row and theater_row and screen_row
+    movie = [movie_row[0:3]] if row else []
+    theater = [theater_row] if row else []
+    seat = [screen_row[2:4]] if row else []
+
+    async def load_booked():
+        seat_query = "SELECT SEATS FROM SEATS_BOOKED WHERE THEATER_ID = %s AND SCREEN_ID = %s AND DAY = %s AND SHOW_TIME = %s"
+        return [booked[0] for booked in await db_pool.query(seat_query, (ti, screen_id, date_obj, time))]
+    layout = (seat[0][0], seat[0][1]) if seat else (0, 0)
+    booked = await USER_BACK.occupancy.aget(show, layout, load_booked)
+    booked.update(USER_BACK.hold_store.held(show, exclude_owner = hold_owner()))
+    conflict = request.args.get('conflict')
+
+    return await render_template('BOOKINGS.html', movies = movie, theaters = theater, screen  = screen_id, times =time, days = session['da_s'], dates_obj=date_obj, seats=seat, details=details(), occupancy = booked.pack(), conflict = conflict)
+
+@async_app.route('/async_pool_stats')
+async def async_pool_stats():
+    return db_pool.metrics()
+
+wsgi_app = AsyncioWSGIMiddleware(USER_BACK.app)
+routes = async_app.url_map.bind('localhost')
+
+def is_async(scope):
+    try:
+        routes.match(scope['path'], scope.get('method', 'GET'))
+    except HTTPException:
+        return False
+    return True
+
+async def app(scope, receive, send):
+    # Lifespan events and the routes above go to Quart, the rest to Flask
+    if scope['type'] == 'lifespan' or (scope['type'] == 'http' and is_async(scope)):
+        await async_app(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import aiomysql
+
+from DB_METRICS import record_query
+from DB_POOL import PoolTimeout
+
+
+class AsyncConnectionPool:
+    # aiomysql pool with the interface of DB_POOL.ConnectionPool, for the async app.
+    # `config` is a mysql.connector style dict (host, user, password, database).
+    # The pool is created on first use so that it belongs to the running event loop.
+    def __init__(self, config, size=10, timeout=5.0, max_idle=30.0):
+        self.config = config
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._pool = None
+        self._creating = None
+        self._stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+        }
+
+    async def _get_pool(self):
+        if self._pool is None:
+            if self._creating is None:
+                self._creating = asyncio.ensure_future(aiomysql.create_pool(
+                    host=self.config.get('host', 'localhost'),
+                    port=self.config.get('port', 3306),
+                    user=self.config['user'],
+                    password=self.config.get('password', ''),
+                    db=self.config['database'],
+                    minsize=0,
+                    maxsize=self.size,
+                    pool_recycle=self.max_idle,
+                    autocommit=False))
+            self._pool = await self._creating
+        return self._pool
+
+    @asynccontextmanager
+    async def connection(self):
+        # Rolls back and returns the connection on the way out, like ConnectionPool.connection()
+        pool = await self._get_pool()
+        started = time.monotonic()
+        try:
+            conn = await asyncio.wait_for(pool.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._stats['timeouts'] += 1
+            raise PoolTimeout("no database connection free after %.1fs" % self.timeout)
+        waited = time.monotonic() - started
+        self._stats['checkouts'] += 1
+        self._stats['wait_total'] += waited
+        self._stats['wait_max'] = max(self._stats['wait_max'], waited)
+        try:
+            yield conn
+        except BaseException:
+            await conn.rollback()
+            raise
+        finally:
+            pool.release(conn)
+
+    async def query(self, query, params=()):
+        # Timed and charged to the current request like DB_METRICS.InstrumentedCursor
+        async with self.connection() as conn:
+            async with conn.cursor() as cursor:
+                started = time.perf_counter()
+                try:
+                    await cursor.execute(query, params)
+                    rows = await cursor.fetchall()
+                finally:
+                    record_query(query, time.perf_counter() - started)
+            # Reads end their transaction so the next one sees fresh data
+            await conn.rollback()
+        return [tuple(row) for row in rows]
+
+    def metrics(self):
+        stats = dict(self._stats)
+        stats['size'] = self.size
+        if self._pool is not None:
+            stats['open'] = self._pool.size
+            stats['idle'] = self._pool.freesize
+            stats['in_use'] = self._pool.size - self._pool.freesize
+        stats['wait_avg'] = stats['wait_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        return stats
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+            self._creating = None
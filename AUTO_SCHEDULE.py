@@ -0,0 +1,154 @@
+import argparse
+import csv
+import heapq
+import math
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from SCHEDULE_VALIDATOR import Show, occupied, parse_time, show_row, stored_days
+from TM_BULK import FIELDS
+
+CITY_SCREENS_QUERY = """SELECT s.THEATER_ID, s.SCREEN_ID FROM SCREENS s JOIN THEATERS t ON t.THEATER_ID = s.THEATER_ID
+WHERE t.LOCATION = %s ORDER BY s.THEATER_ID, s.SCREEN_ID"""
+THEATER_SCREENS_QUERY = "SELECT THEATER_ID, SCREEN_ID FROM SCREENS WHERE THEATER_ID IN (%s) ORDER BY THEATER_ID, SCREEN_ID"
+
+
+def parse_hour(value):
+    # Like parse_time, but also takes '24:00' for a closing time of midnight
+    if str(value).strip() in ('24:00', '24:00:00'):
+        return timedelta(hours=24)
+    return parse_time(value)
+
+
+def round_up(value, step):
+    return value if value % step == timedelta(0) else value + step - value % step
+
+
+class AutoScheduler:
+    # Builds a TM schedule that keeps the gap rule of SCHEDULE_VALIDATOR (run time
+    # rounded up to whole hours, then GAP) around new and stored shows alike.
+    #
+    # Each day is packed greedily, earliest-free screen first: a heap of
+    # (free at, screen) hands out the next slot, which goes to the movie furthest
+    # behind its target that still ends by closing time and clears the stored
+    # shows of that screen. Back-to-back placement from the earliest free time is
+    # the interval-scheduling greedy, so every screen carries as many shows as
+    # the movies allow. Cost is O(shows * (log screens + movies)) per day.
+    def __init__(self, catalog, opening=timedelta(hours=9), closing=timedelta(hours=24), step=timedelta(minutes=15)):
+        self.catalog = catalog
+        self.opening = opening
+        self.closing = closing
+        self.step = step
+
+    def pack_day(self, day, screens, targets, lengths, stored):
+        # Shows for one day; `targets` is {movie_id: shows across all screens},
+        # `lengths` {movie_id: (screen time, screen time + gap)}
+        remaining = dict(targets)
+        # Hardest to place first: furthest behind, then longest
+        rank = lambda movie_id: (-remaining[movie_id] / targets[movie_id], -lengths[movie_id][0], movie_id)
+        heap = [(round_up(self.opening, self.step), i) for i in range(len(screens))]
+        shows = []
+        while heap and any(remaining.values()):
+            start, i = heapq.heappop(heap)
+            theater_id, screen_id = screens[i]
+            day_shows = stored.get((theater_id, screen_id, day))
+            blocked = None
+            for movie_id in sorted((m for m, left in remaining.items() if left), key=rank):
+                length, busy = lengths[movie_id]
+                if start + length > self.closing:
+                    continue
+                entry = day_shows.blocking(start, start + busy) if day_shows else None
+                if entry is not None:
+                    blocked = entry[1] if blocked is None else min(blocked, entry[1])
+                    continue
+                shows.append(Show(theater_id, movie_id, screen_id, day, start))
+                remaining[movie_id] -= 1
+                heapq.heappush(heap, (round_up(start + busy, self.step), i))
+                break
+            else:
+                # Nothing fits here: wait out a stored show, or the screen is done
+                if blocked is not None:
+                    heapq.heappush(heap, (round_up(blocked, self.step), i))
+        return shows
+
+    def plan(self, cursor, screens, targets, start, days):
+        # Shows for `days` days from `start` on `screens` ((theater_id, screen_id)
+        # pairs), aiming at `targets` {movie_id: shows per day} and working around
+        # the shows already in TM. Raises ValueError for an unknown movie.
+        movies = self.catalog.movie_index()
+        lengths = {}
+        for movie_id in targets:
+            if movie_id not in movies:
+                raise ValueError("movie %s doesn't exist" % movie_id)
+            run_time = movies[movie_id][6]
+            lengths[movie_id] = (timedelta(hours=math.ceil((run_time or 0) / 60)), occupied(run_time))
+        dates = [start + timedelta(days=n) for n in range(days)]
+        stored = stored_days(cursor, movies, {theater_id: set(dates) for theater_id, _ in screens})
+        shows = []
+        for day in dates:
+            shows.extend(self.pack_day(day, screens, targets, lengths, stored))
+        shows.sort(key=lambda show: (show.theater_id, show.show_date, show.screen_id, show.show_time))
+        return shows
+
+
+def shortfall(shows, targets, days):
+    # {movie_id: shows short of target} over the whole plan
+    placed = defaultdict(int)
+    for show in shows:
+        placed[show.movie_id] += 1
+    return {movie_id: target * days - placed[movie_id] for movie_id, target in targets.items() if placed[movie_id] < target * days}
+
+
+def target(value):
+    movie_id, _, count = value.partition('=')
+    return int(movie_id), int(count or 1)
+
+
+if __name__ == '__main__':
+    from TM_BULK import import_schedule
+    from USER_BACK import catalog, catalog_cache, db_pool, schedule_validator
+
+    parser = argparse.ArgumentParser(description="Build a conflict-free TM schedule for a date range")
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument('--location', help="every screen of the theaters in this city")
+    where.add_argument('--theater', type=int, action='append', help="a theater whose screens to fill (repeatable)")
+    parser.add_argument('--movie', type=target, action='append', required=True, metavar='MOVIE_ID=SHOWS', help="shows per day across the screens (repeatable)")
+    parser.add_argument('--start', type=date.fromisoformat, default=date.today() + timedelta(days=1), help="first day (default: tomorrow)")
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--open', type=parse_hour, default=timedelta(hours=9), help="first show time (default 09:00)")
+    parser.add_argument('--close', type=parse_hour, default=timedelta(hours=24), help="last show ends by (default 24:00)")
+    parser.add_argument('--step', type=int, default=15, help="show times are multiples of this many minutes")
+    parser.add_argument('--commit', action='store_true', help="insert the shows (through the schedule validator) instead of printing them")
+    args = parser.parse_args()
+
+    targets = dict(args.movie)
+    scheduler = AutoScheduler(catalog, opening=args.open, closing=args.close, step=timedelta(minutes=args.step))
+    started = time.perf_counter()
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        if args.location:
+            cursor.execute(CITY_SCREENS_QUERY, (args.location,))
+        else:
+            cursor.execute(THEATER_SCREENS_QUERY % ', '.join(['%s'] * len(args.theater)), args.theater)
+        screens = cursor.fetchall()
+        shows = scheduler.plan(cursor, screens, targets, args.start, args.days)
+        cursor.close()
+        conn.rollback()
+    elapsed = time.perf_counter() - started
+    print("%d shows on %d screens over %d days in %.2fs" % (len(shows), len(screens), args.days, elapsed), file=sys.stderr)
+    for movie_id, short in sorted(shortfall(shows, targets, args.days).items()):
+        print("movie %d: %d shows short of target" % (movie_id, short), file=sys.stderr)
+
+    if args.commit:
+        report = import_schedule(db_pool, schedule_validator, ((n, show, None) for n, show in enumerate(shows, 1)))
+        if report['inserted']:
+            catalog_cache.invalidate('TM')
+        for error in report['errors']:
+            print("row %d: %s" % (error['row'], error['error']), file=sys.stderr)
+        print("%(inserted)d inserted, %(rejected)d rejected" % report)
+    else:
+        writer = csv.writer(sys.stdout, lineterminator='\n')
+        writer.writerow(FIELDS)
+        writer.writerows(show_row(show) for show in shows)
@@ -0,0 +1,153 @@
+# Compares the threaded Flask server with the ASGI mode (ASYNC_APP) on the
+# browsing routes. Each mode is started as a subprocess on the configured
+# database and driven by the same concurrent clients; prints requests/s and
+# latency percentiles per mode, and optionally writes them as JSON.
+#
+#   python BENCH_ASYNC.py --clients 64 --seconds 20 --json bench_async.json
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from SCHEDULE import show_time as time_of
+from USER_BACK import db_pool
+
+SYNC_SERVER = "from USER_BACK import app; app.run(host='127.0.0.1', port=%d, threaded=True)"
+
+
+def pick_urls():
+    # The async routes, over real ids: a movie, the theaters showing it and one show
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT THEATER_ID, MOVIE_ID, SCREEN_ID, SHOW_DATE, SHOW_TIME FROM TM ORDER BY SHOW_DATE DESC LIMIT 1")
+        show = cursor.fetchone()
+        cursor.close()
+    if show is None:
+        raise SystemExit("TM is empty, schedule a show first")
+    theater_id, movie_id, screen_id, show_date, show_time = show
+    return [
+        '/all_movies',
+        '/all_theaters',
+        '/avail_theater/%d' % movie_id,
+        '/mt_movies/%d?start=%s' % (theater_id, show_date),
+        '/bookings/%d/%d/%d/%s/%s' % (theater_id, movie_id, screen_id, time_of(show_time), show_date),
+    ]
+
+
+def wait_until_up(base, process, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("server exited with status %s" % process.returncode)
+        try:
+            urllib.request.urlopen(base + '/', timeout=1).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise SystemExit("server did not come up on " + base)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def drive(base, urls, clients, seconds):
+    latencies = {url: [] for url in urls}
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def client(n):
+        i = n
+        while time.monotonic() < stop_at:
+            url = urls[i % len(urls)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                urllib.request.urlopen(base + url, timeout=30).read()
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies[url].append(elapsed)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    everything = [value for values in latencies.values() for value in values]
+    report = {
+        'requests': len(everything),
+        'errors': errors[0],
+        'rps': len(everything) / elapsed,
+        'p50_ms': percentile(everything, 50) * 1000,
+        'p95_ms': percentile(everything, 95) * 1000,
+        'p99_ms': percentile(everything, 99) * 1000,
+        'routes': {},
+    }
+    for url, values in latencies.items():
+        report['routes'][url] = {
+            'requests': len(values),
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+        }
+    return report
+
+
+def run_mode(command, port, urls, args):
+    base = 'http://127.0.0.1:%d' % port
+    process = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(base, process)
+        # Warm both the catalog cache and the pools before measuring
+        drive(base, urls, min(args.clients, 8), 2)
+        return drive(base, urls, args.clients, args.seconds)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sync and async serving modes")
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    urls = pick_urls()
+    modes = {
+        'sync': [sys.executable, '-c', SYNC_SERVER % args.port],
+        'async': [sys.executable, '-m', 'hypercorn', '--bind', '127.0.0.1:%d' % (args.port + 1), 'ASYNC_APP:app'],
+    }
+    results = {}
+    for offset, (name, command) in enumerate(modes.items()):
+        results[name] = run_mode(command, args.port + offset, urls, args)
+
+    print("%d clients for %.0fs per mode" % (args.clients, args.seconds))
+    print("%-6s %9s %8s %9s %9s %9s" % ('mode', 'req/s', 'errors', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for name, report in results.items():
+        print("%-6s %9.1f %8d %9.1f %9.1f %9.1f" % (name, report['rps'], report['errors'], report['p50_ms'], report['p95_ms'], report['p99_ms']))
+    for url in urls:
+        print("  %-45s" % url + "".join("  %s p95 %7.1f ms" % (name, results[name]['routes'][url]['p95_ms']) for name in results))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'clients': args.clients, 'seconds': args.seconds, 'modes': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
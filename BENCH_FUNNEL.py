@@ -0,0 +1,387 @@
+# Booking funnel benchmark. Seeds a scratch database with synthetic theaters,
+# screens, a week of TM shows, users and past bookings, then has concurrent
+# virtual users log in and buy seats the way the pages do:
+#
+#   /authenticate -> /check -> /all_theaters -> /mt_movies -> /bookings/... ->
+#   /proceed -> /bookings -> /pay
+#
+# Reports latency percentiles, throughput and DB queries per route, and writes
+# a JSON baseline that a later run can be compared against:
+#
+#   python BENCH_FUNNEL.py --theaters 200 --users 5000 --vus 32 --json funnel.json
+#   python BENCH_FUNNEL.py --vus 32 --compare funnel.json
+#
+# Uses the server and credentials of USER_BACK.db_config but never touches its database.
+import argparse
+import base64
+import hashlib
+import http.cookiejar
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import date, timedelta
+
+import mysql.connector
+from werkzeug.serving import make_server
+
+import USER_BACK
+from BENCH_TPFC import run_script
+from GEO_INDEX import LOCATIONS
+from OCCUPANCY import ShowOccupancy
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PASSWORD = 'bench'
+SHOW_TIMES = ('09:00:00', '13:00:00', '17:00:00', '21:00:00')   # 1 hour apart for run times up to 3 hours
+STEPS = ('authenticate', 'check', 'all_theaters', 'mt_movies', 'booking', 'proceed', 'bookings', 'pay')
+QUERIES = re.compile(r'desc="(\d+) queries"')
+LINK = re.compile(r'href="(/bookings/\d+/\d+/\d+/[^/"]+/[^"]+)"')
+SEAT_DATA = re.compile(r'<script id="bookings-seat-data" type="application/json">\s*"([^"]*)"')
+
+TABLES = [
+    """CREATE TABLE IF NOT EXISTS USERS (
+        user_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        EMAIL VARCHAR(50) UNIQUE,
+        phone VARCHAR(15) NOT NULL,
+        gender ENUM('male', 'female', 'other') NOT NULL,
+        age INT NOT NULL,
+        city VARCHAR(100) NOT NULL,
+        registration_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PASSWORD VARCHAR(128),
+        SALT VARCHAR(128),
+        ROLE VARCHAR(10) NOT NULL DEFAULT 'USER')""",
+    """CREATE TABLE IF NOT EXISTS THEATERS (
+        THEATER_ID INT NOT NULL PRIMARY KEY,
+        THEATER_NAME VARCHAR(100) NOT NULL,
+        LOCATION VARCHAR(255) NOT NULL)""",
+    """CREATE TABLE IF NOT EXISTS MOVIES (
+        MOVIE_ID INT NOT NULL PRIMARY KEY,
+        MOVIE_NAME VARCHAR(30),
+        GENRE VARCHAR(30),
+        RATING VARCHAR(5),
+        DESCRIPTION VARCHAR(50),
+        URL VARCHAR(100),
+        RUN_TIME INT,
+        RDATE DATE)""",
+    """CREATE TABLE IF NOT EXISTS SCREENS (
+        THEATER_ID INT NOT NULL,
+        SCREEN_ID INT NOT NULL,
+        SCREEN_NAME VARCHAR(30),
+        ELITE_SEATS INT,
+        PREMIUM_SEATS INT,
+        PRIMARY KEY (THEATER_ID, SCREEN_ID))""",
+    """CREATE TABLE IF NOT EXISTS TM (
+        THEATER_ID INT NOT NULL,
+        MOVIE_ID INT NOT NULL,
+        SCREEN_ID INT NOT NULL,
+        SHOW_DATE DATE NOT NULL,
+        SHOW_TIME TIME NOT NULL,
+        PRIMARY KEY (THEATER_ID, MOVIE_ID, SCREEN_ID, SHOW_DATE, SHOW_TIME),
+        UNIQUE KEY uq_screen_slot (THEATER_ID, SCREEN_ID, SHOW_DATE, SHOW_TIME))""",
+    """CREATE TABLE IF NOT EXISTS BOOKINGS (
+        BOOKING_ID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        USER_ID INT NOT NULL,
+        MOVIE_ID INT NOT NULL,
+        THEATER_ID INT NOT NULL,
+        SCREEN_ID INT NOT NULL,
+        DAY DATE NOT NULL,
+        SHOW_TIME TIME NOT NULL,
+        NO_OF_ELITE_SEATS INT NOT NULL,
+        NO_OF_PREMIUM_SEATS INT NOT NULL,
+        PRICE DECIMAL(10, 2) NOT NULL,
+        SEAT_TOTAL DECIMAL(10, 2) NOT NULL,
+        KEY idx_bookings_user (USER_ID))""",
+    """CREATE TABLE IF NOT EXISTS SEATS_BOOKED (
+        BOOKING_ID INT NOT NULL,
+        THEATER_ID INT NOT NULL,
+        SCREEN_ID INT NOT NULL,
+        DAY DATE NOT NULL,
+        SHOW_TIME TIME NOT NULL,
+        SEATS VARCHAR(10) NOT NULL,
+        UNIQUE KEY uq_show_seat (THEATER_ID, SCREEN_ID, DAY, SHOW_TIME, SEATS))""",
+]
+
+
+def password_hash(salt):
+    # What LOGIN.html posts to /check: SHA1 of the password followed by the salt
+    return hashlib.sha1((PASSWORD + salt).encode()).hexdigest()
+
+
+def seed(conn, cursor, args):
+    rng = random.Random(args.seed)
+    print("seeding %d theaters, %d users, %d past bookings..." % (args.theaters, args.users, args.bookings))
+    for table in ('SEATS_BOOKED', 'BOOKINGS', 'TM', 'SCREENS', 'MOVIES', 'THEATERS', 'USERS'):
+        cursor.execute("DELETE FROM " + table)
+    localities = sorted(LOCATIONS)
+    cursor.executemany("INSERT INTO MOVIES VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                       [(i, 'MOVIE %d' % i, 'DRAMA', 'U/A', 'SYNTHETIC', '/static/images/THERI.jpg', rng.randint(90, 180), '2024-05-01')
+                        for i in range(1, args.movies + 1)])
+    cursor.executemany("INSERT INTO THEATERS VALUES (%s, %s, %s)",
+                       [(i, 'THEATER %d' % i, rng.choice(localities)) for i in range(1, args.theaters + 1)])
+    cursor.executemany("INSERT INTO SCREENS VALUES (%s, %s, %s, %s, %s)",
+                       [(t, s, 'SCREEN %d' % s, 30, 20) for t in range(1, args.theaters + 1) for s in range(1, args.screens + 1)])
+    conn.commit()
+
+    start = date.today()
+    shows = [(t, rng.randint(1, args.movies), s, start + timedelta(days=d), time_)
+             for t in range(1, args.theaters + 1) for s in range(1, args.screens + 1)
+             for d in range(args.days) for time_ in SHOW_TIMES]
+    for i in range(0, len(shows), 20000):
+        cursor.executemany("INSERT INTO TM VALUES (%s, %s, %s, %s, %s)", shows[i:i + 20000])
+        conn.commit()
+
+    users = []
+    for i in range(1, args.users + 1):
+        salt = '%016x' % rng.getrandbits(64)
+        users.append((i, 'USER %d' % i, 'user%d@bench.test' % i, '9000000000', 'other', 30,
+                      rng.choice(localities), password_hash(salt), salt))
+    for i in range(0, len(users), 20000):
+        cursor.executemany("INSERT INTO USERS (user_id, name, EMAIL, phone, gender, age, city, PASSWORD, SALT) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)", users[i:i + 20000])
+        conn.commit()
+
+    # Past bookings over the same shows, so seat maps and histories are not empty
+    taken = defaultdict(set)
+    bookings, seats = [], []
+    for booking_id in range(1, args.bookings + 1):
+        theater_id, movie_id, screen_id, day, time_ = rng.choice(shows)
+        picked = [seat for seat in {'pseat%d' % rng.randint(1, 20) if rng.random() < 0.5 else 'eseat%d' % rng.randint(1, 20) for _ in range(rng.randint(1, 4))}
+                  if seat not in taken[theater_id, screen_id, day, time_]]
+        if not picked:
+            continue
+        taken[theater_id, screen_id, day, time_].update(picked)
+        p = sum(seat.startswith('p') for seat in picked)
+        e = len(picked) - p
+        bookings.append((booking_id, rng.randint(1, args.users), movie_id, theater_id, screen_id, day, time_, e, p, round((e * 150 + p * 190) * 1.18 + 25, 1), e * 150 + p * 190))
+        seats.extend((booking_id, theater_id, screen_id, day, time_, seat) for seat in picked)
+    for i in range(0, len(bookings), 20000):
+        cursor.executemany("INSERT INTO BOOKINGS VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", bookings[i:i + 20000])
+        conn.commit()
+    for i in range(0, len(seats), 20000):
+        cursor.executemany("INSERT INTO SEATS_BOOKED VALUES (%s, %s, %s, %s, %s, %s)", seats[i:i + 20000])
+        conn.commit()
+    cursor.callproc('rebuild_dashboard_stats')
+    conn.commit()
+
+
+def prepare(args):
+    config = dict(USER_BACK.db_config)
+    del config['database']
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    cursor.execute("CREATE DATABASE IF NOT EXISTS " + args.database)
+    cursor.execute("USE " + args.database)
+    for ddl in TABLES:
+        cursor.execute(ddl)
+    # The price rules, then the dashboard tables and their BOOKINGS triggers, so
+    # /bookings and /pay do the work they do in production
+    run_script(cursor, os.path.join(HERE, 'static', 'PRICING.sql'))
+    run_script(cursor, os.path.join(HERE, 'static', 'AGGREGATES.sql'))
+    cursor.execute("SELECT COUNT(*) FROM THEATERS")
+    if args.reseed or cursor.fetchone()[0] != args.theaters:
+        seed(conn, cursor, args)
+    cursor.close()
+    conn.close()
+
+
+def start_server(database):
+    app = USER_BACK.app
+    USER_BACK.db_config['database'] = database
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:%d' % server.server_port
+
+
+class VirtualUser:
+    def __init__(self, base, user_id, rng, record):
+        self.base = base
+        self.email = 'user%d@bench.test' % user_id
+        self.rng = rng
+        self.record = record
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, step, path, data=None, headers=None):
+        started = time.perf_counter()
+        try:
+            response = self.opener.open(urllib.request.Request(self.base + path, data=data, headers=headers or {}), timeout=60)
+            body = response.read().decode()
+            status, url, timing = response.status, response.geturl(), response.headers.get('Server-Timing', '')
+        except urllib.error.HTTPError as e:
+            body = e.read().decode()
+            status, url, timing = e.code, path, e.headers.get('Server-Timing', '')
+        # Statements the server ran for this request, from DB_METRICS' Server-Timing header
+        queries = QUERIES.search(timing)
+        self.record(step, time.perf_counter() - started, status, int(queries.group(1)) if queries else None)
+        return status, body, url
+
+    def funnel(self, theaters, start):
+        # One purchase; returns 'booked', 'sold_out', 'conflict' or 'error'
+        status, salt, _ = self.request('authenticate', '/authenticate', urllib.parse.urlencode({'email': self.email}).encode())
+        if status != 200:
+            return 'error'
+        form = {'emaill': self.email, 'passwordl': password_hash(salt)}
+        status, _, _ = self.request('check', '/check', urllib.parse.urlencode(form).encode())
+        status, _, _ = self.request('all_theaters', '/all_theaters')
+        theater_id = self.rng.choice(theaters)
+        status, page, _ = self.request('mt_movies', '/mt_movies/%d?start=%s&days=1' % (theater_id, start))
+        links = LINK.findall(page)
+        if status != 200 or not links:
+            return 'error'
+        status, page, _ = self.request('booking', self.rng.choice(links))
+        packed = SEAT_DATA.search(page)
+        if status != 200 or not packed:
+            return 'error'
+        occupancy = ShowOccupancy.from_bytes(base64.b64decode(packed.group(1)))
+        free = [seat for seat in ['pseat%d' % n for n in range(1, occupancy.premium + 1)] + ['eseat%d' % n for n in range(1, occupancy.elite + 1)]
+                if not occupancy.test(seat)]
+        if not free:
+            return 'sold_out'
+        seats = self.rng.sample(free, min(len(free), self.rng.randint(1, 4)))
+        status, _, _ = self.request('proceed', '/proceed', json.dumps({'selectedSeats': seats}).encode(), {'Content-Type': 'application/json'})
+        if status == 409:
+            return 'conflict'
+        self.request('bookings', '/bookings')
+        status, _, url = self.request('pay', '/pay')
+        if status != 200:
+            return 'error'
+        return 'conflict' if 'conflict=' in url else 'booked'
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(base, args):
+    samples = defaultdict(list)
+    queries = defaultdict(list)
+    failures = defaultdict(int)
+    outcomes = defaultdict(int)
+    lock = threading.Lock()
+
+    def record(step, elapsed, status, count):
+        with lock:
+            samples[step].append(elapsed)
+            if count is not None:
+                queries[step].append(count)
+            if status >= 500:
+                failures[step] += 1
+
+    theaters = list(range(1, args.theaters + 1))
+    start = date.today().isoformat()
+    barrier = threading.Barrier(args.vus)
+
+    def virtual_user(n):
+        rng = random.Random(args.seed * 1000 + n)
+        user = VirtualUser(base, n % args.users + 1, rng, record)
+        barrier.wait()
+        for _ in range(args.iterations):
+            try:
+                outcome = user.funnel(theaters, start)
+            except Exception:
+                outcome = 'error'
+            with lock:
+                outcomes[outcome] += 1
+
+    threads = [threading.Thread(target=virtual_user, args=(n,)) for n in range(args.vus)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    routes = {}
+    for step in STEPS:
+        values = samples.get(step, [])
+        counts = queries.get(step, [])
+        routes[step] = {
+            'requests': len(values),
+            'errors': failures[step],
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+            'queries_avg': sum(counts) / len(counts) if counts else None,
+            'queries_max': max(counts) if counts else None,
+        }
+    total = sum(route['requests'] for route in routes.values())
+    return {
+        'elapsed_s': elapsed,
+        'requests': total,
+        'requests_per_s': total / elapsed,
+        'bookings_per_s': outcomes['booked'] / elapsed,
+        'outcomes': dict(outcomes),
+        'routes': routes,
+    }
+
+
+def show(report, baseline=None):
+    print("%d requests in %.1fs: %.1f req/s, %.1f bookings/s  %s" % (
+        report['requests'], report['elapsed_s'], report['requests_per_s'], report['bookings_per_s'],
+        ' '.join('%s=%d' % item for item in sorted(report['outcomes'].items()))))
+    print("%-13s %8s %6s %9s %9s %9s %8s" % ('route', 'requests', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+    for step, route in report['routes'].items():
+        line = "%-13s %8d %6d %9.1f %9.1f %9.1f %8s" % (step, route['requests'], route['errors'], route['p50_ms'], route['p95_ms'], route['p99_ms'],
+                                                        '%.1f' % route['queries_avg'] if route['queries_avg'] is not None else '-')
+        old = baseline and baseline['routes'].get(step)
+        if old and old['p95_ms']:
+            line += "   p95 %+.0f%%" % ((route['p95_ms'] / old['p95_ms'] - 1) * 100)
+            if old['queries_avg'] is not None and route['queries_avg'] is not None:
+                line += ", queries %+.1f" % (route['queries_avg'] - old['queries_avg'])
+        print(line)
+    if baseline:
+        print("throughput %+.0f%% against the baseline" % ((report['requests_per_s'] / baseline['requests_per_s'] - 1) * 100))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the booking funnel with concurrent virtual users")
+    parser.add_argument('--database', default='MOVIE_BENCH')
+    parser.add_argument('--theaters', type=int, default=100)
+    parser.add_argument('--screens', type=int, default=3, help="screens per theater")
+    parser.add_argument('--movies', type=int, default=50)
+    parser.add_argument('--days', type=int, default=7, help="days of shows from today")
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--bookings', type=int, default=20000, help="past bookings to seed")
+    parser.add_argument('--reseed', action='store_true', help="seed again even if the scratch database looks seeded")
+    parser.add_argument('--vus', type=int, default=16, help="concurrent virtual users")
+    parser.add_argument('--iterations', type=int, default=10, help="purchases per virtual user")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--url', help="drive a running server on the scratch database instead of an in-process one")
+    parser.add_argument('--json', help="write the report to this file")
+    parser.add_argument('--compare', help="baseline JSON from an earlier run to compare with")
+    args = parser.parse_args()
+    if args.database.lower() == USER_BACK.db_config['database'].lower():
+        parser.error("refusing to benchmark in the application database")
+
+    prepare(args)
+    server = None
+    base = args.url
+    if base is None:
+        server, base = start_server(args.database)
+    report = run(base, args)
+    if server is not None:
+        server.shutdown()
+
+    report['config'] = {key: getattr(args, key) for key in ('theaters', 'screens', 'movies', 'days', 'users', 'bookings', 'vus', 'iterations', 'seed')}
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    show(report, baseline)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
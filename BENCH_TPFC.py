@@ -0,0 +1,185 @@
+# Compares the cursor-loop routines of static/TPFC.sql with the set-based
+# static/TPFC_V2.sql on a synthetic BOOKINGS table in a scratch database.
+#
+#   python BENCH_TPFC.py --rows 1000000 --json tpfc_bench.json
+#
+# Uses the server and credentials of USER_BACK.db_config but never touches its database.
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import time
+
+import mysql.connector
+
+from USER_BACK import db_config
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OLD_ROUTINES = {'calculate_theater_revenue', 'calculate_movie_revenue', 'active_users',
+                'calculate_movie_count', 'calculate_theater_count'}
+
+TABLES = [
+    """CREATE TABLE IF NOT EXISTS MOVIES (
+        MOVIE_ID INT NOT NULL PRIMARY KEY,
+        MOVIE_NAME VARCHAR(30),
+        RDATE DATE)""",
+    """CREATE TABLE IF NOT EXISTS THEATERS (
+        THEATER_ID INT NOT NULL PRIMARY KEY,
+        THEATER_NAME VARCHAR(100) NOT NULL,
+        LOCATION VARCHAR(255) NOT NULL)""",
+    """CREATE TABLE IF NOT EXISTS BOOKINGS (
+        BOOKING_ID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        USER_ID INT NOT NULL,
+        MOVIE_ID INT NOT NULL,
+        THEATER_ID INT NOT NULL,
+        SCREEN_ID INT NOT NULL,
+        DAY DATE NOT NULL,
+        SHOW_TIME TIME NOT NULL,
+        NO_OF_ELITE_SEATS INT NOT NULL,
+        NO_OF_PREMIUM_SEATS INT NOT NULL,
+        PRICE DECIMAL(10, 2) NOT NULL,
+        SEAT_TOTAL DECIMAL(10, 2) NOT NULL)""",
+]
+
+WORKLOADS = {
+    'movie_revenue': ('query', "SELECT MOVIES.MOVIE_ID, MOVIES.MOVIE_NAME, MOVIES.RDATE, calculate_movie_revenue(MOVIES.MOVIE_ID) AS total_revenue FROM MOVIES"),
+    'theater_revenue': ('query', "SELECT THEATER_ID, THEATER_NAME, LOCATION, calculate_theater_revenue(THEATER_ID) AS total_price FROM THEATERS"),
+    'active_users': ('proc', 'active_users'),
+    'movie_count': ('proc', 'calculate_movie_count'),
+    'theater_count': ('proc', 'calculate_theater_count'),
+}
+V2_WORKLOADS = {
+    'movie_revenue_view': ('query', "SELECT * FROM MOVIE_REVENUE"),
+    'theater_revenue_view': ('query', "SELECT * FROM THEATER_REVENUE"),
+}
+
+
+def sql_statements(text):
+    # Splits a mysql-client script on its (possibly DELIMITER-changed) delimiter
+    delimiter = ';'
+    buf = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('--') or (not stripped and not buf):
+            continue
+        if stripped.upper().startswith('DELIMITER '):
+            delimiter = stripped.split()[1]
+            continue
+        buf.append(line)
+        if stripped.endswith(delimiter):
+            statement = '\n'.join(buf).rstrip()[:-len(delimiter)].strip()
+            buf = []
+            if statement:
+                yield statement
+
+
+def run_script(cursor, path, only=None):
+    with open(path) as f:
+        for statement in sql_statements(f.read()):
+            if only is not None:
+                match = re.search(r'CREATE\s+OR\s+REPLACE\s+(?:FUNCTION|PROCEDURE)\s+(\w+)', statement, re.I)
+                if not match or match.group(1) not in only:
+                    continue
+            cursor.execute(statement)
+            if cursor.with_rows:
+                cursor.fetchall()
+
+
+def seed(conn, cursor, rows, movies, theaters, users):
+    cursor.execute("SELECT COUNT(*) FROM BOOKINGS")
+    if cursor.fetchone()[0] == rows:
+        return
+    print("seeding %d bookings..." % rows)
+    rng = random.Random(42)
+    for table in ('BOOKINGS', 'MOVIES', 'THEATERS'):
+        cursor.execute("TRUNCATE TABLE " + table)
+    cursor.executemany("INSERT INTO MOVIES VALUES (%s, %s, %s)",
+                       [(i, 'MOVIE %d' % i, '2024-05-01') for i in range(1, movies + 1)])
+    cursor.executemany("INSERT INTO THEATERS VALUES (%s, %s, %s)",
+                       [(i, 'THEATER %d' % i, 'ADYAR') for i in range(1, theaters + 1)])
+    chunk = 20000
+    for start in range(0, rows, chunk):
+        batch = []
+        for _ in range(min(chunk, rows - start)):
+            e, p = rng.randint(0, 4), rng.randint(0, 4)
+            batch.append((rng.randint(1, users), rng.randint(1, movies), rng.randint(1, theaters), rng.randint(1, 3),
+                          '2024-05-%02d' % rng.randint(1, 28), '%02d:00:00' % rng.choice((9, 13, 18, 21)), e, p,
+                          round((e * 150 + p * 190) * 1.18 + 25, 1), e * 150 + p * 190))
+        cursor.executemany("INSERT INTO BOOKINGS (USER_ID, MOVIE_ID, THEATER_ID, SCREEN_ID, DAY, SHOW_TIME, NO_OF_ELITE_SEATS, NO_OF_PREMIUM_SEATS, PRICE, SEAT_TOTAL) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", batch)
+        conn.commit()
+    cursor.execute("ANALYZE TABLE BOOKINGS")
+    cursor.fetchall()
+
+
+def drop_v2_indexes(cursor):
+    for index in ('idx_bookings_movie_revenue', 'idx_bookings_theater_revenue', 'idx_bookings_user'):
+        cursor.execute("DROP INDEX IF EXISTS %s ON BOOKINGS" % index)
+
+
+def time_workloads(cursor, workloads, repeat):
+    results = {}
+    for name, (kind, target) in workloads.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if kind == 'query':
+                cursor.execute(target)
+                cursor.fetchall()
+            else:
+                cursor.callproc(target)
+                for result in cursor.stored_results():
+                    result.fetchall()
+            samples.append(time.perf_counter() - start)
+        results[name] = {'median_ms': statistics.median(samples) * 1000, 'best_ms': min(samples) * 1000}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the TPFC.sql routines against TPFC_V2.sql")
+    parser.add_argument('--database', default='MOVIE_BENCH')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--movies', type=int, default=200)
+    parser.add_argument('--theaters', type=int, default=500)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help="write the results to this file")
+    args = parser.parse_args()
+    if args.database.lower() == db_config['database'].lower():
+        parser.error("refusing to benchmark in the application database")
+
+    config = dict(db_config)
+    del config['database']
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    cursor.execute("CREATE DATABASE IF NOT EXISTS " + args.database)
+    cursor.execute("USE " + args.database)
+    for ddl in TABLES:
+        cursor.execute(ddl)
+    seed(conn, cursor, args.rows, args.movies, args.theaters, args.users)
+
+    drop_v2_indexes(cursor)
+    run_script(cursor, os.path.join(HERE, 'static', 'TPFC.sql'), only=OLD_ROUTINES)
+    old = time_workloads(cursor, WORKLOADS, args.repeat)
+
+    run_script(cursor, os.path.join(HERE, 'static', 'TPFC_V2.sql'))
+    conn.commit()
+    new = time_workloads(cursor, dict(WORKLOADS, **V2_WORKLOADS), args.repeat)
+
+    print("%-22s %12s %12s %8s" % ('workload', 'v1 ms', 'v2 ms', 'speedup'))
+    for name in new:
+        before = old.get(name, {}).get('median_ms')
+        after = new[name]['median_ms']
+        print("%-22s %12s %12.1f %8s" % (name, '%.1f' % before if before else '-', after,
+                                          '%.1fx' % (before / after) if before and after else '-'))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'rows': args.rows, 'movies': args.movies, 'theaters': args.theaters,
+                       'users': args.users, 'v1': old, 'v2': new}, f, indent=2)
+    cursor.close()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+
+HISTORY_PAGE = 20
+
+# A user's bookings newest first with theater and movie names resolved in the same
+# query. Keyset pagination on BOOKING_ID walks the (USER_ID, BOOKING_ID) entries of
+# idx_bookings_user (InnoDB appends the primary key to every secondary index), so
+# an old page costs the same as the first one.
+HISTORY_QUERY = """
+    SELECT b.BOOKING_ID, t.THEATER_NAME, m.MOVIE_NAME, b.DAY
+    FROM BOOKINGS b
+    JOIN THEATERS t ON t.THEATER_ID = b.THEATER_ID
+    JOIN MOVIES m ON m.MOVIE_ID = b.MOVIE_ID
+    WHERE b.USER_ID = %s AND b.BOOKING_ID < %s
+    ORDER BY b.BOOKING_ID DESC
+    LIMIT %s
+"""
+
+# Everything check() needs from USERS in one row
+PROFILE_QUERY = "SELECT user_id, name, email, phone, city, password, role FROM users WHERE email = %s;"
+
+
+def load_history(cursor, user_id, before=None, limit=HISTORY_PAGE):
+    # One page of (booking_id, theater_name, movie_name, day) rows older than
+    # booking `before` (from the newest when None). Returns (rows, next_before),
+    # next_before being None on the last page.
+    cursor.execute(HISTORY_QUERY, (user_id, before if before is not None else 2 ** 31 - 1, limit + 1))
+    rows = [(booking_id, theater, movie, str(day)) for booking_id, theater, movie, day in cursor.fetchall()]
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1][0]
+    return rows, None
+
+
+class RecentBookingsCache:
+    # First history page per user, so returning to /home costs no query. pay()
+    # invalidates the buyer's entry; `ttl` bounds staleness from other workers.
+    def __init__(self, ttl=60.0, max_users=10000):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._users = OrderedDict()    # user_id -> ((rows, next_before), loaded_at)
+
+    def get(self, user_id, load):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._users.move_to_end(user_id)
+                return entry[0]
+        page = load()
+        with self._lock:
+            self._users[user_id] = (page, now)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return page
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
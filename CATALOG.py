@@ -0,0 +1,288 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+MOVIE_COLUMNS = "MOVIE_ID, MOVIE_NAME, GENRE, RATING, DESCRIPTION, URL, RUN_TIME, RDATE"
+MOVIES_QUERY = "SELECT " + MOVIE_COLUMNS + " FROM MOVIES ORDER BY MOVIE_ID;"
+THEATERS_QUERY = "SELECT THEATER_ID, THEATER_NAME, LOCATION FROM THEATERS;"
+SCREENS_QUERY = "SELECT SCREEN_ID, SCREEN_NAME, ELITE_SEATS, PREMIUM_SEATS FROM SCREENS WHERE THEATER_ID = %s;"
+TM_MOVIES_QUERY = "SELECT DISTINCT MOVIE_ID FROM TM WHERE THEATER_ID = %s;"
+
+
+class MemoryGenerations:
+    # Per-table invalidation counters for a single process
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generations = {}
+
+    def get(self):
+        with self._lock:
+            return dict(self._generations)
+
+    def bump(self, table):
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+
+
+class SqliteGenerations:
+    # Per-table invalidation counters in a local SQLite file, so an admin write
+    # handled by one worker process invalidates the catalog of every worker on the host
+    def __init__(self, path='catalog_generations.db'):
+        self.path = path
+        conn = self._connect()
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS GENERATIONS (NAME TEXT PRIMARY KEY, GEN INTEGER NOT NULL)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+
+    def get(self):
+        conn = self._connect()
+        try:
+            return dict(conn.execute("SELECT NAME, GEN FROM GENERATIONS"))
+        finally:
+            conn.close()
+
+    def bump(self, table):
+        conn = self._connect()
+        try:
+            conn.execute("INSERT INTO GENERATIONS VALUES (?, 1) ON CONFLICT(NAME) DO UPDATE SET GEN = GEN + 1", (table,))
+        finally:
+            conn.close()
+
+
+class RedisGenerations:
+    # Per-table invalidation counters in Redis, for workers spread over several
+    # hosts. `client` is a redis.Redis (or anything with hgetall/hincrby).
+    def __init__(self, client, key='catalog:generations'):
+        self.client = client
+        self.key = key
+
+    def get(self):
+        return {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in self.client.hgetall(self.key).items()}
+
+    def bump(self, table):
+        self.client.hincrby(self.key, table, 1)
+
+
+class CatalogCache:
+    # Read-through cache of catalog rows keyed by (table, key), with a `ttl` and
+    # LRU eviction past `max_entries`. invalidate() drops a table here and bumps
+    # its counter in `generations`; other processes notice the new counter
+    # within `check_every` seconds and drop their copies as well.
+    def __init__(self, generations=None, ttl=300.0, max_entries=10000, check_every=1.0):
+        self.generations = generations or MemoryGenerations()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.check_every = check_every
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()    # (table, key) -> (value, loaded_at)
+        self._seen = {}                  # table -> generation the local entries belong to
+        self._checked_at = None
+        self._stats = {}
+
+    def _count(self, table, what):
+        stats = self._stats.setdefault(table, {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0})
+        stats[what] += 1
+
+    def _drop(self, table):
+        for entry in [entry for entry in self._entries if entry[0] == table]:
+            del self._entries[entry]
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            evicted = self._entries.popitem(last=False)
+            self._count(evicted[0][0], 'evictions')
+
+    def _sync(self, now, force=False):
+        # Called with the lock held
+        if not force and self._checked_at is not None and now - self._checked_at < self.check_every:
+            return
+        self._checked_at = now
+        current = self.generations.get()
+        for table in set(current) | set(self._seen):
+            generation = current.get(table, 0)
+            if self._seen.get(table, 0) != generation:
+                self._drop(table)
+            self._seen[table] = generation
+
+    def _lookup(self, table, keys, now):
+        # Cached values of `keys`, the keys to load, and the generation to store them under
+        found, missing = {}, []
+        with self._lock:
+            self._sync(now)
+            for key in keys:
+                entry = self._entries.get((table, key))
+                if entry is not None and now - entry[1] < self.ttl:
+                    self._entries.move_to_end((table, key))
+                    self._count(table, 'hits')
+                    found[key] = entry[0]
+                else:
+                    self._count(table, 'misses')
+                    missing.append(key)
+            return found, missing, self._seen.get(table, 0)
+
+    def _store(self, table, loaded, generation, now):
+        with self._lock:
+            # Don't store what was loaded across an invalidation of its table
+            if self._seen.get(table, 0) == generation:
+                for key, value in loaded.items():
+                    self._entries[(table, key)] = (value, now)
+                    self._entries.move_to_end((table, key))
+                self._evict()
+
+    def get(self, table, key, load):
+        now = time.monotonic()
+        found, missing, generation = self._lookup(table, [key], now)
+        if not missing:
+            return found[key]
+        value = load()
+        self._store(table, {key: value}, generation, now)
+        return value
+
+    def get_many(self, table, keys, load):
+        # get() for several keys of one table: `load(missing)` gets the uncached
+        # keys and returns {key: value} for all of them, in one round trip
+        now = time.monotonic()
+        found, missing, generation = self._lookup(table, keys, now)
+        if missing:
+            loaded = load(missing)
+            self._store(table, loaded, generation, now)
+            found.update(loaded)
+        return found
+
+    async def aget(self, table, key, load):
+        # get() with a coroutine function as `load`, for the async app
+        now = time.monotonic()
+        found, missing, generation = self._lookup(table, [key], now)
+        if not missing:
+            return found[key]
+        value = await load()
+        self._store(table, {key: value}, generation, now)
+        return value
+
+    async def aget_many(self, table, keys, load):
+        now = time.monotonic()
+        found, missing, generation = self._lookup(table, keys, now)
+        if missing:
+            loaded = await load(missing)
+            self._store(table, loaded, generation, now)
+            found.update(loaded)
+        return found
+
+    def version(self, *tables):
+        # Generation of each table, to key what is built from them (PAGE_CACHE)
+        with self._lock:
+            self._sync(time.monotonic())
+            return tuple(self._seen.get(table, 0) for table in tables)
+
+    def invalidate(self, *tables):
+        for table in tables:
+            self.generations.bump(table)
+        with self._lock:
+            for table in tables:
+                self._drop(table)
+                self._count(table, 'invalidations')
+            # Adopt our own bumps now, so loads that straddled them are not stored
+            self._sync(time.monotonic(), force=True)
+
+    def metrics(self):
+        with self._lock:
+            stats = {table: dict(counts) for table, counts in self._stats.items()}
+            entries = len(self._entries)
+        for counts in stats.values():
+            lookups = counts['hits'] + counts['misses']
+            counts['hit_ratio'] = counts['hits'] / lookups if lookups else 0.0
+        return {'entries': entries, 'tables': stats}
+
+
+def _by_id(rows):
+    return {row[0]: row for row in rows}
+
+
+def _movie_table(rows):
+    return rows, _by_id(rows)
+
+
+class Catalog:
+    # MOVIES, THEATERS, SCREENS and the TM movie lists the user pages read,
+    # through a CatalogCache. `connection` is a zero-argument context manager
+    # factory such as db_pool.connection, entered only on a miss.
+    def __init__(self, cache, connection):
+        self.cache = cache
+        self.connection = connection
+
+    def query(self, query, params=()):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            cursor.close()
+        return rows
+
+    def _movies(self):
+        return self.cache.get('MOVIES', 'all', lambda: _movie_table(self.query(MOVIES_QUERY)))
+
+    def movie_index(self):
+        # {MOVIE_ID: movie row}
+        return self._movies()[1]
+
+    def movies(self):
+        # Every movie as (MOVIE_ID, MOVIE_NAME, GENRE, RATING, DESCRIPTION, URL, RUN_TIME, RDATE)
+        return self._movies()[0]
+
+    def movie(self, movie_id):
+        return self.movie_index().get(int(movie_id))
+
+    def theater(self, theater_id):
+        # (THEATER_ID, THEATER_NAME, LOCATION) or None
+        return self.cache.get('THEATERS', 'all', lambda: _by_id(self.query(THEATERS_QUERY))).get(int(theater_id))
+
+    def screen(self, theater_id, screen_id):
+        # (SCREEN_ID, SCREEN_NAME, ELITE_SEATS, PREMIUM_SEATS) or None
+        screens = self.cache.get('SCREENS', int(theater_id), lambda: _by_id(self.query(SCREENS_QUERY, (theater_id,))))
+        return screens.get(int(screen_id))
+
+    def theater_movies(self, theater_id):
+        # Movie rows (as in movies()) scheduled at the theater
+        ids = self.cache.get('TM', int(theater_id), lambda: [row[0] for row in self.query(TM_MOVIES_QUERY, (theater_id,))])
+        by_id = self.movie_index()
+        return [by_id[movie_id] for movie_id in ids if movie_id in by_id]
+
+
+class AsyncCatalog:
+    # Catalog for the async app: the same cache entries, filled through an
+    # ASYNC_DB.AsyncConnectionPool on a miss
+    def __init__(self, cache, pool):
+        self.cache = cache
+        self.pool = pool
+
+    async def query(self, query, params=()):
+        return await self.pool.query(query, params)
+
+    async def _movies(self):
+        async def load():
+            return _movie_table(await self.query(MOVIES_QUERY))
+        return await self.cache.aget('MOVIES', 'all', load)
+
+    async def movie_index(self):
+        return (await self._movies())[1]
+
+    async def movies(self):
+        return (await self._movies())[0]
+
+    async def movie(self, movie_id):
+        return (await self.movie_index()).get(int(movie_id))
+
+    async def theater(self, theater_id):
+        async def load():
+            return _by_id(await self.query(THEATERS_QUERY))
+        return (await self.cache.aget('THEATERS', 'all', load)).get(int(theater_id))
+
+    async def screen(self, theater_id, screen_id):
+        async def load():
+            return _by_id(await self.query(SCREENS_QUERY, (theater_id,)))
+        return (await self.cache.aget('SCREENS', int(theater_id), load)).get(int(screen_id))
@@ -0,0 +1,236 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from flask import g, request
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+# RequestStats of the request being handled in this thread (or task)
+_current = ContextVar('db_request_stats', default=None)
+
+_SPACE = re.compile(r'\s+')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*%s\s*,?)+\)', re.I)
+_NUMBER = re.compile(r'\b\d+\b')
+
+
+def statement_shape(sql):
+    # One line per kind of statement: whitespace collapsed, IN (%s, %s, ...) lists
+    # and numeric literals folded, so repeats of the same query look the same
+    shape = _SPACE.sub(' ', sql).strip()
+    shape = _IN_LIST.sub('IN (...)', shape)
+    return _NUMBER.sub('N', shape)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'slowest', 'slowest_time', 'shapes')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest = None
+        self.slowest_time = 0.0
+        self.shapes = Counter()
+
+    def record(self, sql, elapsed):
+        shape = statement_shape(sql)
+        self.queries += 1
+        self.db_time += elapsed
+        self.shapes[shape] += 1
+        if elapsed >= self.slowest_time:
+            self.slowest, self.slowest_time = shape, elapsed
+
+    def repeated(self, threshold):
+        # Statement shapes run at least `threshold` times, the N+1 suspects
+        return {shape: count for shape, count in self.shapes.items() if count >= threshold}
+
+
+def record_query(sql, elapsed):
+    stats = _current.get()
+    if stats is not None:
+        stats.record(sql, elapsed)
+
+
+class InstrumentedCursor:
+    # Times every statement and charges it to the current request
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, sql, call, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            record_query(sql, time.perf_counter() - started)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        return self._timed(operation, self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        return self._timed(operation, self._cursor.executemany, operation, seq_params, *args, **kwargs)
+
+    def callproc(self, procname, args=()):
+        return self._timed('CALL ' + procname, self._cursor.callproc, procname, args)
+
+
+class InstrumentedConnection:
+    # Wraps a mysql.connector connection so its cursors are instrumented; everything
+    # else is passed through, so DB_POOL handles it like the real connection
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+
+def _bucket(bounds, value):
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            return i
+    return len(bounds)
+
+
+class RequestMetrics:
+    # Per-route histograms of latency and queries per request. Requests that run
+    # one statement shape `n_plus_one` times or more are counted and logged as
+    # N+1 suspects; every request is logged as one JSON line on this module's
+    # logger, at WARNING when it took longer than `slow_ms`.
+    def __init__(self, n_plus_one=5, slow_ms=500):
+        self.n_plus_one = n_plus_one
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def start(self):
+        return _current.set(RequestStats())
+
+    def finish(self, token, route, method, status, elapsed):
+        stats = _current.get()
+        _current.reset(token)
+        repeated = stats.repeated(self.n_plus_one)
+        with self._lock:
+            entry = self._routes.get(route)
+            if entry is None:
+                entry = self._routes[route] = {
+                    'requests': 0,
+                    'errors': 0,
+                    'queries': 0,
+                    'db_ms': 0.0,
+                    'max_queries': 0,
+                    'n_plus_one': 0,
+                    'latency_ms': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                    'queries_per_request': [0] * (len(QUERY_BUCKETS) + 1),
+                }
+            entry['requests'] += 1
+            entry['errors'] += status >= 500
+            entry['queries'] += stats.queries
+            entry['db_ms'] += stats.db_time * 1000
+            entry['max_queries'] = max(entry['max_queries'], stats.queries)
+            entry['n_plus_one'] += bool(repeated)
+            entry['latency_ms'][_bucket(LATENCY_BUCKETS_MS, elapsed * 1000)] += 1
+            entry['queries_per_request'][_bucket(QUERY_BUCKETS, stats.queries)] += 1
+
+        record = {
+            'route': route,
+            'method': method,
+            'status': status,
+            'ms': round(elapsed * 1000, 2),
+            'queries': stats.queries,
+            'db_ms': round(stats.db_time * 1000, 2),
+            'slowest_ms': round(stats.slowest_time * 1000, 2),
+            'slowest': stats.slowest,
+        }
+        if repeated:
+            record['n_plus_one'] = repeated
+        slow = elapsed * 1000 >= self.slow_ms
+        log.log(logging.WARNING if slow or repeated else logging.INFO, json.dumps(record))
+        return stats
+
+    @staticmethod
+    def server_timing(stats, elapsed):
+        # Server-Timing header value: total DB time with the query count, the
+        # slowest statement, and the whole request
+        parts = ['db;dur=%.2f;desc="%d queries"' % (stats.db_time * 1000, stats.queries)]
+        if stats.slowest is not None:
+            parts.append('db-slowest;dur=%.2f' % (stats.slowest_time * 1000))
+        parts.append('total;dur=%.2f' % (elapsed * 1000))
+        return ', '.join(parts)
+
+    def metrics(self):
+        with self._lock:
+            routes = {route: dict(entry, latency_ms=list(entry['latency_ms']), queries_per_request=list(entry['queries_per_request']))
+                      for route, entry in self._routes.items()}
+        for entry in routes.values():
+            entry['queries_avg'] = entry['queries'] / entry['requests']
+            entry['db_ms_avg'] = entry['db_ms'] / entry['requests']
+        return {
+            'latency_buckets_ms': list(LATENCY_BUCKETS_MS) + ['inf'],
+            'query_buckets': list(QUERY_BUCKETS) + ['inf'],
+            'routes': routes,
+        }
+
+
+def _finish(metrics, g, request, status):
+    # Ends the request's measurement; (stats, elapsed), or None if it was already ended
+    token, started = g.pop('db_metrics', (None, None))
+    if token is None:
+        return None
+    elapsed = time.perf_counter() - started
+    return metrics.finish(token, request.endpoint or '<unmatched>', request.method, status, elapsed), elapsed
+
+
+def init_app(app, metrics):
+    # Measures every request of a Flask app through `metrics`
+    @app.before_request
+    def start_db_metrics():
+        g.db_metrics = (metrics.start(), time.perf_counter())
+
+    @app.after_request
+    def finish_db_metrics(response):
+        finished = _finish(metrics, g, request, response.status_code)
+        if finished is not None:
+            response.headers['Server-Timing'] = metrics.server_timing(*finished)
+        return response
+
+    @app.teardown_request
+    def drop_db_metrics(exc):
+        # A request that raised never reached after_request
+        _finish(metrics, g, request, 500)
+
+
+def init_async_app(app, metrics):
+    # init_app() for the Quart app of ASYNC_APP, into the same `metrics`. The
+    # hooks are coroutines so they run in the request's own context, where
+    # ASYNC_DB records its statements.
+    from quart import g as quart_g, request as quart_request
+
+    @app.before_request
+    async def start_db_metrics():
+        quart_g.db_metrics = (metrics.start(), time.perf_counter())
+
+    @app.after_request
+    async def finish_db_metrics(response):
+        finished = _finish(metrics, quart_g, quart_request, response.status_code)
+        if finished is not None:
+            response.headers['Server-Timing'] = metrics.server_timing(*finished)
+        return response
+
+    @app.teardown_request
+    async def drop_db_metrics(exc):
+        _finish(metrics, quart_g, quart_request, 500)
@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    # Bounded pool of DB connections shared by every request.
+    # Connections are opened lazily up to `size`; callers that find the pool
+    # exhausted wait up to `timeout` seconds before PoolTimeout is raised.
+    def __init__(self, factory, size=10, timeout=5.0, max_idle=30.0, leak_after=60.0):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.leak_after = leak_after
+        self._lock = threading.Condition()
+        self._idle = []            # [(conn, released_at)]
+        self._in_use = {}          # id(conn) -> (conn, checked_out_at, stack)
+        self._opened = 0
+        self._waiters = 0
+        self._reported = set()
+        self._stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'created': 0,
+            'discarded': 0,
+            'leaks': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+        }
+
+    def _open(self):
+        conn = self.factory()
+        self._stats['created'] += 1
+        return conn
+
+    def _discard(self, conn):
+        self._stats['discarded'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, conn, released_at):
+        # Only ping connections that sat idle long enough for the server to drop them
+        if time.monotonic() - released_at < self.max_idle:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _check_leaks(self, now):
+        for key, (conn, since, stack) in self._in_use.items():
+            if now - since > self.leak_after and key not in self._reported:
+                self._reported.add(key)
+                self._stats['leaks'] += 1
+                log.warning("DB connection held for %.1fs, checked out at:\n%s", now - since, ''.join(stack))
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._lock:
+            self._check_leaks(start)
+            while True:
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._opened < self.size:
+                    self._opened += 1
+                    conn, released_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    self._check_leaks(time.monotonic())
+                    raise PoolTimeout("no DB connection available after %.1fs (%d in use)" % (self.timeout, len(self._in_use)))
+                # Only callers actually blocked on the pool count as waiters
+                self._waiters += 1
+                try:
+                    self._lock.wait(remaining)
+                finally:
+                    self._waiters -= 1
+
+        # Connect / health-check outside the lock so other callers are not blocked
+        try:
+            if conn is not None and not self._healthy(conn, released_at):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+                self._lock.notify()
+            raise
+
+        now = time.monotonic()
+        waited = now - start
+        with self._lock:
+            self._in_use[id(conn)] = (conn, now, traceback.format_stack(limit=8)[:-2])
+            self._stats['checkouts'] += 1
+            self._stats['wait_total'] += waited
+            self._stats['wait_max'] = max(self._stats['wait_max'], waited)
+        return conn
+
+    def release(self, conn, broken=False):
+        if not broken:
+            try:
+                # Never hand the next caller a half-finished transaction
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                broken = True
+        with self._lock:
+            self._in_use.pop(id(conn), None)
+            self._reported.discard(id(conn))
+            if broken:
+                self._opened -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+        if broken:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self.size,
+                'open': self._opened,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'waiters': self._waiters,
+                'wait_avg': stats['wait_total'] / stats['checkouts'] if stats['checkouts'] else 0.0,
+            })
+            return stats
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+        for conn, _ in idle:
+            self._discard(conn)
@@ -0,0 +1,147 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_email(email):
+    # USERS.EMAIL compares case-insensitively, so the filter must too
+    return (email or '').strip().lower()
+
+
+class BloomFilter:
+    # Fixed-size Bloom filter: no false negatives, about `error_rate` false
+    # positives once `capacity` items are in. Bit positions come from one
+    # blake2b digest split into two 64-bit halves (Kirsch-Mitzenmacher).
+    def __init__(self, capacity=1000000, error_rate=0.01):
+        self.bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self._array[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self._array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RateLimiter:
+    # Token bucket per client key: `rate` requests a second sustained, `burst` at once.
+    def __init__(self, rate=5.0, burst=20, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()    # key -> (tokens, updated_at)
+
+    def allow(self, key):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return allowed
+
+
+class EmailRegistry:
+    # Answers "is this email registered?" A Bloom filter says no for most new
+    # emails with no query at all. Any maybe is confirmed with one lookup on the
+    # unique EMAIL index.
+    #
+    # The filter only ever grows: this worker's register() adds to it, and
+    # users created by other workers are picked up by catch_up(), at most every
+    # `refresh_every` seconds, through a USER_ID range scan.
+    def __init__(self, capacity=1000000, error_rate=0.01, refresh_every=30.0):
+        self.refresh_every = refresh_every
+        self._filter = BloomFilter(capacity, error_rate)
+        self._lock = threading.Lock()
+        self._last_user_id = None
+        self._refreshed_at = None
+        self._stats = {
+            'checks': 0,
+            'filter_negatives': 0,
+            'db_hits': 0,
+            'false_positives': 0,
+            'rate_limited': 0,
+        }
+
+    def _load(self, cursor, after):
+        cursor.execute("SELECT user_id, email FROM USERS WHERE user_id > %s ORDER BY user_id", (after,))
+        while True:
+            rows = cursor.fetchmany(5000)
+            if not rows:
+                break
+            with self._lock:
+                for user_id, email in rows:
+                    self._filter.add(normalize_email(email))
+                    self._last_user_id = max(self._last_user_id or 0, user_id)
+        self._refreshed_at = time.monotonic()
+
+    def warm(self, cursor):
+        self._load(cursor, 0)
+
+    def catch_up(self, cursor):
+        self._load(cursor, self._last_user_id or 0)
+
+    @property
+    def warmed(self):
+        return self._refreshed_at is not None
+
+    def add(self, email):
+        with self._lock:
+            self._filter.add(normalize_email(email))
+
+    def exists(self, email, connection):
+        # `connection` is a zero-argument context manager factory, e.g.
+        # db_pool.connection; it is only entered when the DB must be asked
+        email = normalize_email(email)
+        with self._lock:
+            self._stats['checks'] += 1
+            stale = self._refreshed_at is None or time.monotonic() - self._refreshed_at >= self.refresh_every
+        if email not in self._filter and not stale:
+            with self._lock:
+                self._stats['filter_negatives'] += 1
+            return False
+        with connection() as conn:
+            cursor = conn.cursor()
+            if stale:
+                self.catch_up(cursor)
+            if email not in self._filter:
+                cursor.close()
+                with self._lock:
+                    self._stats['filter_negatives'] += 1
+                return False
+            cursor.execute("SELECT 1 FROM USERS WHERE EMAIL = %s LIMIT 1;", (email,))
+            found = cursor.fetchone() is not None
+            cursor.close()
+        with self._lock:
+            self._stats['db_hits' if found else 'false_positives'] += 1
+        return found
+
+    def limited(self):
+        with self._lock:
+            self._stats['rate_limited'] += 1
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['filter_items'] = self._filter.count
+            stats['filter_bits'] = self._filter.bits
+            stats['filter_hashes'] = self._filter.hashes
+        checks = stats['checks'] or 1
+        stats['filter_negative_ratio'] = stats['filter_negatives'] / checks
+        stats['false_positive_ratio'] = stats['false_positives'] / checks
+        return stats
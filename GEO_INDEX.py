@@ -0,0 +1,226 @@
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Coordinates of every locality a user or theater can be in
+LOCATIONS = {
+    "ANNA NAGAR": (13.0878, 80.2174),
+    "T. NAGAR": (13.0394, 80.2337),
+    "ADYAR": (13.0064, 80.2575),
+    "MYLAPORE": (13.0316, 80.2670),
+    "NUNGAMBAKKAM": (13.0620, 80.2405),
+    "ALWARPET": (13.0334, 80.2546),
+    "EGMORE": (13.0827, 80.2707),
+    "KILPAUK": (13.0827, 80.2437),
+    "SAIDAPET": (13.0203, 80.2224),
+    "VELACHERY": (12.9802, 80.2228),
+    "GUINDY": (13.0067, 80.2206),
+    "THIRUVANMIYUR": (12.9869, 80.2615),
+    "PORUR": (13.0324, 80.1679),
+    "MOGAPPAIR": (13.0832, 80.1674),
+    "ANNA SALAI": (13.0572, 80.2668),
+    "MAMBALAM": (13.0355, 80.2274),
+    "KODAMBAKKAM": (13.0512, 80.2206),
+    "MOUNT ROAD": (13.0626, 80.2696),
+    "PALLIKARANAI": (12.9329, 80.2135),
+    "ASHOK NAGAR": (13.0402, 80.2123),
+    "CHROMPET": (12.9517, 80.1401),
+    "AMBATTUR": (13.1075, 80.1648),
+    "TAMBARAM": (12.9246, 80.1479),
+    "VADAPALANI": (13.0501, 80.2120),
+    "ROYAPETTAH": (13.0581, 80.2641),
+    "SHOLINGANALLUR": (12.8990, 80.2279),
+    "AVADI": (13.1167, 80.1010),
+    "ENNORE": (13.2161, 80.3231),
+    "PALLAVARAM": (12.9686, 80.1504),
+    "VANAGARAM": (13.0733, 80.2090),
+}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    # Great-circle distance, broadcasting over NumPy arrays of degrees
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class TheaterGrid:
+    # Spatial hash of theater coordinates on a `cell_deg` lat/lon grid, updated
+    # in place as theaters come and go. nearest() walks rings of cells outwards
+    # from the query point and stops once no unvisited cell can beat the k-th hit.
+    def __init__(self, cell_deg=0.05):
+        self.cell_deg = cell_deg
+        self.cells = {}      # (row, col) -> {theater_id: (lat, lon)}
+        self.where = {}      # theater_id -> (row, col)
+
+    def _cell(self, lat, lon):
+        return (int(np.floor(lat / self.cell_deg)), int(np.floor(lon / self.cell_deg)))
+
+    def add(self, theater_id, lat, lon):
+        self.remove(theater_id)
+        cell = self._cell(lat, lon)
+        self.cells.setdefault(cell, {})[theater_id] = (lat, lon)
+        self.where[theater_id] = cell
+
+    def remove(self, theater_id):
+        cell = self.where.pop(theater_id, None)
+        if cell is not None:
+            members = self.cells[cell]
+            del members[theater_id]
+            if not members:
+                del self.cells[cell]
+
+    def _ring(self, center, r):
+        ci, cj = center
+        if r == 0:
+            yield center
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield (ci - r, j)
+            yield (ci + r, j)
+        for i in range(ci - r + 1, ci + r):
+            yield (i, cj - r)
+            yield (i, cj + r)
+
+    def _cell_km(self, lat, r):
+        # Narrowest side of a cell within r rings of `lat` (longitude cells shrink poleward)
+        lat_edge = min(89.0, abs(lat) + (r + 1) * self.cell_deg)
+        return self.cell_deg * np.radians(1) * EARTH_RADIUS_KM * np.cos(np.radians(lat_edge))
+
+    def nearest(self, lat, lon, k, radius_km=None, allowed=None):
+        # Up to k (distance_km, theater_id) pairs nearest first, only ids in
+        # `allowed` when given and only within `radius_km` when given
+        center = self._cell(lat, lon)
+        hits = []
+        seen = 0
+        r = 0
+        while seen < len(self.cells):
+            if 8 * r >= len(self.cells) - seen:
+                # The ring is now bigger than what is left: finish with a flat scan
+                cells = [cell for cell in self.cells if max(abs(cell[0] - center[0]), abs(cell[1] - center[1])) >= r]
+                r = None
+            else:
+                cells = [cell for cell in self._ring(center, r) if cell in self.cells]
+            seen += len(cells)
+            ids, coords = [], []
+            for cell in cells:
+                for theater_id, point in self.cells[cell].items():
+                    if allowed is None or theater_id in allowed:
+                        ids.append(theater_id)
+                        coords.append(point)
+            if ids:
+                coords = np.array(coords, dtype=float)
+                hits.extend(zip(haversine_km(lat, lon, coords[:, 0], coords[:, 1]).tolist(), ids))
+                hits.sort()
+            if r is None:
+                break
+            # Every theater in an unvisited cell is at least this far away
+            bound = r * self._cell_km(lat, r)
+            if len(hits) >= k and hits[k - 1][0] <= bound:
+                break
+            if radius_km is not None and bound > radius_km:
+                break
+            r += 1
+        if radius_km is not None:
+            hits = [hit for hit in hits if hit[0] <= radius_km]
+        return hits[:k]
+
+
+class TheaterGeoIndex:
+    # Distance from every known locality to every theater, plus a TheaterGrid for
+    # k-nearest searches. `theaters` are (theater_id, theater_name, location) rows;
+    # theaters whose location has no coordinates are left out, as the old
+    # per-request loop did. add/remove/update keep both structures current
+    # without a rebuild.
+    def __init__(self, theaters, locations=LOCATIONS, cell_deg=0.05):
+        self._lock = threading.RLock()
+        self.locations = locations
+        self.city_row = {name: i for i, name in enumerate(locations)}
+        self.city = np.array([locations[name] for name in locations], dtype=float).reshape(-1, 2)
+        self.grid = TheaterGrid(cell_deg)
+
+        rows = [t for t in theaters if t[2] in locations]
+        self.theater_ids = [t[0] for t in rows]
+        self.names = [t[1] for t in rows]
+        self.theater_locations = [t[2] for t in rows]
+        self._reindex()
+        coords = np.array([locations[t[2]] for t in rows], dtype=float).reshape(-1, 2)
+        for theater_id, (lat, lon) in zip(self.theater_ids, coords.tolist()):
+            self.grid.add(theater_id, lat, lon)
+        # (localities x theaters) distance matrix and each locality's theaters nearest first
+        self.distances = haversine_km(self.city[:, :1], self.city[:, 1:], coords[:, 0], coords[:, 1])
+        self.order = np.argsort(self.distances, axis=1, kind='stable')
+
+    def _reindex(self):
+        self.ids = np.array(self.theater_ids, dtype=np.int64)
+        self.column = {theater_id: j for j, theater_id in enumerate(self.theater_ids)}
+
+    def add(self, theater_id, name, location):
+        with self._lock:
+            self.remove(theater_id)
+            if location not in self.locations:
+                return
+            lat, lon = self.locations[location]
+            col = haversine_km(self.city[:, 0], self.city[:, 1], lat, lon)
+            j = len(self.theater_ids)
+            self.theater_ids.append(theater_id)
+            self.names.append(name)
+            self.theater_locations.append(location)
+            self._reindex()
+            order = np.empty((len(self.city), j + 1), dtype=np.int64)
+            for row in range(len(self.city)):
+                # Slot the new theater into each locality's sorted order
+                pos = np.searchsorted(self.distances[row, self.order[row]], col[row], side='right')
+                order[row] = np.insert(self.order[row], pos, j)
+            self.distances = np.hstack([self.distances, col[:, None]])
+            self.order = order
+            self.grid.add(theater_id, lat, lon)
+
+    def remove(self, theater_id):
+        with self._lock:
+            j = self.column.get(theater_id)
+            if j is None:
+                return
+            del self.theater_ids[j], self.names[j], self.theater_locations[j]
+            self._reindex()
+            self.distances = np.delete(self.distances, j, axis=1)
+            order = self.order[self.order != j].reshape(len(self.city), -1)
+            order[order > j] -= 1
+            self.order = order
+            self.grid.remove(theater_id)
+
+    def update(self, theater_id, name, location):
+        self.add(theater_id, name, location)
+
+    def nearest(self, city, theater_ids=None):
+        # (id, name, location, whole km) tuples nearest first, optionally only for
+        # `theater_ids`. An unknown city gets the theaters unsorted with no distance.
+        with self._lock:
+            row = self.city_row.get(city)
+            if row is None:
+                keep = range(len(self.theater_ids))
+                if theater_ids is not None:
+                    keep = [j for j in keep if self.theater_ids[j] in theater_ids]
+                return [(self.theater_ids[j], self.names[j], self.theater_locations[j], None) for j in keep]
+            order = self.order[row]
+            if theater_ids is not None:
+                order = order[np.isin(self.ids[order], np.fromiter(theater_ids, dtype=np.int64))]
+            km = self.distances[row, order].astype(np.int64)
+            return [(self.theater_ids[j], self.names[j], self.theater_locations[j], d) for j, d in zip(order.tolist(), km.tolist())]
+
+    def search(self, city, theater_ids=None, radius_km=None, offset=0, limit=20):
+        # One page of the nearest theaters (optionally only `theater_ids`, only within
+        # `radius_km`) through the grid. Returns (rows, has_more).
+        with self._lock:
+            if city not in self.locations:
+                rows = self.nearest(city, theater_ids)
+                return rows[offset:offset + limit], len(rows) > offset + limit
+            lat, lon = self.locations[city]
+            hits = self.grid.nearest(lat, lon, offset + limit + 1, radius_km, theater_ids)
+            rows = []
+            for d, theater_id in hits[offset:offset + limit]:
+                j = self.column[theater_id]
+                rows.append((theater_id, self.names[j], self.theater_locations[j], int(d)))
+            return rows, len(hits) > offset + limit
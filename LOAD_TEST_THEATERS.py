@@ -0,0 +1,105 @@
+# Many concurrent sessions browse different theaters and open a seat map; every
+# session must end up on the theater it picked. Runs against a threaded
+# in-process server on the configured database, or against --url.
+#
+#   python LOAD_TEST_THEATERS.py --clients 32 --rounds 20
+import argparse
+import http.cookiejar
+import logging
+import re
+import threading
+import time
+import urllib.request
+from collections import Counter
+
+from werkzeug.serving import make_server
+
+from USER_BACK import app, db_pool
+
+LINK = re.compile(r'href="(/bookings/(\d+)/\d+/\d+/[^/"]+/[^"]+)"')
+
+
+def pick_shows(limit):
+    # One scheduled show for each of up to `limit` theaters
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""SELECT THEATER_ID, MIN(SHOW_DATE) FROM TM GROUP BY THEATER_ID ORDER BY THEATER_ID LIMIT %s""", (limit,))
+        rows = cursor.fetchall()
+        cursor.close()
+    return rows
+
+
+def session_of(jar):
+    # The session behind the cookie, in the store this process shares with --url
+    # only when that is a SqliteSessionStore on the same file
+    for cookie in jar:
+        if cookie.name == app.config['SESSION_COOKIE_NAME']:
+            return app.session_interface.load(cookie.value)
+    return {}
+
+
+def client(base, theaters, rounds, start, barrier, results, lock):
+    def count(key):
+        with lock:
+            results[key] += 1
+    barrier.wait()
+    for i in range(rounds):
+        theater_id, show_date = theaters[(start + i) % len(theaters)]
+        jar = http.cookiejar.CookieJar()
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+        try:
+            page = opener.open('%s/mt_movies/%s?start=%s&days=1' % (base, theater_id, show_date)).read().decode()
+            links = LINK.findall(page)
+            if not links:
+                count('no_shows')
+                continue
+            if any(int(linked) != theater_id for _, linked in links):
+                count('wrong_link')
+            opener.open(base + links[0][0]).read()
+            if session_of(jar).get('th_s') == theater_id:
+                count('ok')
+            else:
+                count('wrong_theater')
+        except Exception:
+            count('errors')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that concurrent sessions book the theater they picked")
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--url', help="test a running server instead of an in-process one (needs a shared SqliteSessionStore)")
+    args = parser.parse_args()
+
+    theaters = pick_shows(args.clients)
+    if len(theaters) < 2:
+        raise SystemExit("need shows in at least two theaters")
+    server = None
+    base = args.url
+    if base is None:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = 'http://127.0.0.1:%d' % server.server_port
+
+    results = Counter()
+    barrier = threading.Barrier(args.clients)
+    lock = threading.Lock()
+    threads = [threading.Thread(target=client, args=(base, theaters, args.rounds, n, barrier, results, lock)) for n in range(args.clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if server is not None:
+        server.shutdown()
+
+    print("%d clients x %d rounds over %d theaters in %.1fs" % (args.clients, args.rounds, len(theaters), elapsed))
+    for key in ('ok', 'wrong_theater', 'wrong_link', 'no_shows', 'errors'):
+        print("%-14s %d" % (key, results[key]))
+    raise SystemExit(1 if results['wrong_theater'] or results['wrong_link'] or results['errors'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+import base64
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+SEAT_ID = re.compile(r'^([pe])seat(\d+)$')
+
+
+def parse_seat(seat):
+    # 'pseat17' -> ('p', 17), 'eseat42' -> ('e', 42)
+    match = SEAT_ID.match(seat)
+    if not match:
+        raise ValueError("bad seat id: %r" % (seat,))
+    return match.group(1), int(match.group(2))
+
+
+def seat_label(seat):
+    # 'pseat17' -> 'P17', as printed on the ticket
+    kind, number = parse_seat(seat)
+    return kind.upper() + str(number)
+
+
+class ShowOccupancy:
+    # One bit per seat of a show: premium seats first, then elite seats.
+    # Serialized as a 4 byte header (premium, elite as little-endian uint16)
+    # followed by the bits, so a 300 seat screen takes 42 bytes.
+    __slots__ = ('premium', 'elite', 'bits')
+
+    def __init__(self, premium, elite, bits=None):
+        self.premium = premium
+        self.elite = elite
+        size = (premium + elite + 7) // 8
+        self.bits = bytearray(bits) if bits is not None else bytearray(size)
+        if len(self.bits) != size:
+            raise ValueError("occupancy needs %d bytes, got %d" % (size, len(self.bits)))
+
+    def index(self, seat):
+        kind, number = parse_seat(seat)
+        limit = self.premium if kind == 'p' else self.elite
+        if not 1 <= number <= limit:
+            raise ValueError("seat %s is not on this screen" % seat)
+        return number - 1 if kind == 'p' else self.premium + number - 1
+
+    def test(self, seat):
+        i = self.index(seat)
+        return bool(self.bits[i >> 3] & (1 << (i & 7)))
+
+    def set(self, seat):
+        i = self.index(seat)
+        self.bits[i >> 3] |= 1 << (i & 7)
+
+    def update(self, seats):
+        # Seats that do not fit the screen layout (e.g. after a screen edit) are skipped
+        for seat in seats:
+            try:
+                self.set(seat)
+            except ValueError:
+                pass
+
+    def booked_count(self):
+        return int.from_bytes(self.bits, 'little').bit_count()
+
+    def load_factor(self):
+        # Fraction of the screen sold, 0 to 1
+        total = self.premium + self.elite
+        return self.booked_count() / total if total else 0.0
+
+    def available(self):
+        return self.premium + self.elite - self.booked_count()
+
+    def seats(self):
+        for i in range(self.premium + self.elite):
+            if self.bits[i >> 3] & (1 << (i & 7)):
+                yield 'pseat%d' % (i + 1) if i < self.premium else 'eseat%d' % (i - self.premium + 1)
+
+    def copy(self):
+        return ShowOccupancy(self.premium, self.elite, self.bits)
+
+    def to_bytes(self):
+        return struct.pack('<HH', self.premium, self.elite) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        premium, elite = struct.unpack_from('<HH', data)
+        return cls(premium, elite, data[4:])
+
+    def pack(self):
+        # Payload for BOOKINGS.html, decoded by unpackOccupancy() there
+        return base64.b64encode(self.to_bytes()).decode('ascii')
+
+
+class OccupancyCache:
+    # Occupancy bitsets per show, keyed like SEAT_HOLDS.show_key. A miss costs one
+    # query through `load`; pay() sets the seats it just sold so the next seat map
+    # needs no query at all. Entries expire after `ttl` seconds so bookings made
+    # by other worker processes show up quickly.
+    def __init__(self, ttl=30.0, max_shows=50000):
+        self.ttl = ttl
+        self.max_shows = max_shows
+        self._lock = threading.Lock()
+        self._shows = OrderedDict()    # show -> (ShowOccupancy, loaded_at)
+
+    def _cached(self, show, layout, now):
+        with self._lock:
+            entry = self._shows.get(show)
+            if entry is not None and now - entry[1] < self.ttl and (entry[0].premium, entry[0].elite) == tuple(layout):
+                self._shows.move_to_end(show)
+                return entry[0].copy()
+        return None
+
+    def _store(self, show, layout, seats, now):
+        occ = ShowOccupancy(*layout)
+        occ.update(seats)
+        with self._lock:
+            self._shows[show] = (occ, now)
+            self._shows.move_to_end(show)
+            while len(self._shows) > self.max_shows:
+                self._shows.popitem(last=False)
+            return occ.copy()
+
+    def get(self, show, layout, load):
+        # `layout` is (premium, elite) seat counts of the screen; returns a copy
+        # the caller may mark further seats on
+        now = time.monotonic()
+        occ = self._cached(show, layout, now)
+        if occ is None:
+            occ = self._store(show, layout, load(), now)
+        return occ
+
+    async def aget(self, show, layout, load):
+        # get() with a coroutine function as `load`, for the async app
+        now = time.monotonic()
+        occ = self._cached(show, layout, now)
+        if occ is None:
+            occ = self._store(show, layout, await load(), now)
+        return occ
+
+    def add(self, show, seats):
+        with self._lock:
+            entry = self._shows.get(show)
+            if entry is not None:
+                entry[0].update(seats)
+
+    def invalidate(self, show=None):
+        with self._lock:
+            if show is None:
+                self._shows.clear()
+            else:
+                self._shows.pop(show, None)
@@ -0,0 +1,106 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import make_response, request
+from markupsafe import escape
+
+# Stand-ins for the `details` tuple (name, email, phone, location, extra) the
+# user pages print in their header. Pages are rendered once with these and each
+# user's values are spliced in per request.
+DETAIL_SLOTS = tuple('\x00detail%d\x00' % i for i in range(5))
+
+
+def splice(body, details):
+    for slot, value in zip(DETAIL_SLOTS, details):
+        body = body.replace(slot, str(escape(value)))
+    return body
+
+
+class PageCache:
+    # Rendered catalog pages keyed by what they are built from; callers put the
+    # catalog table versions (CatalogCache.version), city and date in the key, so
+    # an admin write that invalidates a table also retires its pages. Entries
+    # expire after `ttl` seconds and the least recently used go past `max_pages`.
+    #
+    # Responses carry a strong ETag over the page and the user's details, and a
+    # matching If-None-Match is answered 304 without splicing or sending the page.
+    def __init__(self, max_pages=5000, ttl=300.0):
+        self.max_pages = max_pages
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()    # key -> (body, digest, rendered_at)
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'not_modified': 0}
+
+    def _cached(self, key):
+        # (body, digest) of a live entry, or None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None and now - entry[2] < self.ttl:
+                self._pages.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0], entry[1]
+            self._stats['misses'] += 1
+        return None
+
+    def _store(self, key, body, now):
+        digest = hashlib.blake2b(body.encode('utf-8'), digest_size=16).digest()
+        with self._lock:
+            self._pages[key] = (body, digest, now)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+                self._stats['evictions'] += 1
+        return body, digest
+
+    def page(self, key, render, slots):
+        # (body with detail slots, digest of it), rendering on a miss
+        now = time.monotonic()
+        return self._cached(key) or self._store(key, render(slots), now)
+
+    async def apage(self, key, render, slots):
+        # page() with a coroutine function as `render`, for the async app
+        now = time.monotonic()
+        return self._cached(key) or self._store(key, await render(slots), now)
+
+    def _etag(self, digest, details, request):
+        # (etag, whether the client already has it)
+        etag = hashlib.blake2b(digest + repr(tuple(details)).encode('utf-8'), digest_size=16).hexdigest()
+        if request.if_none_match.contains(etag):
+            with self._lock:
+                self._stats['not_modified'] += 1
+            return etag, True
+        return etag, False
+
+    @staticmethod
+    def _headers(response, etag):
+        response.set_etag(etag)
+        # Pages are per user and must be revalidated on every visit
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def respond(self, key, render, details):
+        # `render(details)` renders the page's template with the given details tuple
+        body, digest = self.page(key, render, DETAIL_SLOTS[:len(details)])
+        etag, fresh = self._etag(digest, details, request)
+        response = make_response('', 304) if fresh else make_response(splice(body, details))
+        return self._headers(response, etag)
+
+    async def arespond(self, key, render, details):
+        # respond() for the Quart app (ASYNC_APP), with a coroutine function as
+        # `render`; quart is only needed in that serving mode
+        from quart import make_response as quart_response, request as quart_request
+        body, digest = await self.apage(key, render, DETAIL_SLOTS[:len(details)])
+        etag, fresh = self._etag(digest, details, quart_request)
+        response = await quart_response('', 304) if fresh else await quart_response(splice(body, details))
+        return self._headers(response, etag)
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pages'] = len(self._pages)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,134 @@
+import argparse
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from OCCUPANCY import parse_seat
+from SCHEDULE_VALIDATOR import parse_time
+
+TAX_RATE = Decimal('0.18')
+BOOKING_FEE = Decimal('25')
+# (elite, premium) seat prices when no PRICE_RULES row matches, the old fixed prices
+DEFAULT_PRICES = (Decimal('150'), Decimal('190'))
+
+# Day parts by show start time, as PRICE_RULES.DAY_PART names them
+DAY_PARTS = ((timedelta(hours=20), 'NIGHT'), (timedelta(hours=16), 'EVENING'), (timedelta(hours=12), 'MATINEE'), (timedelta(0), 'MORNING'))
+
+# Every price and surge rule that can apply to a theater, in one round trip
+RULES_QUERY = """
+    SELECT 'PRICE', THEATER_ID, SCREEN_ID, SHOW_DATE, SHOW_TIME, DAY_PART, DAY_OF_WEEK, ELITE_PRICE, PREMIUM_PRICE
+    FROM PRICE_RULES WHERE THEATER_ID = %s OR THEATER_ID IS NULL
+    UNION ALL
+    SELECT 'SURGE', THEATER_ID, NULL, NULL, NULL, NULL, NULL, MIN_OCCUPANCY, MULTIPLIER
+    FROM SURGE_RULES WHERE THEATER_ID = %s OR THEATER_ID IS NULL
+"""
+
+Quote = namedtuple('Quote', 'elite_count premium_count elite_price premium_price multiplier elite_cost premium_cost seat_total tax fee total')
+
+
+def day_part(show_time):
+    for start, name in DAY_PARTS:
+        if show_time >= start:
+            return name
+    return DAY_PARTS[-1][1]
+
+
+def money(value):
+    return value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+class TheaterPrices:
+    # The rules of one theater, ordered so the first match is the most specific.
+    # The theater's own rules all beat the chain-wide ones, so a local price is
+    # never overridden by a chain holiday price; within each, a show (date and
+    # time) beats a screen, a screen the whole theater, then a day part beats a
+    # weekday. NULL columns match anything.
+    __slots__ = ('prices', 'surges')
+
+    def __init__(self, rows):
+        prices, surges = [], []
+        for kind, theater_id, screen_id, show_date, show_time, part, weekday, first, second in rows:
+            if kind == 'PRICE':
+                rank = (theater_id is not None, show_date is not None, show_time is not None, screen_id is not None, part is not None, weekday is not None)
+                prices.append((rank, (screen_id, show_date, show_time, part, weekday), (Decimal(first), Decimal(second))))
+            else:
+                surges.append((Decimal(first), theater_id is not None, Decimal(second)))
+        prices.sort(key=lambda rule: rule[0], reverse=True)
+        # Highest threshold first; the theater's own rule first on a tie
+        surges.sort(reverse=True)
+        self.prices = [(match, seat_prices) for _, match, seat_prices in prices]
+        self.surges = [(threshold, multiplier) for threshold, _, multiplier in surges]
+
+    def base(self, screen_id, show_date, show_time):
+        # (elite, premium) before surge
+        show = (screen_id, show_date, show_time, day_part(show_time), show_date.weekday())
+        for match, seat_prices in self.prices:
+            if all(wanted is None or wanted == value for wanted, value in zip(match, show)):
+                return seat_prices
+        return DEFAULT_PRICES
+
+    def multiplier(self, load_factor):
+        # Surge for a show whose seats are `load_factor` (0 to 1) sold
+        for threshold, multiplier in self.surges:
+            if load_factor >= threshold:
+                return multiplier
+        return Decimal(1)
+
+
+class PricingEngine:
+    # Seat prices from the PRICE_RULES and SURGE_RULES tables (static/PRICING.sql),
+    # cached per theater in the catalog cache under 'PRICES', so a quote is a scan
+    # of a few cached rules plus one pass over the seats. After editing the rule
+    # tables call catalog_cache.invalidate('PRICES'); otherwise they are reread
+    # after the cache ttl.
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def theater(self, theater_id):
+        theater_id = int(theater_id)
+        return self.catalog.cache.get('PRICES', theater_id, lambda: TheaterPrices(self.catalog.query(RULES_QUERY, (theater_id, theater_id))))
+
+    def quote(self, theater_id, screen_id, show_date, show_time, seats, load_factor=0.0):
+        # Prices `seats` ('pseat3', 'eseat7', ...) for one show; `show_date` and
+        # `show_time` may be ISO strings or date/timedelta values
+        if not isinstance(show_date, date):
+            show_date = date.fromisoformat(show_date)
+        show_time = parse_time(show_time)
+        rules = self.theater(theater_id)
+        premium_count = sum(1 for seat in seats if parse_seat(seat)[0] == 'p')
+        elite_count = len(seats) - premium_count
+        elite, premium = rules.base(int(screen_id), show_date, show_time)
+        multiplier = rules.multiplier(load_factor)
+        if multiplier != 1:
+            # Surge prices are rounded to whole rupees
+            elite = (elite * multiplier).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+            premium = (premium * multiplier).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+        elite_cost = elite * elite_count
+        premium_cost = premium * premium_count
+        seat_total = elite_cost + premium_cost
+        tax = money(seat_total * TAX_RATE)
+        return Quote(elite_count, premium_count, elite, premium, multiplier, money(elite_cost), money(premium_cost),
+                     money(seat_total), tax, BOOKING_FEE, money(seat_total + tax + BOOKING_FEE))
+
+
+if __name__ == '__main__':
+    from USER_BACK import pricing
+
+    parser = argparse.ArgumentParser(description="Quote seats for a show from the price rules, and time the quote")
+    parser.add_argument('theater', type=int)
+    parser.add_argument('screen', type=int)
+    parser.add_argument('date', help="YYYY-MM-DD")
+    parser.add_argument('time', help="HH:MM")
+    parser.add_argument('seats', nargs='+', help="seat ids such as pseat3 eseat7")
+    parser.add_argument('--load', type=float, default=0.0, help="fraction of the show already sold (0 to 1), for surge rules")
+    parser.add_argument('--repeat', type=int, default=10000)
+    args = parser.parse_args()
+
+    quote = pricing.quote(args.theater, args.screen, args.date, args.time, args.seats, args.load)
+    for field, value in zip(Quote._fields, quote):
+        print("%-14s %s" % (field, value))
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        pricing.quote(args.theater, args.screen, args.date, args.time, args.seats, args.load)
+    print("%.1f us per quote (rules cached)" % ((time.perf_counter() - started) / args.repeat * 1e6))
@@ -0,0 +1,57 @@
+import time
+
+import mysql.connector
+from mysql.connector import errorcode
+
+# Deadlocks and lock wait timeouts are retried, duplicate seats are not
+RETRY_ERRORS = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+MAX_ATTEMPTS = 3
+
+
+class SeatConflict(Exception):
+    def __init__(self, seats):
+        self.seats = seats
+        super().__init__("Seats already booked: " + ', '.join(seats))
+
+
+def taken_seats(cursor, theater_id, screen_id, day, show_time, seats):
+    placeholders = ', '.join(['%s'] * len(seats))
+    cursor.execute(
+        "SELECT SEATS FROM SEATS_BOOKED WHERE THEATER_ID = %s AND SCREEN_ID = %s AND DAY = %s AND SHOW_TIME = %s AND SEATS IN (" + placeholders + ")",
+        (theater_id, screen_id, day, show_time, *seats))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def reserve_seats(conn, user_id, movie_id, theater_id, screen_id, day, show_time, seats, e_count, p_count, price, seat_total):
+    # Books `seats` for one show in a single transaction and returns the new BOOKING_ID.
+    # `price` is the amount paid and `seat_total` what the seats sold for (PRICING.Quote).
+    # uq_show_seat (static/RESERVATION.sql) makes a second sale of the same seat fail,
+    # which is reported as SeatConflict listing the seats that were already gone.
+    if not seats:
+        raise ValueError("no seats selected")
+    # Same lock order for every checkout keeps concurrent inserts from deadlocking
+    seats = sorted(set(seats))
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        cursor = conn.cursor()
+        try:
+            # autocommit is off, so both INSERTs and the commit below are one transaction
+            cursor.execute(
+                "INSERT INTO BOOKINGS (user_id, movie_id, theater_id, screen_id, day, show_time, no_of_elite_seats, no_of_premium_seats, price, seat_total) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                (user_id, movie_id, theater_id, screen_id, day, show_time, e_count, p_count, price, seat_total))
+            booking_id = cursor.lastrowid
+            # executemany on an INSERT is sent as one multi-row statement
+            cursor.executemany(
+                "INSERT INTO SEATS_BOOKED (booking_id, theater_id, screen_id, day, show_time, seats) VALUES (%s, %s, %s, %s, %s, %s)",
+                [(booking_id, theater_id, screen_id, day, show_time, seat) for seat in seats])
+            conn.commit()
+            return booking_id
+        except mysql.connector.Error as e:
+            conn.rollback()
+            if e.errno == errorcode.ER_DUP_ENTRY:
+                raise SeatConflict(taken_seats(cursor, theater_id, screen_id, day, show_time, seats) or seats)
+            if e.errno in RETRY_ERRORS and attempt < MAX_ATTEMPTS:
+                time.sleep(0.01 * attempt)
+                continue
+            raise
+        finally:
+            cursor.close()
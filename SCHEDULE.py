@@ -0,0 +1,124 @@
+import re
+from datetime import date, datetime, timedelta
+
+WINDOW_DAYS = 7
+
+# Every show of a theater in a date range, in display order, in one round trip
+# (TM's primary key starts with THEATER_ID)
+SCHEDULE_QUERY = """
+    SELECT SHOW_DATE, MOVIE_ID, SCREEN_ID, SHOW_TIME
+    FROM TM
+    WHERE THEATER_ID = %s AND SHOW_DATE BETWEEN %s AND %s
+    ORDER BY SHOW_DATE, MOVIE_ID, SCREEN_ID, SHOW_TIME
+"""
+
+
+def day_label(day):
+    # date(2024, 5, 23) -> '23rd May', as the booking pages have always shown it
+    n = day.day
+    suffix = 'th' if 11 <= n % 100 <= 13 else {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+    return '%d%s %s' % (n, suffix, day.strftime('%B'))
+
+
+def parse_day(value, today=None):
+    # An ISO date ('2024-05-23'), or a legacy '23rd May' label from an old link,
+    # read as the year that puts it nearest the WINDOW_DAYS window the label was
+    # listed in ('2nd Jan' followed late in December is next January). Raises
+    # ValueError for anything else.
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        match = re.match(r'^(\d{1,2})(?:st|nd|rd|th)?\s+([A-Za-z]+)$', value.strip())
+        if not match:
+            raise
+        month = datetime.strptime(match.group(2), '%B').month
+        today = today or date.today()
+        last = today + timedelta(days=WINDOW_DAYS - 1)
+        candidates = []
+        for year in (today.year - 1, today.year, today.year + 1):
+            try:
+                candidates.append(date(year, month, int(match.group(1))))
+            except ValueError:
+                # 29th February outside a leap year, 31st April, ...
+                pass
+        if not candidates:
+            raise ValueError("no such day: %r" % value)
+        return min(candidates, key=lambda day: max((today - day).days, (day - last).days, 0))
+
+
+def show_time(value):
+    # TIME columns come back as timedelta; render them as the HH:MM:SS the URLs use
+    if isinstance(value, timedelta):
+        seconds = int(value.total_seconds())
+        return '%02d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+    return str(value)
+
+
+def _window_keys(theater_id, start, days):
+    start = start or date.today()
+    dates = [start + timedelta(days=i) for i in range(days)]
+    return dates, [('day', theater_id, day) for day in dates]
+
+
+def _span(missing):
+    return min(day for _, _, day in missing), max(day for _, _, day in missing)
+
+
+def _by_day(rows, theater_id, missing):
+    found = {key: [] for key in missing}
+    for show_date, movie_id, screen_id, time in rows:
+        key = ('day', theater_id, show_date)
+        if key in found:
+            found[key].append((movie_id, screen_id, show_time(time)))
+    return found
+
+
+def _group(dates, keys, shows, movies_by_id):
+    schedule = []
+    for day, key in zip(dates, keys):
+        movies = []
+        for movie_id, screen_id, time in shows[key]:
+            movie = movies_by_id.get(movie_id)
+            if movie is None:
+                continue
+            if not movies or movies[-1][0][0] != movie_id:
+                movies.append((movie, []))
+            screens = movies[-1][1]
+            if not screens or screens[-1][0] != screen_id:
+                screens.append((screen_id, []))
+            screens[-1][1].append(time)
+        schedule.append((day, day_label(day), movies))
+    return schedule
+
+
+class ScheduleService:
+    # Showtimes of a theater over a window of days, grouped movie -> screen -> times.
+    # Days are cached one by one in the catalog cache under its 'TM' table, so the
+    # TM write routes that invalidate 'TM' drop them too. A window with uncached
+    # days costs one query spanning those days.
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def _load(self, theater_id, missing):
+        return _by_day(self.catalog.query(SCHEDULE_QUERY, (theater_id, *_span(missing))), theater_id, missing)
+
+    def window(self, theater_id, start=None, days=WINDOW_DAYS):
+        # [(date, label, [(movie_row, [(screen_id, [time, ...]), ...]), ...]), ...]
+        # for `days` days from `start` (today by default); movie_row is as in
+        # Catalog.movies(), and shows of movies no longer in the catalog are skipped
+        theater_id = int(theater_id)
+        dates, keys = _window_keys(theater_id, start, days)
+        shows = self.catalog.cache.get_many('TM', keys, lambda missing: self._load(theater_id, missing))
+        return _group(dates, keys, shows, self.catalog.movie_index())
+
+
+class AsyncScheduleService(ScheduleService):
+    # window() as a coroutine over a CATALOG.AsyncCatalog, sharing the cached days
+    async def _load(self, theater_id, missing):
+        return _by_day(await self.catalog.query(SCHEDULE_QUERY, (theater_id, *_span(missing))), theater_id, missing)
+
+    async def window(self, theater_id, start=None, days=WINDOW_DAYS):
+        theater_id = int(theater_id)
+        dates, keys = _window_keys(theater_id, start, days)
+        shows = await self.catalog.cache.aget_many('TM', keys, lambda missing: self._load(theater_id, missing))
+        return _group(dates, keys, shows, await self.catalog.movie_index())
@@ -0,0 +1,214 @@
+import math
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+from datetime import date, timedelta
+
+from SCHEDULE import show_time as time_label
+
+# Idle time a screen needs between the end of one show and the start of the next
+GAP = timedelta(hours=1)
+
+DUPLICATE = "Another movie is scheduled for the same theater, screen, date, and time."
+TOO_CLOSE = "TIME GAP BETWEEN 2 SCREENINGS SHOULD BE ATLEAST 1 HOUR AFTER THE MOVIE ENDS."
+NO_MOVIE = "MOVIE DOESN'T EXIST."
+NO_SCREEN = "THEATER OR SCREEN DOESN'T EXIST."
+NO_SHOW = "SHOW DOESN'T EXIST."
+
+# One TM row: ints, a date and a timedelta (as TIME columns come back)
+Show = namedtuple('Show', 'theater_id movie_id screen_id show_date show_time')
+# Why row number `index` of a batch was rejected; `other` is the show it clashes with
+RowError = namedtuple('RowError', 'index row message other')
+
+# The TM columns a show's slot (uq_screen_slot) is matched on
+SLOT = "THEATER_ID = %s AND SCREEN_ID = %s AND SHOW_DATE = %s AND SHOW_TIME = %s"
+EXISTING_QUERY = "SELECT THEATER_ID, MOVIE_ID, SCREEN_ID, SHOW_DATE, SHOW_TIME FROM TM WHERE THEATER_ID = %s AND SHOW_DATE BETWEEN %s AND %s"
+
+
+def parse_time(value):
+    # 'HH:MM' or 'HH:MM:SS' (or a timedelta) -> timedelta
+    if isinstance(value, timedelta):
+        return value
+    parts = [int(part) for part in str(value).strip().split(':')]
+    if not 2 <= len(parts) <= 3 or not 0 <= parts[0] < 24 or not all(0 <= part < 60 for part in parts[1:]):
+        raise ValueError("bad show time: %r" % (value,))
+    return timedelta(hours=parts[0], minutes=parts[1], seconds=parts[2] if len(parts) == 3 else 0)
+
+
+def parse_show(values):
+    # (theater_id, movie_id, screen_id, show_date, show_time) as posted or read from a file
+    theater_id, movie_id, screen_id, show_date, show_time = values
+    if not isinstance(show_date, date):
+        show_date = date.fromisoformat(str(show_date).strip())
+    return Show(int(theater_id), int(movie_id), int(screen_id), show_date, parse_time(show_time))
+
+
+def parse_slot(values):
+    # (theater_id, screen_id, show_date, show_time) of the show an edit replaces,
+    # as a Show without a movie
+    theater_id, screen_id, show_date, show_time = values
+    return parse_show((theater_id, 0, screen_id, show_date, show_time))
+
+
+def show_row(show):
+    # Parameters for INSERT INTO TM
+    return (show.theater_id, show.movie_id, show.screen_id, show.show_date.isoformat(), time_label(show.show_time))
+
+
+def slot_row(show):
+    # Parameters for SLOT
+    return (show.theater_id, show.screen_id, show.show_date.isoformat(), time_label(show.show_time))
+
+
+def occupied(run_time):
+    # How long a show keeps its screen: the run time rounded up to whole hours,
+    # as the TM triggers did, plus the gap
+    return timedelta(hours=math.ceil((run_time or 0) / 60)) + GAP
+
+
+class ScreenDay:
+    # The shows of one screen on one day as [start, start + occupied) intervals.
+    # Accepted intervals never overlap, so sorted by start they are also sorted
+    # by end, and a new interval can only overlap its two neighbours: the
+    # interval-tree stabbing query reduces to one bisection.
+    def __init__(self):
+        self.starts = []
+        self.shows = []    # (start, end, Show), parallel to starts
+
+    def blocking(self, start, end):
+        # The (start, end, Show) overlapping [start, end), or None
+        i = bisect_right(self.starts, start)
+        if i and self.shows[i - 1][1] > start:
+            return self.shows[i - 1]
+        if i < len(self.shows) and self.shows[i][0] < end:
+            return self.shows[i]
+        return None
+
+    def clash(self, start, end):
+        entry = self.blocking(start, end)
+        return entry[2] if entry else None
+
+    def add(self, start, end, show):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.shows.insert(i, (start, end, show))
+
+    def remove(self, start):
+        # The (start, end, Show) removed, or None
+        i = bisect_right(self.starts, start) - 1
+        if i >= 0 and self.starts[i] == start:
+            del self.starts[i]
+            return self.shows.pop(i)
+        return None
+
+
+def stored_days(cursor, movies, theater_dates, lock=False):
+    # {(theater, screen, date): ScreenDay} of the stored shows on the given
+    # {theater_id: set of dates}, one query per theater; `movies` is the
+    # catalog's movie index, for run times
+    days = defaultdict(ScreenDay)
+    query = EXISTING_QUERY + (" FOR UPDATE" if lock else "")
+    for theater_id, wanted in theater_dates.items():
+        cursor.execute(query, (theater_id, min(wanted), max(wanted)))
+        for row in cursor.fetchall():
+            stored = Show(*row)
+            if stored.show_date in wanted:
+                movie = movies.get(stored.movie_id)
+                end = stored.show_time + occupied(movie[6] if movie else 0)
+                days[stored.theater_id, stored.screen_id, stored.show_date].add(stored.show_time, end, stored)
+    return days
+
+
+class ScheduleValidator:
+    # Checks TM rows against the schedule and each other before they are written,
+    # in place of the before_tm_insert* / prevent_duplicate_movie triggers, which
+    # ran several sub-SELECTs per row and reported one conflict at a time.
+    # Movies and screens come from the catalog cache; the existing shows of the
+    # theater-days a batch touches are read in one query per theater.
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def _existing(self, cursor, shows, lock):
+        # {(theater, screen, date): ScreenDay} of the stored shows around `shows`
+        dates = defaultdict(set)
+        for show in shows:
+            dates[show.theater_id].add(show.show_date)
+        return stored_days(cursor, self.catalog.movie_index(), dates, lock)
+
+    def _check(self, cursor, rows, originals, lock):
+        # validate(), with the accepted rows as (index, Show, original slot or None)
+        shows, errors = [], []
+        movies = self.catalog.movie_index()
+        for index, values in enumerate(rows):
+            try:
+                show = parse_show(values)
+                original = parse_slot(originals[index]) if originals and originals[index] is not None else None
+            except (TypeError, ValueError) as e:
+                errors.append(RowError(index, values, "invalid row: %s" % e, None))
+                continue
+            if show.movie_id not in movies:
+                errors.append(RowError(index, show, NO_MOVIE, None))
+            elif self.catalog.screen(show.theater_id, show.screen_id) is None:
+                errors.append(RowError(index, show, NO_SCREEN, None))
+            else:
+                shows.append((index, show, original))
+
+        days = self._existing(cursor, [show for _, show, _ in shows] + [original for _, _, original in shows if original], lock)
+        accepted = []
+        for index, show, original in shows:
+            replaced = None
+            if original is not None:
+                # An edit moves its own show, so that show no longer blocks the new slot
+                replaced = days[original.theater_id, original.screen_id, original.show_date].remove(original.show_time)
+                if replaced is None:
+                    errors.append(RowError(index, show, NO_SHOW, None))
+                    continue
+            day = days[show.theater_id, show.screen_id, show.show_date]
+            start = show.show_time
+            end = start + occupied(movies[show.movie_id][6])
+            other = day.clash(start, end)
+            if other is not None:
+                if replaced is not None:
+                    days[original.theater_id, original.screen_id, original.show_date].add(*replaced)
+                errors.append(RowError(index, show, DUPLICATE if other.show_time == start else TOO_CLOSE, other))
+                continue
+            day.add(start, end, show)
+            accepted.append((index, show, original))
+        errors.sort(key=lambda error: error.index)
+        return accepted, errors
+
+    def validate(self, cursor, rows, originals=None, lock=False):
+        # Returns (accepted Shows, [RowError]). Rows are taken in order, so of two
+        # clashing rows the first is accepted. `originals`, parallel to `rows`,
+        # makes a row an edit of the stored show in that (theater, screen, date,
+        # time) slot, or None for a new show; an edit whose show isn't stored is
+        # rejected with NO_SHOW. With `lock` the stored shows read are locked FOR
+        # UPDATE until the caller's transaction ends.
+        accepted, errors = self._check(cursor, rows, originals, lock)
+        return [show for _, show, _ in accepted], errors
+
+    def commit(self, conn, rows, originals=None, all_or_nothing=False):
+        # Validates `rows` and writes the accepted ones in one transaction: an
+        # UPDATE of its original row per edit, one executemany INSERT for the new
+        # shows. Returns (accepted, errors). The stored shows checked against stay
+        # locked until the commit, so concurrent batches for the same theater
+        # cannot both pass. With `all_or_nothing` nothing is written when any row
+        # is rejected.
+        cursor = conn.cursor()
+        try:
+            checked, errors = self._check(cursor, rows, originals, lock=True)
+            accepted = [show for _, show, _ in checked]
+            if accepted and not (errors and all_or_nothing):
+                edits = [show_row(show) + slot_row(original) for _, show, original in checked if original is not None]
+                if edits:
+                    cursor.executemany("UPDATE TM SET THEATER_ID = %s, MOVIE_ID = %s, SCREEN_ID = %s, SHOW_DATE = %s, SHOW_TIME = %s WHERE " + SLOT, edits)
+                inserts = [show_row(show) for _, show, original in checked if original is None]
+                if inserts:
+                    cursor.executemany("INSERT INTO TM (theater_id, movie_id, screen_id, show_date, show_time) VALUES (%s, %s, %s, %s, %s)", inserts)
+                conn.commit()
+            else:
+                conn.rollback()
+                if errors and all_or_nothing:
+                    accepted = []
+            return accepted, errors
+        finally:
+            cursor.close()
@@ -0,0 +1,151 @@
+import sqlite3
+import threading
+import time
+
+# How long seats picked on BOOKINGS.html stay reserved for the user on TICKETS.html
+HOLD_MINUTES = 10
+
+
+def show_key(theater_id, screen_id, day, show_time):
+    # (theater, screen, date, time); the seat id completes the hold key
+    return (str(theater_id), str(screen_id), str(day), str(show_time))
+
+
+class MemoryHoldStore:
+    # Holds for a single process. Expired holds are dropped lazily whenever
+    # their show is touched, plus a full sweep at most once per `sweep_every` seconds.
+    def __init__(self, ttl=HOLD_MINUTES * 60, sweep_every=60):
+        self.ttl = ttl
+        self.sweep_every = sweep_every
+        self._lock = threading.Lock()
+        self._shows = {}           # show -> {seat: (owner, expires_at)}
+        self._last_sweep = time.monotonic()
+
+    def _live(self, show, now):
+        seats = self._shows.get(show)
+        if seats is None:
+            return {}
+        expired = [seat for seat, (_, expires) in seats.items() if expires <= now]
+        for seat in expired:
+            del seats[seat]
+        if not seats:
+            del self._shows[show]
+            return {}
+        return seats
+
+    def _sweep(self, now):
+        if now - self._last_sweep < self.sweep_every:
+            return
+        self._last_sweep = now
+        for show in list(self._shows):
+            self._live(show, now)
+
+    def hold(self, show, seats, owner):
+        # Replaces the owner's previous holds on this show. Returns the seats
+        # held by someone else; nothing is held unless that list is empty.
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            current = self._live(show, now)
+            conflicts = [seat for seat in seats if seat in current and current[seat][0] != owner]
+            if conflicts:
+                return conflicts
+            for seat in [seat for seat, (who, _) in current.items() if who == owner]:
+                del current[seat]
+            current = self._shows.setdefault(show, current)
+            expires = now + self.ttl
+            for seat in seats:
+                current[seat] = (owner, expires)
+            return []
+
+    def held(self, show, exclude_owner=None):
+        now = time.monotonic()
+        with self._lock:
+            return {seat for seat, (who, _) in self._live(show, now).items() if who != exclude_owner}
+
+    def consume(self, show, seats, owner):
+        # Atomically checks that none of `seats` is held by another user and drops
+        # the owner's holds on the show. Returns the conflicting seats, [] on success.
+        # Seats whose hold already expired are still fine as long as nobody else took them.
+        now = time.monotonic()
+        with self._lock:
+            current = self._live(show, now)
+            conflicts = [seat for seat in seats if seat in current and current[seat][0] != owner]
+            if conflicts:
+                return conflicts
+            for seat in [seat for seat, (who, _) in current.items() if who == owner]:
+                del current[seat]
+            if not current:
+                self._shows.pop(show, None)
+            return []
+
+    def release(self, show, owner):
+        self.consume(show, [], owner)
+
+
+class SqliteHoldStore:
+    # Same interface as MemoryHoldStore, backed by a local SQLite file so that
+    # several worker processes on one host see the same holds.
+    def __init__(self, path='seat_holds.db', ttl=HOLD_MINUTES * 60):
+        self.path = path
+        self.ttl = ttl
+        conn = self._connect()
+        try:
+            conn.execute("""CREATE TABLE IF NOT EXISTS HOLDS (
+                THEATER_ID TEXT, SCREEN_ID TEXT, DAY TEXT, SHOW_TIME TEXT, SEAT TEXT,
+                OWNER TEXT, EXPIRES REAL,
+                PRIMARY KEY (THEATER_ID, SCREEN_ID, DAY, SHOW_TIME, SEAT))""")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+
+    def _locked(self, conn, show):
+        # BEGIN IMMEDIATE takes the write lock up front, serializing check-then-write
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM HOLDS WHERE THEATER_ID = ? AND SCREEN_ID = ? AND DAY = ? AND SHOW_TIME = ? AND EXPIRES <= ?", (*show, time.time()))
+        return {seat: who for seat, who in conn.execute(
+            "SELECT SEAT, OWNER FROM HOLDS WHERE THEATER_ID = ? AND SCREEN_ID = ? AND DAY = ? AND SHOW_TIME = ?", show)}
+
+    def _swap(self, show, check, seats, owner):
+        # One write transaction: fail if another owner holds any of `check`,
+        # otherwise replace the owner's holds on the show with `seats`
+        owner = str(owner)
+        conn = self._connect()
+        try:
+            current = self._locked(conn, show)
+            conflicts = [seat for seat in check if current.get(seat, owner) != owner]
+            if conflicts:
+                conn.execute("ROLLBACK")
+                return conflicts
+            conn.execute("DELETE FROM HOLDS WHERE THEATER_ID = ? AND SCREEN_ID = ? AND DAY = ? AND SHOW_TIME = ? AND OWNER = ?", (*show, owner))
+            expires = time.time() + self.ttl
+            conn.executemany("INSERT INTO HOLDS VALUES (?, ?, ?, ?, ?, ?, ?)", [(*show, seat, owner, expires) for seat in seats])
+            conn.execute("COMMIT")
+            return []
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def hold(self, show, seats, owner):
+        return self._swap(show, seats, seats, owner)
+
+    def held(self, show, exclude_owner=None):
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT SEAT, OWNER FROM HOLDS WHERE THEATER_ID = ? AND SCREEN_ID = ? AND DAY = ? AND SHOW_TIME = ? AND EXPIRES > ?",
+                (*show, time.time())).fetchall()
+        finally:
+            conn.close()
+        return {seat for seat, who in rows if who != str(exclude_owner)}
+
+    def consume(self, show, seats, owner):
+        return self._swap(show, seats, [], owner)
+
+    def release(self, show, owner):
+        self._swap(show, [], [], owner)
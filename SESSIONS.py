@@ -0,0 +1,251 @@
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+class MemorySessionStore:
+    # Session data for a single process, kept as plain dicts so a request costs
+    # no decoding at all. Least recently used sessions are evicted past
+    # `max_sessions`; expired ones are dropped when read and by a sweep at most
+    # once per `sweep_every` seconds.
+    def __init__(self, max_sessions=100000, sweep_every=60):
+        self.max_sessions = max_sessions
+        self.sweep_every = sweep_every
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()    # sid -> (data, expires_at)
+        self._last_sweep = time.time()
+        self._stats = {'hits': 0, 'misses': 0, 'saves': 0, 'deletes': 0, 'expired': 0, 'evicted': 0}
+
+    def _sweep(self, now):
+        if now - self._last_sweep < self.sweep_every:
+            return
+        self._last_sweep = now
+        for sid in [sid for sid, (_, expires) in self._sessions.items() if expires <= now]:
+            del self._sessions[sid]
+            self._stats['expired'] += 1
+
+    def get(self, sid):
+        # (data, expires_at) or None
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            entry = self._sessions.get(sid)
+            if entry is not None and entry[1] <= now:
+                del self._sessions[sid]
+                self._stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._sessions.move_to_end(sid)
+            self._stats['hits'] += 1
+            return dict(entry[0]), entry[1]
+
+    def set(self, sid, data, expires):
+        with self._lock:
+            self._sessions[sid] = (dict(data), expires)
+            self._sessions.move_to_end(sid)
+            self._stats['saves'] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._stats['evicted'] += 1
+
+    def touch(self, sid, expires):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is not None:
+                self._sessions[sid] = (entry[0], expires)
+
+    def delete(self, sid):
+        with self._lock:
+            if self._sessions.pop(sid, None) is not None:
+                self._stats['deletes'] += 1
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['sessions'] = len(self._sessions)
+        stats['max_sessions'] = self.max_sessions
+        return stats
+
+
+class SqliteSessionStore:
+    # Same interface as MemorySessionStore, in a local SQLite file shared by the
+    # worker processes of one host. Data is stored in Flask's tagged JSON, which
+    # round-trips the datetimes and tuples the handlers put in the session.
+    def __init__(self, path='sessions.db', sweep_every=300):
+        self.path = path
+        self.sweep_every = sweep_every
+        self.serializer = TaggedJSONSerializer()
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        self._stats = {'hits': 0, 'misses': 0, 'saves': 0, 'deletes': 0, 'expired': 0, 'evicted': 0}
+        conn = self._connect()
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS SESSIONS (SID TEXT PRIMARY KEY, DATA TEXT NOT NULL, EXPIRES REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS SESSIONS_EXPIRES ON SESSIONS (EXPIRES)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+
+    def _count(self, what, n=1):
+        with self._lock:
+            self._stats[what] += n
+
+    def _sweep(self, conn, now):
+        with self._lock:
+            if now - self._last_sweep < self.sweep_every:
+                return
+            self._last_sweep = now
+        self._count('expired', conn.execute("DELETE FROM SESSIONS WHERE EXPIRES <= ?", (now,)).rowcount)
+
+    def get(self, sid):
+        now = time.time()
+        conn = self._connect()
+        try:
+            self._sweep(conn, now)
+            row = conn.execute("SELECT DATA, EXPIRES FROM SESSIONS WHERE SID = ? AND EXPIRES > ?", (sid, now)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return self.serializer.loads(row[0]), row[1]
+
+    def set(self, sid, data, expires):
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO SESSIONS VALUES (?, ?, ?)", (sid, self.serializer.dumps(dict(data)), expires))
+        finally:
+            conn.close()
+        self._count('saves')
+
+    def touch(self, sid, expires):
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE SESSIONS SET EXPIRES = ? WHERE SID = ?", (expires, sid))
+        finally:
+            conn.close()
+
+    def delete(self, sid):
+        conn = self._connect()
+        try:
+            deleted = conn.execute("DELETE FROM SESSIONS WHERE SID = ?", (sid,)).rowcount
+        finally:
+            conn.close()
+        self._count('deletes', deleted)
+
+    def metrics(self):
+        conn = self._connect()
+        try:
+            sessions = conn.execute("SELECT COUNT(*) FROM SESSIONS").fetchone()[0]
+        finally:
+            conn.close()
+        with self._lock:
+            stats = dict(self._stats)
+        stats['sessions'] = sessions
+        return stats
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, data=None, sid=None, expires=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+        super().__init__(data, on_update)
+        self.sid = sid
+        self.expires = expires
+        self.retired_sid = None
+        self.modified = False
+        self.accessed = False
+
+    def regenerate(self):
+        # Moves the data to a fresh session id when the response is saved and
+        # drops the old one, so an id planted in the browser before a login
+        # doesn't carry that login (session fixation)
+        if self.sid is not None:
+            self.retired_sid = self.sid
+            self.sid = None
+        self.modified = True
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class ServerSessionInterface(SessionInterface):
+    # Keeps the session in `store` and only a random session id in the cookie.
+    # Sessions live for app.permanent_session_lifetime after their last use;
+    # an unchanged session has its expiry pushed back at most once per
+    # `touch_every` seconds, so most requests write nothing.
+    def __init__(self, store, touch_every=60):
+        self.store = store
+        self.touch_every = touch_every
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            entry = self.store.get(sid)
+            if entry is not None:
+                return ServerSideSession(entry[0], sid, entry[1])
+        return ServerSideSession()
+
+    def load(self, sid):
+        # The data behind a session cookie value, for tools outside a request
+        entry = self.store.get(sid)
+        return entry[0] if entry is not None else {}
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        retired, session.retired_sid = session.retired_sid, None
+        if retired is not None:
+            self.store.delete(retired)
+        if not session:
+            if session.modified and (session.sid or retired):
+                if session.sid:
+                    self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        expires = time.time() + app.permanent_session_lifetime.total_seconds()
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+            self.store.set(session.sid, session, expires)
+        elif session.modified:
+            self.store.set(session.sid, session, expires)
+        elif expires - session.expires >= self.touch_every:
+            self.store.touch(session.sid, expires)
+        else:
+            return
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+            partitioned=self.get_cookie_partitioned(app),
+        )
@@ -0,0 +1,261 @@
+import argparse
+import csv
+import io
+import json
+import sys
+
+import mysql.connector
+
+from SCHEDULE import show_time as time_label
+from SCHEDULE_VALIDATOR import DUPLICATE, show_row
+from TM_LISTING import listing_query
+
+# Columns of an import file; any others (such as the names in an export) are ignored
+FIELDS = ('theater_id', 'movie_id', 'screen_id', 'show_date', 'show_time')
+
+# Columns of an export, create_tm's listing
+EXPORT_FIELDS = ('theater_id', 'theater_name', 'movie_id', 'movie_name', 'screen_id', 'show_date', 'show_time')
+
+
+def file_format(name, default='csv'):
+    # 'csv' or 'json' from a file name's extension (.jsonl counts as json)
+    name = (name or '').lower()
+    if name.endswith(('.json', '.jsonl')):
+        return 'json'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def json_values(stream, chunk_size=65536):
+    # The items of a top-level JSON array, or the values of a JSON Lines file,
+    # decoded as the text arrives rather than after reading the whole file. A
+    # file that starts with '[' is read as one array.
+    decoder = json.JSONDecoder()
+    buffer, pos, eof, array = '', 0, False, None
+    while True:
+        while pos < len(buffer) and (buffer[pos].isspace() or (array and buffer[pos] == ',')):
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                if array:
+                    raise ValueError("unterminated JSON array")
+                return
+            buffer, pos = stream.read(chunk_size), 0
+            eof = not buffer
+            continue
+        if array is None:
+            array = buffer[pos] == '['
+            pos += array
+            continue
+        if array and buffer[pos] == ']':
+            # Only whitespace may follow the array
+            rest = buffer[pos + 1:]
+            while not rest.strip():
+                rest = stream.read(chunk_size)
+                if not rest:
+                    return
+            raise ValueError("unexpected data after the JSON array")
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            end = None
+        # A whole value is followed by a separator or the end of the file; anything
+        # else is a value cut off at the end of the buffer (or bad JSON), so read on
+        if end is None or not (buffer[end].isspace() or buffer[end] in ',]' if end < len(buffer) else eof):
+            if eof:
+                raise ValueError("bad or truncated JSON")
+            more = stream.read(chunk_size)
+            eof = not more
+            buffer, pos = buffer[pos:] + more, 0
+            continue
+        yield value
+        pos = end
+
+
+def read_rows(stream, fmt):
+    # (row number, values, problem) per show in a binary file, 1-based and not
+    # counting a CSV header; values is a FIELDS tuple, or the raw record with a problem
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.reader(text)
+        header = [name.strip().lower() for name in next(reader, [])]
+        missing = [name for name in FIELDS if name not in header]
+        if missing:
+            raise ValueError("CSV header is missing %s" % ', '.join(missing))
+        columns = [header.index(name) for name in FIELDS]
+        for number, record in enumerate(reader, 1):
+            if not any(cell.strip() for cell in record):
+                continue
+            if len(record) <= max(columns):
+                yield number, record, "expected %d columns, got %d" % (len(header), len(record))
+            else:
+                yield number, tuple(record[i] for i in columns), None
+    else:
+        for number, value in enumerate(json_values(text), 1):
+            if isinstance(value, dict):
+                value = {str(key).lower(): item for key, item in value.items()}
+                missing = [name for name in FIELDS if value.get(name) in (None, '')]
+                if missing:
+                    yield number, value, "missing %s" % ', '.join(missing)
+                else:
+                    yield number, tuple(value[name] for name in FIELDS), None
+            elif isinstance(value, list) and len(value) == len(FIELDS):
+                yield number, tuple(value), None
+            else:
+                yield number, value, "expected an object with %s or a list of 5 values" % ', '.join(FIELDS)
+
+
+def import_schedule(pool, validator, rows, chunk_size=1000, max_errors=1000):
+    # Validates and inserts read_rows() output `chunk_size` rows at a
+    # time: one validation pass, one executemany and one commit per chunk.
+    # Later chunks are checked against the shows earlier ones wrote. Returns a
+    # report with the first `max_errors` rejected rows and why.
+    report = {'rows': 0, 'inserted': 0, 'rejected': 0, 'errors': []}
+
+    def reject(number, values, message, other=None):
+        report['rejected'] += 1
+        if len(report['errors']) < max_errors:
+            error = {'row': number, 'values': [str(value) for value in values] if isinstance(values, (list, tuple)) else values, 'error': message}
+            if other is not None:
+                error['conflicts_with'] = list(show_row(other))
+            report['errors'].append(error)
+
+    def flush(conn, chunk, retries=1):
+        try:
+            accepted, errors = validator.commit(conn, [values for _, values in chunk])
+        except mysql.connector.IntegrityError:
+            # Lost a race for a slot to a concurrent write (uq_screen_slot) and none of
+            # the chunk was written: validate it again against that write, or give up on it
+            conn.rollback()
+            if retries:
+                return flush(conn, chunk, retries - 1)
+            for number, values in chunk:
+                reject(number, values, DUPLICATE)
+            return
+        report['inserted'] += len(accepted)
+        for error in errors:
+            number, values = chunk[error.index]
+            reject(number, values, error.message, error.other)
+
+    def readable(rows):
+        # `rows` up to the point the file itself turns out unreadable (bad header,
+        # JSON or encoding); the rows before it are still imported
+        try:
+            yield from rows
+        except ValueError as e:
+            report['file_error'] = str(e)
+
+    with pool.connection() as conn:
+        chunk = []
+        for number, values, problem in readable(rows):
+            report['rows'] += 1
+            if problem is not None:
+                reject(number, values, problem)
+                continue
+            chunk.append((number, values))
+            if len(chunk) >= chunk_size:
+                flush(conn, chunk)
+                chunk = []
+        if chunk:
+            flush(conn, chunk)
+    report['errors'].sort(key=lambda error: error['row'])
+    return report
+
+
+def export_rows(pool, filters=None, batch_size=1000):
+    # create_tm's listing rows matching `filters` (TM_LISTING.parse_filters) as
+    # dicts, fetched `batch_size` at a time over an unbuffered cursor so the full
+    # result never sits in memory. A consumer that stops early leaves rows
+    # unread; the pool's rollback drains or discards the connection.
+    with pool.connection() as conn:
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(*listing_query(filters or {}))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                show = dict(zip(EXPORT_FIELDS, row))
+                show['show_date'] = show['show_date'].isoformat()
+                show['show_time'] = time_label(show['show_time'])
+                yield show
+        cursor.close()
+
+
+def export_csv(shows, batch_size=1000):
+    # Text chunks of a CSV file, one per `batch_size` shows
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS, lineterminator='\n')
+    writer.writeheader()
+    for count, show in enumerate(shows, 1):
+        writer.writerow(show)
+        if count % batch_size == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
+
+
+def export_json(shows, batch_size=1000):
+    # Text chunks of a JSON array, one per `batch_size` shows
+    parts, separator = ['['], '\n'
+    for count, show in enumerate(shows, 1):
+        parts.append(separator + json.dumps(show))
+        separator = ',\n'
+        if count % batch_size == 0:
+            yield ''.join(parts)
+            parts = []
+    parts.append('\n]\n')
+    yield ''.join(parts)
+
+
+EXPORTERS = {'csv': export_csv, 'json': export_json}
+
+
+def print_report(report, out=None, err=None):
+    # The import report as the command line shows it: one line per rejected row on
+    # `err`, then the totals on `out` (stderr and stdout by default)
+    out, err = out or sys.stdout, err or sys.stderr
+    if 'file_error' in report:
+        print("file error: %s" % report['file_error'], file=err)
+    for error in report['errors']:
+        # A JSON row can be any value (a number, an object), not just a list of fields
+        values = error['values']
+        values = ','.join(values) if isinstance(values, (list, tuple)) else json.dumps(values)
+        print("row %d: %s %s" % (error['row'], error['error'], values), file=err)
+    print("%(rows)d rows, %(inserted)d inserted, %(rejected)d rejected" % report, file=out)
+
+
+if __name__ == '__main__':
+    from TM_LISTING import parse_filters
+    from USER_BACK import catalog_cache, db_pool, schedule_validator
+
+    parser = argparse.ArgumentParser(description="Import or export the TM schedule as CSV or JSON")
+    sub = parser.add_subparsers(dest='mode', required=True)
+    load = sub.add_parser('import', help="validate and insert the shows in a file")
+    load.add_argument('file', help="CSV with a theater_id,movie_id,screen_id,show_date,show_time header, or JSON ('-' for stdin)")
+    load.add_argument('--format', choices=sorted(EXPORTERS), help="default: from the file extension, else csv")
+    load.add_argument('--chunk', type=int, default=1000, help="rows per executemany and commit")
+    dump = sub.add_parser('export', help="write every show to a file")
+    dump.add_argument('file', nargs='?', default='-', help="default: stdout")
+    dump.add_argument('--format', choices=sorted(EXPORTERS), help="default: from the file extension, else csv")
+    dump.add_argument('--theater', help="only this theater's shows")
+    dump.add_argument('--movie', help="only this movie's shows")
+    dump.add_argument('--date', help="only the shows on this day (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    fmt = args.format or file_format(args.file)
+    if args.mode == 'import':
+        stream = sys.stdin.buffer if args.file == '-' else open(args.file, 'rb')
+        with stream:
+            report = import_schedule(db_pool, schedule_validator, read_rows(stream, fmt), chunk_size=args.chunk)
+        if report['inserted']:
+            catalog_cache.invalidate('TM')
+        print_report(report)
+        raise SystemExit(1 if report['rejected'] or 'file_error' in report else 0)
+    else:
+        out = sys.stdout if args.file == '-' else open(args.file, 'w', newline='')
+        with out:
+            for text in EXPORTERS[fmt](export_rows(db_pool, parse_filters(vars(args)))):
+                out.write(text)
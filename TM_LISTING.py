@@ -0,0 +1,80 @@
+import colorsys
+from datetime import date
+from functools import lru_cache
+
+from SCHEDULE import show_time as time_label
+
+TM_PAGE = 100
+
+# create_tm's join, in the order of TM's uq_screen_slot key (static/SCHEDULE_VALIDATOR.sql)
+# so a page is a range scan of that index from the last row of the one before
+LISTING_SELECT = """SELECT THEATERS.THEATER_ID, THEATERS.THEATER_NAME, MOVIES.MOVIE_ID, MOVIES.MOVIE_NAME, TM.SCREEN_ID, TM.SHOW_DATE, TM.SHOW_TIME
+FROM TM JOIN THEATERS ON TM.THEATER_ID = THEATERS.THEATER_ID JOIN MOVIES ON TM.MOVIE_ID = MOVIES.MOVIE_ID"""
+LISTING_ORDER = " ORDER BY TM.THEATER_ID, TM.SCREEN_ID, TM.SHOW_DATE, TM.SHOW_TIME"
+# Rows after (theater, screen, date, time); the leading >= lets the optimizer range-scan
+AFTER = """TM.THEATER_ID >= %s AND (TM.THEATER_ID > %s OR TM.SCREEN_ID > %s OR (TM.SCREEN_ID = %s AND
+(TM.SHOW_DATE > %s OR (TM.SHOW_DATE = %s AND TM.SHOW_TIME > %s))))"""
+FILTERS = (('theater', 'TM.THEATER_ID = %s'), ('movie', 'TM.MOVIE_ID = %s'), ('date', 'TM.SHOW_DATE = %s'))
+
+
+def parse_filters(args):
+    # {'theater': int, 'movie': int, 'date': date} from request args, skipping blank or bad values
+    filters = {}
+    for name, cast in (('theater', int), ('movie', int), ('date', date.fromisoformat)):
+        try:
+            filters[name] = cast((args.get(name) or '').strip())
+        except ValueError:
+            pass
+    return filters
+
+
+def listing_query(filters, after=None, limit=None):
+    # (sql, params) for the listing rows matching `filters`, after the key `after`
+    clauses, params = [], []
+    for name, clause in FILTERS:
+        if name in filters:
+            clauses.append(clause)
+            params.append(filters[name])
+    if after is not None:
+        theater_id, screen_id, show_date, show_time = after
+        clauses.append(AFTER)
+        params += [theater_id, theater_id, screen_id, screen_id, show_date, show_date, show_time]
+    sql = LISTING_SELECT + (" WHERE " + " AND ".join(clauses) if clauses else "") + LISTING_ORDER
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, tuple(params)
+
+
+def page_key(row):
+    # The keyset position of a listing row, as the 'after' request arg
+    return '%s,%s,%s,%s' % (row[0], row[4], row[5].isoformat(), time_label(row[6]))
+
+
+def parse_key(value):
+    # page_key() back to (theater_id, screen_id, date, 'HH:MM:SS'), or None
+    try:
+        theater_id, screen_id, show_date, show_time = value.split(',')
+        return int(theater_id), int(screen_id), date.fromisoformat(show_date), show_time
+    except (AttributeError, ValueError):
+        return None
+
+
+def load_page(cursor, filters, after=None, limit=TM_PAGE):
+    # One page of listing rows. Returns (rows, next_after), next_after being
+    # None on the last page.
+    cursor.execute(*listing_query(filters, after, limit + 1))
+    rows = cursor.fetchall()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, page_key(rows[-1])
+    return rows, None
+
+
+@lru_cache(maxsize=None)
+def theater_color(theater_id):
+    # A stable color per theater: the hue steps by the golden angle from one
+    # theater id to the next, at 50% saturation and lightness
+    hue = (int(theater_id) * 137.508) % 360
+    r, g, b = [int(c * 255) for c in colorsys.hls_to_rgb(hue / 360, 0.5, 0.5)]
+    return "#{:02x}{:02x}{:02x}".format(r, g, b)
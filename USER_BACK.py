@@ -1,15 +1,35 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for, session
+from flask import Flask, Response, abort, render_template, jsonify, request, redirect, url_for, session
 import mysql.connector
 import mysql.connector
-from geopy.distance import geodesic
 from flask import Flask, render_template
 from datetime import timedelta
-from datetime import datetime
-import colorsys
+from datetime import datetime, date
+from DB_POOL import ConnectionPool
+from RESERVATION import reserve_seats, SeatConflict
+from SEAT_HOLDS import MemoryHoldStore, show_key
+from OCCUPANCY import OccupancyCache, parse_seat, seat_label
+from GEO_INDEX import TheaterGeoIndex
+from AGGREGATES import load_dashboard
+from EMAIL_CHECK import EmailRegistry, RateLimiter
+from CATALOG import Catalog, CatalogCache, MemoryGenerations
+from SCHEDULE import ScheduleService, WINDOW_DAYS, day_label, parse_day
+from SCHEDULE_VALIDATOR import ScheduleValidator, DUPLICATE, TOO_CLOSE
+from TM_BULK import EXPORTERS, export_rows, file_format, import_schedule, read_rows
+from TM_LISTING import load_page, parse_filters, parse_key, theater_color
+from PRICING import PricingEngine
+from BOOKING_HISTORY import RecentBookingsCache, load_history, PROFILE_QUERY
+from PAGE_CACHE import PageCache
+from SESSIONS import MemorySessionStore, ServerSessionInterface
+from DB_METRICS import InstrumentedConnection, RequestMetrics, init_app
 app = Flask(__name__)
 app.secret_key = 'yedhukku'
 app.permanent_session_lifetime = timedelta(days=1)
 
+# Session data stays on the server and the cookie carries only its id. Use
+# SESSIONS.SqliteSessionStore('sessions.db') when running several worker
+# processes on one host.
+app.session_interface = ServerSessionInterface(MemorySessionStore(max_sessions=100000))
+
 def zip_lists(list1, list2):
     return zip(list1, list2)
 app.jinja_env.filters['zip_lists'] = zip_lists
@@ -22,9 +42,83 @@ db_config = {
     'database': 'MOVIE'
 }
 
-# Function to connect to the database
+# Function to connect to the database. Every statement is timed and charged to
+# the request that ran it, see /metrics and the Server-Timing header.
 def connect_to_database():
-    return mysql.connector.connect(**db_config)
+    return InstrumentedConnection(mysql.connector.connect(**db_config))
+
+# Queries, DB time and latency per route; N+1 suspects are logged on DB_METRICS' logger
+request_metrics = RequestMetrics(n_plus_one=5, slow_ms=500)
+init_app(app, request_metrics)
+
+# Concurrency model
+#
+# The app may run threaded (app.run(threaded=True), gunicorn --threads) and in
+# several worker processes. Everything that belongs to one user's flow lives in
+# the request or that user's session: the theater comes from the URL
+# (/mt_movies/<theater>, /bookings/<theater>/...) and the selected show, seats and
+# price from session keys th_s, sc_s, ti_s, date_iso, se_s, price. No handler keeps
+# per-user state in a module global.
+#
+# The module-level objects below are shared by all threads of a process and lock
+# internally, and each process has its own copy. occupancy, recent_bookings and
+# email_registry are caches that expire or catch up, and correctness never
+# depends on them; geo_index only sees theater edits made by its own process
+# until it restarts. hold_store, catalog_cache and the session store need their
+# SQLite/Redis variants when several processes must agree. SEATS_BOOKED's
+# uq_show_seat key is what finally prevents double booking across processes.
+
+# Shared pool, handlers borrow from it with `with db_pool.connection() as conn:`
+db_pool = ConnectionPool(connect_to_database, size=10, timeout=5.0, max_idle=30.0, leak_after=60.0)
+
+# Seats held between /proceed and /pay. Use SEAT_HOLDS.SqliteHoldStore('seat_holds.db')
+# when running several worker processes on one host.
+hold_store = MemoryHoldStore()
+
+# Booked seats per show, so a seat map costs no SEATS_BOOKED query while cached
+occupancy = OccupancyCache(ttl=30.0)
+
+# First page of each user's booking history, dropped by pay()
+recent_bookings = RecentBookingsCache(ttl=60.0)
+
+# MOVIES/THEATERS/SCREENS/TM rows for the user pages, invalidated by the admin
+# write routes. Under several workers pass CATALOG.SqliteGenerations('catalog_generations.db')
+# (one host) or CATALOG.RedisGenerations(redis.Redis()) so invalidations reach every worker.
+catalog_cache = CatalogCache(MemoryGenerations(), ttl=300.0, max_entries=10000)
+catalog = Catalog(catalog_cache, db_pool.connection)
+
+# Showtimes per theater-day, cached with the catalog and dropped with its 'TM' table
+schedule = ScheduleService(catalog)
+
+# Seat prices from the PRICE_RULES / SURGE_RULES tables, cached per theater with the catalog
+pricing = PricingEngine(catalog)
+
+# Gap and duplicate checks for TM writes, done here instead of by the TM insert
+# triggers (dropped by static/SCHEDULE_VALIDATOR.sql)
+schedule_validator = ScheduleValidator(catalog)
+
+# Rendered catalog pages, keyed on the catalog_cache versions of the tables they
+# show, so the admin writes that invalidate those tables retire the pages too
+pages = PageCache(max_pages=5000, ttl=300.0)
+
+# Registered emails behind a Bloom filter, so /email_check rarely queries USERS
+email_registry = EmailRegistry(capacity=1000000, error_rate=0.01)
+email_limiter = RateLimiter(rate=5.0, burst=20)
+
+def hold_owner():
+    return session.get('id') or session.get('email')
+
+# Locality -> theater distances and k-nearest grid, built on first use and kept
+# current by the theater write routes
+geo_index = None
+THEATERS_PER_PAGE = 20
+
+def theater_geo_index(cursor):
+    global geo_index
+    if geo_index is None:
+        cursor.execute("SELECT THEATER_ID, THEATER_NAME, LOCATION FROM THEATERS;")
+        geo_index = TheaterGeoIndex(cursor.fetchall())
+    return geo_index
 
 @app.route('/')
 def login():
@@ -42,39 +136,43 @@ def register():
     age = request.form['age']
     city = request.form['city']
     # Connect to the database
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    insert_query = "INSERT INTO users (name, email, password, salt, phone, gender, age, city, role) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"
-    cursor.execute(insert_query, (name, email, password, salt, phone, gender, age, city, 'USER'))
-    conn.commit()
-    cursor.close()
-    conn.close()
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE email = %s;", (email,))
-    detail = cursor.fetchall()
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        insert_query = "INSERT INTO users (name, email, password, salt, phone, gender, age, city, role) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"
+        try:
+            cursor.execute(insert_query, (name, email, password, salt, phone, gender, age, city, 'USER'))
+        except mysql.connector.IntegrityError:
+            # Registered meanwhile (the unique EMAIL index has the final say)
+            cursor.close()
+            email_registry.add(email)
+            return render_template('LOGIN.html', error = "Email is already registered!")
+        conn.commit()
+        cursor.close()
+    email_registry.add(email)
     return render_template('LOGIN.html')
     
 @app.route('/email_check', methods=['POST'])
 def email_check():
+    if not email_limiter.allow(request.remote_addr):
+        email_registry.limited()
+        return jsonify({'error': 'Too many requests'}), 429
     try:
-        conn = connect_to_database()
-        cursor = conn.cursor()
-        select_query = "SELECT email FROM USERS;"
-        cursor.execute(select_query)
-        registered_emails = [email[0] for email in cursor.fetchall()]
-        return jsonify(registered_emails)
+        return jsonify({'exists': email_registry.exists(request.form.get('email'), db_pool.connection)})
     except Exception as e:
         return str(e), 500  # Return the error message with status code 500
 
+@app.route('/email_stats')
+def email_stats():
+    return jsonify(email_registry.metrics())
+
 @app.route('/authenticate', methods=['POST'])
 def authenticate():
     user_email = request.form.get('email')  # Retrieve email from form data
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("SELECT salt FROM users WHERE email = %s;", (user_email,))
-    salt = cursor.fetchone()  # Fetch single row
-    conn.close()
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT salt FROM users WHERE email = %s;", (user_email,))
+        salt = cursor.fetchone()  # Fetch single row
+        cursor.close()
     if salt:
         return salt[0]  # Return salt as response
     else:
@@ -88,116 +186,51 @@ def H():
 def check():
     hpe = request.form.get('passwordl')
     user_email = request.form.get('emaill')  # Retrieve email from form data
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("SELECT password FROM users WHERE email = %s;", (user_email,))
-    hps = cursor.fetchone()    
-    cursor.execute("SELECT role FROM users WHERE email = %s;", (user_email,))
-    role = cursor.fetchone()
-    role = role[0]
-    conn.close()
-    h = (hpe, hps)
-
-    if(hpe == hps[0]):
-        conn = connect_to_database()
+    with db_pool.connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT user_id FROM users WHERE email = %s;", (user_email,))
-        id = cursor.fetchone()
-        cursor.execute("SELECT name FROM users WHERE email = %s;", (user_email,))
-        name = cursor.fetchone()
-        cursor.execute("SELECT email FROM users WHERE email = %s;", (user_email,))
-        email = cursor.fetchone()
-        cursor.execute("SELECT phone FROM users WHERE email = %s;", (user_email,))
-        phone = cursor.fetchone()
-        cursor.execute("SELECT city FROM users WHERE email = %s;", (user_email,))
-        city = cursor.fetchone()
-        
-        session['id'] = id[0]
-        session['name'] = name[0]
-        session['email'] = email[0]
-        session['phone'] = phone[0]
-        session['location'] = city[0]
-      
-        id=session.get('id')
-        name=session.get('name')
-        email=session.get('email')
-        phone=session.get('phone')
-        location=session.get('location')
-        
-        insert_query = "SELECT BOOKING_ID, THEATER_ID, MOVIE_ID, DAY FROM BOOKINGS WHERE USER_ID = %s"
-        cursor.execute(insert_query, (id, ))
-        info = cursor.fetchall()
-
-        booking_id = []
-        theater_name = []
-        movie_name = []
-        day_name =[]
-        totBooking = []
-        king =[]
-
-        for infos in info:
-            book = infos[0]
-            theater = infos[1]
-            movie = infos[2]
-            day = infos[3]
-            insert_query = "SELECT THEATER_NAME FROM THEATERS WHERE THEATER_ID = %s"
-            cursor.execute(insert_query, (theater, ))
-            theaterN = cursor.fetchall()
-            theater_name.append(theaterN[0][0])
-            insert_query = "SELECT MOVIE_NAME FROM MOVIES WHERE MOVIE_ID = %s"
-            cursor.execute(insert_query, (movie, ))
-            movieN = cursor.fetchall()
-            movie_name.append(movieN[0][0])
-            booking_id.append(book) 
-            day_name.append(str(day))
-
-        totBooking = list(zip(booking_id, theater_name, movie_name, day_name))
-        if(totBooking):
-            tata = totBooking[0][0]
-        else:
-            tata = []
-
-        # Append the zipped list to totBooking
-        
-        
-
-
-        detail = (name, email, phone, location)
-
-        cursor.close()
-        conn.close()
-        if (role == 'USER'):
-            return render_template('HOME.html', details = detail, totals = totBooking, tatas = tata)
-        else:
-            conn = connect_to_database()
-            cursor = conn.cursor()
-            cursor.execute("SELECT MOVIES.MOVIE_ID, MOVIES.MOVIE_NAME, MOVIES.RDATE, calculate_movie_revenue(MOVIES.MOVIE_ID) AS total_revenue FROM MOVIES;")
-            movie_detail = cursor.fetchall()
-            cursor.callproc('calculate_movie_count')
-            result = cursor.stored_results()
-            movie_count = None
-            for result_set in result:
-                movie_count = result_set.fetchone()[0]
-
-            cursor.execute("SELECT THEATER_ID, THEATER_NAME, LOCATION, calculate_theater_revenue(THEATER_ID) AS total_price FROM THEATERS;")
-            theater_detail = cursor.fetchall()
-            cursor.callproc('calculate_theater_count')
-            result = cursor.stored_results()
-            theater_count = None
-            for result_set in result:
-                theater_count = result_set.fetchone()[0]
-
-
-            cursor.callproc('active_users')
-            result = cursor.stored_results()
-            user_count = None
-            for result_set in result:
-                user_count = result_set.fetchone()[0]
-
+        cursor.execute(PROFILE_QUERY, (user_email,))
+        profile = cursor.fetchone()
+
+        if(profile is None or hpe != profile[5]):
+            cursor.close()
+            return render_template("LOGIN.html", error = "Invalid Email or Password!")
+        id, name, email, phone, city, _, role = profile
+
+        # A fresh session id for the signed-in user, never the one the browser brought
+        session.regenerate()
+        session['id'] = id
+        session['name'] = name
+        session['email'] = email
+        session['phone'] = phone
+        session['location'] = city
+
+        if (role != 'USER'):
+            # Revenue and counts come from the trigger-maintained *_STATS tables
+            movie_detail, theater_detail, movie_count, theater_count, user_count = load_dashboard(cursor)
+            cursor.close()
             return render_template('ADMIN.html', movie_details = movie_detail, theater_details = theater_detail,result1 = movie_count, result2 = theater_count, result3 = user_count)
+        cursor.close()
 
+    totBooking, next_before = user_history(id)
+    if(totBooking):
+        tata = totBooking[0][0]
     else:
-        return render_template("LOGIN.html", error = "Invalid Email or Password!")
+        tata = []
+
+    detail = (name, email, phone, city)
+    return render_template('HOME.html', details = detail, totals = totBooking, tatas = tata, next_before = next_before)
+
+def user_history(user_id, before=None):
+    # One page of the user's booking history; the first page comes from recent_bookings
+    def load():
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            page = load_history(cursor, user_id, before)
+            cursor.close()
+        return page
+    if before is not None:
+        return load()
+    return recent_bookings.get(user_id, load)
 
 @app.route('/home')
 def home():    
@@ -206,55 +239,21 @@ def home():
     email=session.get('email')
     phone=session.get('phone')
     location=session.get('location')
-    
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    insert_query = "SELECT BOOKING_ID, THEATER_ID, MOVIE_ID, DAY FROM BOOKINGS WHERE USER_ID = %s"
-    cursor.execute(insert_query, (idv, ))
-    info = cursor.fetchall()
-
-    booking_id = []
-    theater_name = []
-    movie_name = []
-    day_name =[]
-    totBooking = []
-    king =[]
-
-    for infos in info:
-        book = infos[0]
-        theater = infos[1]
-        movie = infos[2]
-        day = infos[3]
-        insert_query = "SELECT THEATER_NAME FROM THEATERS WHERE THEATER_ID = %s"
-        cursor.execute(insert_query, (theater, ))
-        theaterN = cursor.fetchall()
-        theater_name.append(theaterN[0][0])
-        insert_query = "SELECT MOVIE_NAME FROM MOVIES WHERE MOVIE_ID = %s"
-        cursor.execute(insert_query, (movie, ))
-        movieN = cursor.fetchall()
-        movie_name.append(movieN[0][0])
-        booking_id.append(book) 
-        day_name.append(str(day))
-
-    totBooking = list(zip(booking_id, theater_name, movie_name, day_name))
+
+    totBooking, next_before = user_history(idv, request.args.get('before', type=int))
     if(totBooking):
         tata = totBooking[0][0]
     else:
         tata = []
     detail = (name, email, phone, location)
 
-    cursor.close()
-    conn.close()
-    return render_template('HOME.html', details = detail, totals = totBooking, tatas = tata)
+    return render_template('HOME.html', details = detail, totals = totBooking, tatas = tata, next_before = next_before)
 
 @app.route('/get_movies')
 def get_movies():
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM movies;")
-    columns = [col[0] for col in cursor.description]
+    rows = catalog.movies()
     movies = []
-    for row in cursor.fetchall():
+    for row in rows:
         movie_details = {
             'id' : row[0],
             'title': row[1],
@@ -270,104 +269,26 @@ def get_movies():
 
 @app.route('/avail_theater/<int:movie_id>', methods=['GET'])
 def avail_theater(movie_id):
-    conn = connect_to_database()
-    cursor = conn.cursor()
     location = session.get('location')
     session['selected_movie'] = movie_id
     sm = session.get('selected_movie')
-    theaters_from_database = []
     sql_select_Query =  """
-    SELECT DISTINCT t.theater_id, t.theater_name, t.location
+    SELECT DISTINCT t.theater_id
     FROM THEATERS t
     JOIN TM tm ON t.theater_id = tm.theater_id
     WHERE tm.movie_id = %s
     """
-    cursor.execute(sql_select_Query, (movie_id, ))
-    records = cursor.fetchall()
-
-    for record in records:
-        theater_id = record[0]
-        theater_name = record[1]
-        theater_loc = record[2]
-        dic = {"id" : theater_id, "name": theater_name, "location": theater_loc}
-        theaters_from_database.append(dic)
-        
-    theaters = [
-        {"location": "ANNA NAGAR", "latitude": 13.0878, "longitude": 80.2174},
-        {"location": "T. NAGAR", "latitude": 13.0394, "longitude": 80.2337},
-        {"location": "ADYAR", "latitude": 13.0064, "longitude": 80.2575},
-        {"location": "MYLAPORE", "latitude": 13.0316, "longitude": 80.2670},
-        {"location": "NUNGAMBAKKAM", "latitude": 13.0620, "longitude": 80.2405},
-        {"location": "ALWARPET", "latitude": 13.0334, "longitude": 80.2546},
-        {"location": "EGMORE", "latitude": 13.0827, "longitude": 80.2707},
-        {"location": "KILPAUK", "latitude": 13.0827, "longitude": 80.2437},
-        {"location": "SAIDAPET", "latitude": 13.0203, "longitude": 80.2224},
-        {"location": "VELACHERY", "latitude": 12.9802, "longitude": 80.2228},
-        {"location": "GUINDY", "latitude": 13.0067, "longitude": 80.2206},
-        {"location": "THIRUVANMIYUR", "latitude": 12.9869, "longitude": 80.2615},
-        {"location": "PORUR", "latitude": 13.0324, "longitude": 80.1679},
-        {"location": "MOGAPPAIR", "latitude": 13.0832, "longitude": 80.1674},
-        {"location": "ANNA SALAI", "latitude": 13.0572, "longitude": 80.2668},
-        {"location": "MAMBALAM", "latitude": 13.0355, "longitude": 80.2274},
-        {"location": "KODAMBAKKAM", "latitude": 13.0512, "longitude": 80.2206},
-        {"location": "MOUNT ROAD", "latitude": 13.0626, "longitude": 80.2696},
-        {"location": "PALLIKARANAI", "latitude": 12.9329, "longitude": 80.2135},
-        {"location": "ASHOK NAGAR", "latitude": 13.0402, "longitude": 80.2123},
-        {"location": "CHROMPET", "latitude": 12.9517, "longitude": 80.1401},
-        {"location": "AMBATTUR", "latitude": 13.1075, "longitude": 80.1648},
-        {"location": "TAMBARAM", "latitude": 12.9246, "longitude": 80.1479},
-        {"location": "VADAPALANI", "latitude": 13.0501, "longitude": 80.2120},
-        {"location": "ROYAPETTAH", "latitude": 13.0581, "longitude": 80.2641},
-        {"location": "SHOLINGANALLUR", "latitude": 12.8990, "longitude": 80.2279},
-        {"location": "AVADI", "latitude": 13.1167, "longitude": 80.1010},  
-        {"location": "ENNORE", "latitude": 13.2161, "longitude": 80.3231},  
-        {"location": "PALLAVARAM", "latitude": 12.9686, "longitude": 80.1504},
-        {"location": "VANAGARAM", "latitude": 13.0733, "longitude": 80.2090},
-
-    ]
-
-    my_theaters = []
-
-    for theater_db in theaters_from_database:
-        for theater in theaters:
-            if theater['location'] == theater_db['location']:
-                my_theater = {
-                    "id": theater_db['id'],
-                    "name": theater_db['name'],
-                    "location": theater['location'],
-                    "latitude": theater['latitude'],
-                    "longitude": theater['longitude']
-                }
-                my_theaters.append(my_theater)
-
-    for i in theaters:
-        if i['location'] == location:
-            location_info = {'latitude': i['latitude'], 'longitude': i['longitude']}
-
-
-    provided_coords = (location_info['latitude'], location_info['longitude'])
-    theaters_with_distances = []
-
-    # Calculate distances from provided location to each theater
-    for theater in my_theaters:
-        theater_coords = (theater['latitude'], theater['longitude'])
-        distance = geodesic(provided_coords, theater_coords).kilometers
-        theaters_with_distances.append({"id" : theater['id'], "name": theater['name'],"distance": distance,"location": theater['location']})
-
-    # Sort theaters by distance
-    sorted_theaters = sorted(theaters_with_distances, key=lambda x: x['distance'])
-    rendering_theaters = []
-    for st in sorted_theaters:
-        ti = st["id"]
-        tn = st["name"]
-        tl = st["location"]
-        td = st["distance"]
-        tup = (ti, tn, tl, int(td))
-        rendering_theaters.append(tup)
-
-    # Close database connection
-    cursor.close()
-    conn.close()
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql_select_Query, (movie_id, ))
+        records = cursor.fetchall()
+        index = theater_geo_index(cursor)
+        cursor.close()
+
+    # One page of the nearest theaters showing the movie, optionally within ?km=
+    page = max(request.args.get('page', 1, type=int), 1)
+    radius = request.args.get('km', type=float)
+    rendering_theaters, has_more = index.search(location, {record[0] for record in records}, radius_km = radius, offset = (page - 1) * THEATERS_PER_PAGE, limit = THEATERS_PER_PAGE)
 
     # Render template to display all theaters
     name=session.get('name')
@@ -376,185 +297,82 @@ def avail_theater(movie_id):
     location=session.get('location')
     
     detail = (name, email, phone, location, sm)
-    return render_template('PARTIAL_THEATERS.html', theaters=rendering_theaters, details = detail)
+    return render_template('PARTIAL_THEATERS.html', theaters=rendering_theaters, details = detail, page = page, has_more = has_more, radius = radius)
 
 @app.route('/all_theaters')
 def theaters():
     location = session.get('location')
-    # Connect to the database
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    theaters_from_database = []
-    sql_select_Query = "SELECT * FROM THEATERS"
-    cursor.execute(sql_select_Query)
-    records = cursor.fetchall()
-
-    for record in records:
-        theater_id = record[0]
-        theater_name = record[1]
-        theater_loc = record[2]
-        dic = {"id" : theater_id, "name": theater_name, "location": theater_loc}
-        theaters_from_database.append(dic)
-        
-    theaters = [
-        {"location": "ANNA NAGAR", "latitude": 13.0878, "longitude": 80.2174},
-        {"location": "T. NAGAR", "latitude": 13.0394, "longitude": 80.2337},
-        {"location": "ADYAR", "latitude": 13.0064, "longitude": 80.2575},
-        {"location": "MYLAPORE", "latitude": 13.0316, "longitude": 80.2670},
-        {"location": "NUNGAMBAKKAM", "latitude": 13.0620, "longitude": 80.2405},
-        {"location": "ALWARPET", "latitude": 13.0334, "longitude": 80.2546},
-        {"location": "EGMORE", "latitude": 13.0827, "longitude": 80.2707},
-        {"location": "KILPAUK", "latitude": 13.0827, "longitude": 80.2437},
-        {"location": "SAIDAPET", "latitude": 13.0203, "longitude": 80.2224},
-        {"location": "VELACHERY", "latitude": 12.9802, "longitude": 80.2228},
-        {"location": "GUINDY", "latitude": 13.0067, "longitude": 80.2206},
-        {"location": "THIRUVANMIYUR", "latitude": 12.9869, "longitude": 80.2615},
-        {"location": "PORUR", "latitude": 13.0324, "longitude": 80.1679},
-        {"location": "MOGAPPAIR", "latitude": 13.0832, "longitude": 80.1674},
-        {"location": "ANNA SALAI", "latitude": 13.0572, "longitude": 80.2668},
-        {"location": "MAMBALAM", "latitude": 13.0355, "longitude": 80.2274},
-        {"location": "KODAMBAKKAM", "latitude": 13.0512, "longitude": 80.2206},
-        {"location": "MOUNT ROAD", "latitude": 13.0626, "longitude": 80.2696},
-        {"location": "PALLIKARANAI", "latitude": 12.9329, "longitude": 80.2135},
-        {"location": "ASHOK NAGAR", "latitude": 13.0402, "longitude": 80.2123},
-        {"location": "CHROMPET", "latitude": 12.9517, "longitude": 80.1401},
-        {"location": "AMBATTUR", "latitude": 13.1075, "longitude": 80.1648},
-        {"location": "TAMBARAM", "latitude": 12.9246, "longitude": 80.1479},
-        {"location": "VADAPALANI", "latitude": 13.0501, "longitude": 80.2120},
-        {"location": "ROYAPETTAH", "latitude": 13.0581, "longitude": 80.2641},
-        {"location": "SHOLINGANALLUR", "latitude": 12.8990, "longitude": 80.2279},
-        {"location": "AVADI", "latitude": 13.1167, "longitude": 80.1010},  
-        {"location": "ENNORE", "latitude": 13.2161, "longitude": 80.3231},  
-        {"location": "PALLAVARAM", "latitude": 12.9686, "longitude": 80.1504},
-        {"location": "VANAGARAM", "latitude": 13.0733, "longitude": 80.2090},
-
-    ]
-
-
-    my_theaters = []
-
-    for theater_db in theaters_from_database:
-        for theater in theaters:
-            if theater['location'] == theater_db['location']:
-                my_theater = {
-                    "id": theater_db['id'],
-                    "name": theater_db['name'],
-                    "location": theater['location'],
-                    "latitude": theater['latitude'],
-                    "longitude": theater['longitude']
-                }
-                my_theaters.append(my_theater)
-
-
-    for i in theaters:
-        if(i['location'] == location):
-            location_info = {'latitude' : i['latitude'], 'longitude' : i['longitude']}
-
-    provided_coords = (location_info['latitude'], location_info['longitude'])
-    theaters_with_distances = []
-
-    # Calculate distances from provided location to each theater
-    for theater in my_theaters:
-        theater_coords = (theater['latitude'], theater['longitude'])
-        distance = geodesic(provided_coords, theater_coords).kilometers
-        theaters_with_distances.append({"id": theater['id'], "name": theater['name'], "distance": distance, "location": theater['location']})
-
-    # Sort theaters by distance
-    sorted_theaters = sorted(theaters_with_distances, key=lambda x: x['distance'])
-    rendering_theaters = []
-    for st in sorted_theaters:
-        ti = st["id"]
-        tn = st["name"]
-        tl = st["location"]
-        td = st["distance"]
-        tup = (ti, tn, tl, int(td))
-        rendering_theaters.append(tup)
-
-    # Close database connection
-    cursor.close()
-    conn.close()
+
+    def render(details):
+        index = geo_index
+        if index is None:
+            with db_pool.connection() as conn:
+                cursor = conn.cursor()
+                index = theater_geo_index(cursor)
+                cursor.close()
+        rendering_theaters = index.nearest(location)
+        # Render template to display all theaters
+        return render_template('ALL_THEATERS.html', theaters=rendering_theaters, details = details)
+
     name=session.get('name')
     email=session.get('email')
     phone=session.get('phone')
     location=session.get('location')
     detail = (name, email, phone, location)
-    # Render template to display all theaters
-    return render_template('ALL_THEATERS.html', theaters=rendering_theaters, details = detail)
+    key = ('ALL_THEATERS', catalog_cache.version('THEATERS'), location, date.today())
+    return pages.respond(key, render, detail)
 
 @app.route('/avail_movies/<int:theater_id>', methods=['GET'])
 def avail_movies(theater_id):
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    sql_select_Query = """SELECT DISTINCT m.movie_id, m.movie_name, m.genre, m.rating, m.description, m.url, m.run_time, m.rdate 
-                   FROM MOVIES m JOIN TM tm 
-                   ON m.movie_id = tm.movie_id WHERE tm.theater_id = %s;"""
-    cursor.execute(sql_select_Query, (theater_id, ))
-    movie = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    def render(details):
+        movie = catalog.theater_movies(theater_id)
+        return render_template('PARTIAL_MOVIES.html', details = details, movies = movie)
 
     name=session.get('name')
     email=session.get('email')
     phone=session.get('phone')
     location=session.get('location')
     detail = (name, email, phone, location, theater_id)
-    return render_template('PARTIAL_MOVIES.html', details = detail, movies = movie)
+    key = ('PARTIAL_MOVIES', catalog_cache.version('MOVIES', 'TM'), theater_id, date.today())
+    return pages.respond(key, render, detail)
 
 @app.route('/all_movies')
 def all_movies():
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("""SELECT * FROM MOVIES;""")
-    movie = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    def render(details):
+        movie = catalog.movies()
+        return render_template('ALL_MOVIES.html', details = details, movies = movie)
 
     name=session.get('name')
     email=session.get('email')
     phone=session.get('phone')
     location=session.get('location')
     detail = (name, email, phone, location)
+    key = ('ALL_MOVIES', catalog_cache.version('MOVIES'), date.today())
+    return pages.respond(key, render, detail)
+
+def schedule_window():
+    # ?start=YYYY-MM-DD&days=N choose the window, today and the next six days by default
+    try:
+        start = date.fromisoformat(request.args.get('start', ''))
+    except ValueError:
+        start = None
+    days = min(max(request.args.get('days', WINDOW_DAYS, type=int), 1), 31)
+    return start, days
+
+def schedule_page(theater_id, detail):
+    # MOVIES.html for a theater's window of days, through the page cache
+    start, days = schedule_window()
+    today = date.today()
 
-    return render_template('ALL_MOVIES.html', details = detail, movies = movie)
+    def render(details):
+        return render_template('MOVIES.html', days = schedule.window(theater_id, start, days), today = today, theater_id = theater_id, details=details)
+
+    key = ('MOVIES', catalog_cache.version('MOVIES', 'TM'), theater_id, start, days, today)
+    return pages.respond(key, render, detail)
 
-theater_id_variable = 0
 @app.route('/mt_movies/<int:theater_id>')
 def mt_movies(theater_id):
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    global theater_id_variable
-    theater_id_variable = theater_id
-    today = '2024-05-23'
-    tomorrow = '2024-05-24'
-
-    cursor.execute("""
-        SELECT MOVIES.MOVIE_ID, MOVIES.MOVIE_NAME, MOVIES.GENRE, MOVIES.RATING, MOVIES.DESCRIPTION,
-               MOVIES.URL, MOVIES.RUN_TIME, 
-               GROUP_CONCAT(TM.SCREEN_ID SEPARATOR ',') AS Screens,
-               GROUP_CONCAT(TM.SHOW_TIME SEPARATOR ',') AS Times
-        FROM MOVIES
-        JOIN TM ON TM.MOVIE_ID = MOVIES.MOVIE_ID
-        JOIN THEATERS ON TM.THEATER_ID = THEATERS.THEATER_ID
-        WHERE THEATERS.THEATER_ID = %s AND TM.SHOW_DATE = %s
-        GROUP BY MOVIES.MOVIE_ID;
-    """, (theater_id, today, ))
-    today_movies = cursor.fetchall()
-
-    cursor.execute("""
-        SELECT MOVIES.MOVIE_ID, MOVIES.MOVIE_NAME, MOVIES.GENRE, MOVIES.RATING, MOVIES.DESCRIPTION,
-               MOVIES.URL, MOVIES.RUN_TIME, 
-               GROUP_CONCAT(TM.SCREEN_ID SEPARATOR ',') AS Screens,
-               GROUP_CONCAT(TM.SHOW_TIME SEPARATOR ',') AS Times
-        FROM MOVIES
-        JOIN TM ON TM.MOVIE_ID = MOVIES.MOVIE_ID
-        JOIN THEATERS ON TM.THEATER_ID = THEATERS.THEATER_ID
-        WHERE THEATERS.THEATER_ID = %s AND TM.SHOW_DATE = %s
-        GROUP BY MOVIES.MOVIE_ID;
-    """, (theater_id, tomorrow))
-    tomorrow_movies = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
+    session['selected_theater'] = theater_id
 
     name = session.get('name')
     email = session.get('email')
@@ -563,51 +381,11 @@ def mt_movies(theater_id):
     m = session.get('selected_movie')
     detail = (name, email, phone, location, m)
 
-    from datetime import datetime
-
-    fdt1 = '23rd May'
-    fdt2 = '24th May'
+    return schedule_page(theater_id, detail)
 
-    return render_template('MOVIES.html', today = fdt1, tomorrow = fdt2, today_movies=today_movies, tomorrow_movies=tomorrow_movies, details=detail)
-
-theater_id_variable = 0
 @app.route('/tm_movies/<int:theater_id>/<int:movie_id>')
 def tm_movies(theater_id, movie_id): 
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    global theater_id_variable
-    theater_id_variable = theater_id
-    today = '2024-05-23'
-    tomorrow = '2024-05-24'
-
-    cursor.execute("""
-        SELECT MOVIES.MOVIE_ID, MOVIES.MOVIE_NAME, MOVIES.GENRE, MOVIES.RATING, MOVIES.DESCRIPTION,
-               MOVIES.URL, MOVIES.RUN_TIME, 
-               GROUP_CONCAT(TM.SCREEN_ID SEPARATOR ',') AS Screens,
-               GROUP_CONCAT(TM.SHOW_TIME SEPARATOR ',') AS Times
-        FROM MOVIES
-        JOIN TM ON TM.MOVIE_ID = MOVIES.MOVIE_ID
-        JOIN THEATERS ON TM.THEATER_ID = THEATERS.THEATER_ID
-        WHERE THEATERS.THEATER_ID = %s AND TM.SHOW_DATE = %s
-        GROUP BY MOVIES.MOVIE_ID;
-    """, (theater_id, today, ))
-    today_movies = cursor.fetchall()
-
-    cursor.execute("""
-        SELECT MOVIES.MOVIE_ID, MOVIES.MOVIE_NAME, MOVIES.GENRE, MOVIES.RATING, MOVIES.DESCRIPTION,
-               MOVIES.URL, MOVIES.RUN_TIME, 
-               GROUP_CONCAT(TM.SCREEN_ID SEPARATOR ',') AS Screens,
-               GROUP_CONCAT(TM.SHOW_TIME SEPARATOR ',') AS Times
-        FROM MOVIES
-        JOIN TM ON TM.MOVIE_ID = MOVIES.MOVIE_ID
-        JOIN THEATERS ON TM.THEATER_ID = THEATERS.THEATER_ID
-        WHERE THEATERS.THEATER_ID = %s AND TM.SHOW_DATE = %s
-        GROUP BY MOVIES.MOVIE_ID;
-    """, (theater_id, tomorrow))
-    tomorrow_movies = cursor.fetchall()
-
-    cursor.close()
-    conn.close()
+    session['selected_theater'] = theater_id
 
     name = session.get('name')
     email = session.get('email')
@@ -616,79 +394,80 @@ def tm_movies(theater_id, movie_id):
     m = movie_id
     detail = (name, email, phone, location, m)
 
-    fdt1 = "23rd May"
-    fdt2 = "24th May"
-
-    return render_template('MOVIES.html', today = fdt1, tomorrow = fdt2, today_movies=today_movies, tomorrow_movies=tomorrow_movies, details=detail)
+    return schedule_page(theater_id, detail)
 
 @app.route('/bookings/<int:movie_id>/<int:screen_id>/<string:time>/<string:day>')
-def booking(movie_id, screen_id, time, day):
-    # You can perform additional logic here if needed
-    ti = theater_id_variable
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("""SELECT MOVIE_ID, MOVIE_NAME, GENRE FROM MOVIES WHERE MOVIE_ID = %s;""", (movie_id,))
-    movie = cursor.fetchall()
-    cursor.execute("""SELECT THEATER_ID, THEATER_NAME, LOCATION FROM THEATERS WHERE THEATER_ID = %s;""", (ti,))
-    theater = cursor.fetchall()
-    cursor.execute("""SELECT ELITE_SEATS, PREMIUM_SEATS FROM SCREENS WHERE THEATER_ID = %s AND SCREEN_ID = %s;""", (ti, screen_id,))
-    seat = cursor.fetchall()
+def booking_without_theater(movie_id, screen_id, time, day):
+    # Links from before the theater was part of the URL: use the theater this
+    # session last browsed
+    theater_id = session.get('selected_theater')
+    if theater_id is None:
+        return redirect(url_for('theaters'))
+    return redirect(url_for('booking', theater_id = theater_id, movie_id = movie_id, screen_id = screen_id, time = time, day = day, **request.args))
+
+def show_occupancy(theater_id, screen_id, day, time, screen_row):
+    # Booked seats of a show from the occupancy cache; a miss is one query for every
+    # booked seat of the show (uq_show_seat index)
+    def load_booked():
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            seat_query = "SELECT SEATS FROM SEATS_BOOKED WHERE THEATER_ID = %s AND SCREEN_ID = %s AND DAY = %s AND SHOW_TIME = %s"
+            cursor.execute(seat_query, (theater_id, screen_id, day, time))
+            booked_seats = [booked[0] for booked in cursor.fetchall()]
+            cursor.close()
+        return booked_seats
+    layout = (screen_row[2], screen_row[3]) if screen_row else (0, 0)
+    return occupancy.get(show_key(theater_id, screen_id, day, time), layout, load_booked)
+
+@app.route('/bookings/<int:theater_id>/<int:movie_id>/<int:screen_id>/<string:time>/<string:day>')
+def booking(theater_id, movie_id, screen_id, time, day):
+    ti = theater_id
     name = session.get('name')
     email = session.get('email')
     phone = session.get('phone') 
     location = session.get('location')
+    try:
+        show_day = parse_day(day)
+    except ValueError:
+        # Neither an ISO date nor a day label: an old or hand-edited link
+        abort(404)
     session['mv_s'] = movie_id
     session['th_s'] = ti
     session['sc_s'] = screen_id
     session['ti_s'] = time
-    session['da_s'] = day #23rd May format
-    def convert_to_iso_format(date_str):
-        day, month = date_str.split()
-        day = day.rstrip('stndrdth')
-        months = {
-            'January': '01',
-            'February': '02',
-            'March': '03',
-            'April': '04',
-            'May': '05',
-            'June': '06',
-            'July': '07',
-            'August': '08',
-            'September': '09',
-            'October': '10',
-            'November': '11',
-            'December': '12'
-        }
-        month_num = months[month]
-        iso_format_date = f"2024-{month_num}-{day:02}"
-        return iso_format_date
-    date_obj = convert_to_iso_format(day)#2024-05-23
+    session['da_s'] = day_label(show_day) #23rd May format
+    date_obj = show_day.isoformat()#2024-05-23
+    session['date_iso'] = date_obj
     
-    insert_query = "SELECT BOOKING_ID FROM BOOKINGS where movie_id = %s and theater_id = %s and screen_id = %s and day = %s and show_time = %s"
-    cursor.execute(insert_query, (movie_id, ti, screen_id, date_obj, time))
-    result = cursor.fetchall()
-
-    booking_seat = []
-    if result:
-        for book in result:
-            booking_id = book[0]  # Assuming BOOKING_ID is the first column
-            seat_query = "SELECT seats FROM SEATS_BOOKED WHERE BOOKING_ID = %s"
-            cursor.execute(seat_query, (booking_id,))
-            booking_seat.extend(cursor.fetchall())  # Use extend to add all tuples to the list
-        
-
-    else:
-        booking_id = None  # Or handle the case where no booking_id is found
+    show = show_key(ti, screen_id, date_obj, time)
+    # Movie, theater and screen from the catalog cache
+    movie_row = catalog.movie(movie_id)
+    theater_row = catalog.theater(ti)
+    screen_row = catalog.screen(ti, screen_id)
+    row = movie_row and theater_row and screen_row
+    movie = [movie_row[0:3]] if row else []
+    theater = [theater_row] if row else []
+    seat = [screen_row[2:4]] if row else []
+
+    # BOOKINGS.html lays out seats[0][0] 'pseat' and seats[0][1] 'eseat' buttons
+    booked = show_occupancy(ti, screen_id, date_obj, time, screen_row if row else None)
  
-    booking_seat_list = [seat[0] for seat in booking_seat]
+    # Seats other users are holding on TICKETS.html render as unavailable too
+    booked.update(hold_store.held(show, exclude_owner = hold_owner()))
+    # Set by pay() when someone else bought one of the selected seats first
+    conflict = request.args.get('conflict')
     
     detail = (name, email, phone, location)
-    return render_template('BOOKINGS.html', movies = movie, theaters = theater, screen  = screen_id, times =time, days = day, dates_obj=date_obj, seats=seat,  details=detail, bookings_seat = booking_seat_list)
+    return render_template('BOOKINGS.html', movies = movie, theaters = theater, screen  = screen_id, times =time, days = session['da_s'], dates_obj=date_obj, seats=seat,  details=detail, occupancy = booked.pack(), conflict = conflict)
 
 @app.route('/proceed', methods=['POST'])
 def proceed():
     data = request.get_json()
     selected_seats = data.get('selectedSeats', [])
+    show = show_key(session.get('th_s'), session.get('sc_s'), session.get('date_iso'), session.get('ti_s'))
+    conflicts = hold_store.hold(show, selected_seats, hold_owner())
+    if conflicts:
+        return jsonify({'conflict': conflicts}), 409
     selected_seats_string = ', '.join(map(str, selected_seats))
     session['se_s'] = selected_seats
     return jsonify({'selectedSeats': selected_seats_string})
@@ -714,151 +493,77 @@ def bookings():
     # formatted_date = date_obj.strftime("%d-%b-%Y")
    
 
-    def convert_to_iso_format(date_str):
-        day, month = date_str.split()
-        day = day.rstrip('stndrdth')
-        months = {
-            'January': '01',
-            'February': '02',
-            'March': '03',
-            'April': '04',
-            'May': '05',
-            'June': '06',
-            'July': '07',
-            'August': '08',
-            'September': '09',
-            'October': '10',
-            'November': '11',
-            'December': '12'
-        }
-        month_num = months[month]
-        iso_format_date = f"2024-{month_num}-{day:02}"
-        return iso_format_date
-        
-    str_date_obj = convert_to_iso_format(day)
+    str_date_obj = session.get('date_iso')
     date_obj = datetime.strptime(str_date_obj, '%Y-%m-%d')
     month_name = date_obj.strftime("%B")
     day_of_week = date_obj.strftime("%A")
     seats = session.get('se_s')
     seats_count = len(seats)
-    premium_count = 0
-    elite_count = 0
-    session['dateObj'] = date_obj #2024-05-23
-
-    # Iterate over each seat in the list
-    for seat in seats:
-    # Check if the seat starts with 'p' (premium)
-        if seat.startswith('p'):
-            premium_count += 1
-    # Check if the seat starts with 'e' (elite)
-        elif seat.startswith('e'):
-            elite_count += 1
+
+    # Prices from the theater's cached rules, surged by how full the show already is
+    screen_row = catalog.screen(theater, screen)
+    load = show_occupancy(theater, screen, str_date_obj, time, screen_row).load_factor()
+    quote = pricing.quote(theater, screen, str_date_obj, time, seats, load)
+    premium_count = quote.premium_count
+    elite_count = quote.elite_count
     session['p_count'] = premium_count
-    session['e_count'] = elite_count 
-    p_cost = premium_count * 190
-    p_cost_formatted = format(p_cost, '.1f')
-    e_cost = elite_count * 150
-    e_cost_formatted = format(e_cost, '.1f')
-    t_cost = p_cost+e_cost
-    t_cost_formatted = format(t_cost, '.1f')
-    tax = t_cost * 0.18
-    tax_formatted = format(tax, '.1f')
-    tick = tax + 25
-    tick_formatted = format(tick, '.1f')
-    o_total = tick + t_cost
-    o_total_formatted = format(o_total, '.1f')
+    session['e_count'] = elite_count
+    p_cost_formatted = str(quote.premium_cost)
+    e_cost_formatted = str(quote.elite_cost)
+    t_cost_formatted = str(quote.seat_total)
+    tax_formatted = str(quote.tax)
+    tick_formatted = str(quote.tax + quote.fee)
+    o_total_formatted = str(quote.total)
+    # pay() books at the quoted prices
     session['price'] = o_total_formatted
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    insert_query = "SELECT movie_name from movies where movie_id = %s;"
-    cursor.execute(insert_query, (movie, ))
-    movie_name = cursor.fetchall()
-    insert_query = "SELECT theater_name from theaters where theater_id = %s;"
-    cursor.execute(insert_query, (theater, ))
-    theater_name = cursor.fetchall()
-    insert_query = "SELECT location from theaters where theater_id = %s;"
-    cursor.execute(insert_query, (theater, ))
-    theater_location = cursor.fetchall()
-    insert_query = "SELECT RATING FROM MOVIES WHERE MOVIE_ID = %s"
-    cursor.execute(insert_query, (movie, ))
-    rating = cursor.fetchall()
-    insert_query = "SELECT URL FROM MOVIES WHERE MOVIE_ID=%s"
-    cursor.execute(insert_query, (movie,))
-    img = cursor.fetchall()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    all_detail = (name, email, phone, location, movie_name[0][0], theater_name[0][0], theater_location[0][0], rating[0][0], seats_count, screen, short_time, 1, date_obj, month_name, day_of_week, premium_count, elite_count, p_cost_formatted,e_cost_formatted,t_cost_formatted, tax_formatted, tick_formatted, o_total_formatted, img[0][0], seats, day)
+    session['seat_total'] = t_cost_formatted
+    movie_row = catalog.movie(movie)
+    theater_row = catalog.theater(theater)
+    all_detail = (name, email, phone, location, movie_row[1], theater_row[1], theater_row[2], movie_row[3], seats_count, screen, short_time, 1, date_obj, month_name, day_of_week, premium_count, elite_count, p_cost_formatted,e_cost_formatted,t_cost_formatted, tax_formatted, tick_formatted, o_total_formatted, movie_row[5], seats, day, quote.premium_price, quote.elite_price, quote.fee)
     return render_template('TICKETS.html', all_details = all_detail)
 
 
 @app.route('/pay')
 def pay():
-    email = session.get('email')
-    phone = session.get('phone')
-    location = session.get('location')
     movie = session.get('mv_s')
     theater = session.get('th_s')
     screen = session.get('sc_s')
-    date = session.get('dateObj')#2024-05-23
+    day = session.get('date_iso')#2024-05-23
     time = session.get('ti_s')
     seats = session.get('se_s')
 
     p_count = session.get('p_count')
     e_count = session.get('e_count')
     price = session.get('price')
-
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    insert_query = "Select user_id from users where email = %s"
-    cursor.execute(insert_query, (email, ))
-    userId = cursor.fetchall()
-    user_id = userId[0][0]
-
-    insert_query = "INSERT INTO bookings (user_id, movie_id, theater_id, screen_id, day, show_time, no_of_elite_seats, no_of_premium_seats, price) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"
-    cursor.execute(insert_query, (user_id, movie, theater, screen, date, time, e_count, p_count, price))
-
-    insert_query = "SELECT BOOKING_ID FROM BOOKINGS where user_id = %s and movie_id = %s and theater_id = %s and screen_id = %s and day = %s and show_time = %s and no_of_elite_seats = %s and no_of_premium_seats = %s and price = %s"
-    cursor.execute(insert_query, (user_id, movie, theater, screen, date, time, e_count, p_count, price))
-    booking_id = cursor.fetchall()
-    for seat in seats:
-        insert_query = "INSERT INTO SEATS_BOOKED (booking_id, seats) values(%s, %s)"
-        cursor.execute(insert_query, (booking_id[0][0], seat))
-    
-    insert_query = "SELECT DAY, SHOW_TIME FROM BOOKINGS WHERE BOOKING_ID = %s "
-    cursor.execute(insert_query, (booking_id[0][0],))
-    details = cursor.fetchall()
-    day = details[0][0]
-    show_time = details[0][1]
-    insert_query = "SELECT movie_name from movies where movie_id = %s;"
-    cursor.execute(insert_query, (movie, ))
-    movie_name = cursor.fetchall()
-    insert_query = "SELECT theater_name from theaters where theater_id = %s;"
-    cursor.execute(insert_query, (theater, ))
-    theater_name = cursor.fetchall()
-    insert_query = "SELECT location from theaters where theater_id = %s;"
-    cursor.execute(insert_query, (theater, ))
-    theater_location = cursor.fetchall()
-    insert_query = "SELECT RATING FROM MOVIES WHERE MOVIE_ID = %s"
-    cursor.execute(insert_query, (movie, ))
-    rating = cursor.fetchall()
-    insert_query = "SELECT URL FROM MOVIES WHERE MOVIE_ID=%s"
-    cursor.execute(insert_query, (movie,))
-    img = cursor.fetchall()
-
-    show_time = str(show_time)
-    show_time = show_time[0:7]
-    
-    seated = []
-    for seat in seats:
-        prefix = seat[0]
-        number = seat[5:]
-        seated.append(prefix.upper() + number)
-
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
+    seat_total = session.get('seat_total')
+    # Set by check(); the purchase itself is BOOKINGS + SEATS_BOOKED inserts and
+    # the commit, three round trips
+    user_id = session.get('id')
+
+    show = show_key(theater, screen, day, time)
+    owner = hold_owner()
+    with db_pool.connection() as conn:
+        try:
+            # Renew our holds on exactly these seats, failing if another user holds
+            # any of them. They are kept until the booking has committed, so a
+            # failed purchase (deadlock, lost connection) leaves the seats ours.
+            conflicts = hold_store.hold(show, seats, owner)
+            if conflicts:
+                raise SeatConflict(conflicts)
+            reserve_seats(conn, user_id, movie, theater, screen, day, time, seats, e_count, p_count, price, seat_total)
+            hold_store.release(show, owner)
+            occupancy.add(show, seats)
+            recent_bookings.invalidate(user_id)
+        except SeatConflict as e:
+            # Someone beat us to it, reload the show on the next seat map
+            hold_store.release(show, owner)
+            occupancy.invalidate(show)
+            return redirect(url_for('booking', theater_id = theater, movie_id = movie, screen_id = screen, time = time, day = day, conflict = ','.join(e.seats)))
+
+    # Everything on the ticket is already known: the show from the session, the
+    # movie and theater from the catalog cache
+    show_time = time[:5]
+    seated = [seat_label(seat) for seat in seats]
 
     name=session.get('name')
     email=session.get('email')
@@ -866,14 +571,17 @@ def pay():
     location=session.get('location')
     
     detail = (name, email, phone, location)
-    return render_template('GENERATION.html', details = detail, user_ids = user_id,seats = seated, days = day, show_times = show_time, movie_names = movie_name[0][0], theater_names= theater_name[0][0], theater_locations = theater_location[0][0], ratings = rating[0][0], imgs = img[0][0])
+    movie_row = catalog.movie(movie)
+    theater_row = catalog.theater(theater)
+    return render_template('GENERATION.html', details = detail, user_ids = user_id,seats = seated, days = day, show_times = show_time, movie_names = movie_row[1], theater_names= theater_row[1], theater_locations = theater_row[2], ratings = movie_row[3], imgs = movie_row[5])
 
 @app.route('/create_movie')
 def create_movie():
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("SELECT MOVIE_ID, MOVIE_NAME, GENRE, RATING, DESCRIPTION, URL, RUN_TIME, RDATE FROM MOVIES ORDER BY(MOVIE_ID);")
-    movie_detail = cursor.fetchall()
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MOVIE_ID, MOVIE_NAME, GENRE, RATING, DESCRIPTION, URL, RUN_TIME, RDATE FROM MOVIES ORDER BY(MOVIE_ID);")
+        movie_detail = cursor.fetchall()
+        cursor.close()
     return render_template('EDIT_MOVIES_1.html', movie_details = movie_detail)
 
 @app.route('/insert_movie')
@@ -883,67 +591,42 @@ def insert_movie():
 
 @app.route('/update_movie/<int:movie_id>')
 def update_movie(movie_id):
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("SELECT MOVIE_ID, MOVIE_NAME, GENRE, RATING, DESCRIPTION, URL, RUN_TIME, RDATE FROM MOVIES WHERE MOVIE_ID = %s;", (movie_id, ))
-    movie_detail = cursor.fetchall()
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MOVIE_ID, MOVIE_NAME, GENRE, RATING, DESCRIPTION, URL, RUN_TIME, RDATE FROM MOVIES WHERE MOVIE_ID = %s;", (movie_id, ))
+        movie_detail = cursor.fetchall()
+        cursor.close()
     return render_template('EDIT_MOVIES_2.html', movie_details = movie_detail, operation='update')
 
 @app.route('/delete_movie/<int:movie_id>')
 def delete_movie(movie_id):
-    try:
-        conn = connect_to_database()
+    error = None
+    with db_pool.connection() as conn:
         cursor = conn.cursor()
-        delete_query = "DELETE FROM MOVIES WHERE MOVIE_ID = %s;"
-        cursor.execute(delete_query, (movie_id,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        try:
+            delete_query = "DELETE FROM MOVIES WHERE MOVIE_ID = %s;"
+            cursor.execute(delete_query, (movie_id,))
+            conn.commit()
+            # Cached TM listings carry the movie's name too
+            catalog_cache.invalidate('MOVIES', 'TM')
+        except mysql.connector.Error as e:
+            conn.rollback()
+            error = "MOVIE IS SCHEDULED ALREADY"
 
-        conn = connect_to_database()
-        cursor = conn.cursor()
         cursor.execute("SELECT MOVIE_ID, MOVIE_NAME, GENRE, RATING, DESCRIPTION, URL, RUN_TIME, RDATE FROM MOVIES ORDER BY(MOVIE_ID);")
         movie_detail = cursor.fetchall()
-        conn.commit()
         cursor.close()
-        conn.close()
-        return render_template('EDIT_MOVIES_1.html',movie_details = movie_detail)
-    except Exception as e:
-        conn = connect_to_database()
-        cursor = conn.cursor()
-        cursor.execute("SELECT MOVIE_ID, MOVIE_NAME, GENRE, RATING, DESCRIPTION, URL, RUN_TIME, RDATE FROM MOVIES ORDER BY(MOVIE_ID);")
-        movie_detail = cursor.fetchall()
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return render_template('EDIT_MOVIES_1.html',movie_details = movie_detail, error = "MOVIE IS SCHEDULED ALREADY")
+    if error:
+        return render_template('EDIT_MOVIES_1.html',movie_details = movie_detail, error = error)
+    return render_template('EDIT_MOVIES_1.html',movie_details = movie_detail)
 
 @app.route('/back_from')
 def back_from():
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("SELECT MOVIES.MOVIE_ID, MOVIES.MOVIE_NAME, MOVIES.RDATE, calculate_movie_revenue(MOVIES.MOVIE_ID) AS total_revenue FROM MOVIES;")
-    movie_detail = cursor.fetchall()
-    cursor.callproc('calculate_movie_count')
-    result = cursor.stored_results()
-    movie_count = None
-    for result_set in result:
-        movie_count = result_set.fetchone()[0]
-
-    cursor.execute("SELECT THEATER_ID, THEATER_NAME, LOCATION, calculate_theater_revenue(THEATER_ID) AS total_price FROM THEATERS;")
-    theater_detail = cursor.fetchall()
-    cursor.callproc('calculate_theater_count')
-    result = cursor.stored_results()
-    theater_count = None
-    for result_set in result:
-        theater_count = result_set.fetchone()[0]
-
-
-    cursor.callproc('active_users')
-    result = cursor.stored_results()
-    user_count = None
-    for result_set in result:
-        user_count = result_set.fetchone()[0]
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        # Revenue and counts come from the trigger-maintained *_STATS tables
+        movie_detail, theater_detail, movie_count, theater_count, user_count = load_dashboard(cursor)
+        cursor.close()
 
     return render_template('ADMIN.html', movie_details = movie_detail, theater_details = theater_detail,result1 = movie_count, result2 = theater_count, result3 = user_count)
 
@@ -957,23 +640,21 @@ def commit_movie():
     url = request.form['url']
     run_time = request.form['run_time']
     rdate = request.form['rdate']
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    insert_query = "INSERT INTO MOVIES (movie_id, movie_name, genre, rating, description, url, run_time, rdate) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
-    cursor.execute(insert_query, (movie_id, movie_name, genre, rating, description, url, run_time, rdate))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        insert_query = "INSERT INTO MOVIES (movie_id, movie_name, genre, rating, description, url, run_time, rdate) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+        cursor.execute(insert_query, (movie_id, movie_name, genre, rating, description, url, run_time, rdate))
+        conn.commit()
+        catalog_cache.invalidate('MOVIES')
+        cursor.execute("SELECT MOVIE_ID, MOVIE_NAME, GENRE, RATING, DESCRIPTION, URL, RUN_TIME, RDATE FROM MOVIES ORDER BY(MOVIE_ID);")
+        movie_detail = cursor.fetchall()
+        cursor.close()
 
     name=session.get('name')
     email=session.get('email')
     phone=session.get('phone')
     location=session.get('location')
     detail = (name, email, phone, location)
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("SELECT MOVIE_ID, MOVIE_NAME, GENRE, RATING, DESCRIPTION, URL, RUN_TIME, RDATE FROM MOVIES ORDER BY(MOVIE_ID);")
-    movie_detail = cursor.fetchall()
     return render_template('EDIT_MOVIES_1.html', details = detail, movie_details = movie_detail)
 
 @app.route('/updated_movie', methods=['POST'])
@@ -988,42 +669,36 @@ def updated_movie():
     run_time = request.form['run_time']
     rdate = request.form['rdate']
 
-    try:
-        conn = connect_to_database()
+    with db_pool.connection() as conn:
         cursor = conn.cursor()
-        update_query = "UPDATE MOVIES SET movie_name = %s, genre = %s, rating = %s, description = %s, url = %s, run_time = %s, rdate = %s WHERE movie_id = %s"
-        cursor.execute(update_query, (movie_name, genre, rating, description, url, run_time, rdate, movie_id))
-        conn.commit()
-        cursor.close()
-        conn.close()
-
+        try:
+            update_query = "UPDATE MOVIES SET movie_name = %s, genre = %s, rating = %s, description = %s, url = %s, run_time = %s, rdate = %s WHERE movie_id = %s"
+            cursor.execute(update_query, (movie_name, genre, rating, description, url, run_time, rdate, movie_id))
+            conn.commit()
+            catalog_cache.invalidate('MOVIES')
+        except mysql.connector.Error as e:
+            conn.rollback()
+            # If an error occurs, capture the error message
+            error_message = "Run time of Movie can't be updated once if screened."
+            # Fetch movie details again to pass to the template
+            cursor.execute("SELECT MOVIE_ID, MOVIE_NAME, GENRE, RATING, DESCRIPTION, URL, RUN_TIME, RDATE FROM MOVIES WHERE MOVIE_ID = %s;", (movie_id,))
+            movie_detail = cursor.fetchall()
+            cursor.close()
+            return render_template('EDIT_MOVIES_2.html', movie_details=movie_detail, error=error_message, operation='update')
 
-        conn = connect_to_database()
-        cursor = conn.cursor()
         cursor.execute("SELECT MOVIE_ID, MOVIE_NAME, GENRE, RATING, DESCRIPTION, URL, RUN_TIME, RDATE FROM MOVIES ORDER BY(MOVIE_ID);")
         movie_detail = cursor.fetchall()
-        conn.commit()
         cursor.close()
-        conn.close()
-        return render_template('EDIT_MOVIES_1.html',movie_details = movie_detail)
-    
-    except Exception as e:
-        # If an error occurs, capture the error message
-        error_message = "Run time of Movie can't be updated once if screened."
-        # Fetch movie details again to pass to the template
-        conn = connect_to_database()
-        cursor = conn.cursor()
-        cursor.execute("SELECT MOVIE_ID, MOVIE_NAME, GENRE, RATING, DESCRIPTION, URL, RUN_TIME, RDATE FROM MOVIES WHERE MOVIE_ID = %s;", (movie_id,))
-        movie_detail = cursor.fetchall()
-        return render_template('EDIT_MOVIES_2.html', movie_details=movie_detail, error=error_message, operation='update')
+    return render_template('EDIT_MOVIES_1.html',movie_details = movie_detail)
 
 
 @app.route('/create_theater')
 def create_theater():
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("SELECT THEATER_ID, THEATER_NAME, LOCATION FROM THEATERS;")
-    theater_detail = cursor.fetchall()
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT THEATER_ID, THEATER_NAME, LOCATION FROM THEATERS;")
+        theater_detail = cursor.fetchall()
+        cursor.close()
     return render_template('EDIT_THEATERS_1.html', theater_details = theater_detail)
 
 @app.route('/insert_theater')
@@ -1037,13 +712,15 @@ def commit_theater():
     theater_name = request.form['theater_name']
     location = request.form['location']
     sc = request.form['screen']
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    insert_query = "INSERT INTO THEATERS (theater_id, theater_name, location) VALUES (%s, %s, %s)"
-    cursor.execute(insert_query, (theater_id, theater_name, location))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        insert_query = "INSERT INTO THEATERS (theater_id, theater_name, location) VALUES (%s, %s, %s)"
+        cursor.execute(insert_query, (theater_id, theater_name, location))
+        conn.commit()
+        cursor.close()
+    catalog_cache.invalidate('THEATERS')
+    if geo_index is not None:
+        geo_index.add(int(theater_id), theater_name, location)
     return redirect(url_for('create_screen', tid=theater_id, scc = sc))
 
 @app.route("/create_screen")
@@ -1051,21 +728,23 @@ def create_screen():
     sc = request.args.get('scc')
     session['sc'] = int(sc)
     theater_id = request.args.get('tid')
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("SELECT THEATER_ID, SCREEN_ID, SCREEN_NAME, ELITE_SEATS, PREMIUM_SEATS FROM SCREENS WHERE THEATER_ID = %s;", (theater_id, ))
-    screen_detail = cursor.fetchall()
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT THEATER_ID, SCREEN_ID, SCREEN_NAME, ELITE_SEATS, PREMIUM_SEATS FROM SCREENS WHERE THEATER_ID = %s;", (theater_id, ))
+        screen_detail = cursor.fetchall()
+        cursor.close()
     return render_template('EDIT_SCREENS_1.html', screen_count = int(sc), theater_id = theater_id)
 
 @app.route('/update_theater/<int:theater_id>')
 def update_theater(theater_id):
     theater_detail = [[]]
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("SELECT THEATER_ID, THEATER_NAME, LOCATION FROM THEATERS WHERE THEATER_ID = %s;", (theater_id, ))
-    theater_detail1 = cursor.fetchall()
-    cursor.execute("SELECT COUNT(*) FROM SCREENS GROUP BY(THEATER_ID) HAVING THEATER_ID = %s", (theater_id, ))
-    theater_detail2 = cursor.fetchall()
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT THEATER_ID, THEATER_NAME, LOCATION FROM THEATERS WHERE THEATER_ID = %s;", (theater_id, ))
+        theater_detail1 = cursor.fetchall()
+        cursor.execute("SELECT COUNT(*) FROM SCREENS GROUP BY(THEATER_ID) HAVING THEATER_ID = %s", (theater_id, ))
+        theater_detail2 = cursor.fetchall()
+        cursor.close()
     theater_detail[0].append(theater_detail1[0][0])
     theater_detail[0].append(theater_detail1[0][1])
     theater_detail[0].append(theater_detail1[0][2])
@@ -1079,80 +758,55 @@ def updated_theater():
     theater_name = request.form['theater_name']
     location = request.form['location']
 
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    update_query = "UPDATE THEATERS SET theater_name = %s, location = %s WHERE theater_id = %s;"
-    cursor.execute(update_query, (theater_name, location, theater_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("SELECT THEATER_ID, THEATER_NAME, LOCATION FROM THEATERS;")
-    theater_detail = cursor.fetchall()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return render_template('EDIT_THEATERS_1.html',theater_details = theater_detail)
-
-@app.route('/delete_theater/<int:theater_id>')
-def delete_theater(theater_id):
-    try:
-        conn = connect_to_database()
+    with db_pool.connection() as conn:
         cursor = conn.cursor()
-        cursor.callproc('DELETE_THEATER', [theater_id])
+        update_query = "UPDATE THEATERS SET theater_name = %s, location = %s WHERE theater_id = %s;"
+        cursor.execute(update_query, (theater_name, location, theater_id))
         conn.commit()
-        cursor.close()
-        conn.close()
-
-        conn = connect_to_database()
-        cursor = conn.cursor()
-        cursor.execute("SELECT THEATER_ID, THEATER_NAME, LOCATION FROM THEATERS ORDER BY(THEATER_ID);")
+        catalog_cache.invalidate('THEATERS')
+        if geo_index is not None:
+            geo_index.update(theater_id, theater_name, location)
+        cursor.execute("SELECT THEATER_ID, THEATER_NAME, LOCATION FROM THEATERS;")
         theater_detail = cursor.fetchall()
-        conn.commit()
         cursor.close()
-        conn.close()
-        return render_template('EDIT_THEATERS_1.html',theater_details = theater_detail)
+    return render_template('EDIT_THEATERS_1.html',theater_details = theater_detail)
 
-    except Exception as e:
-        conn = connect_to_database()
+@app.route('/delete_theater/<int:theater_id>')
+def delete_theater(theater_id):
+    error = None
+    with db_pool.connection() as conn:
         cursor = conn.cursor()
+        try:
+            cursor.callproc('DELETE_THEATER', [theater_id])
+            conn.commit()
+            catalog_cache.invalidate('THEATERS', 'SCREENS', 'TM')
+            if geo_index is not None:
+                geo_index.remove(theater_id)
+        except mysql.connector.Error as e:
+            conn.rollback()
+            error = "Theater is screened for some movies"
+
         cursor.execute("SELECT THEATER_ID, THEATER_NAME, LOCATION FROM THEATERS ORDER BY(THEATER_ID);")
         theater_detail = cursor.fetchall()
-        conn.commit()
         cursor.close()
-        conn.close()
-        return render_template('EDIT_THEATERS_1.html',theater_details = theater_detail, error = "Theater is screened for some movies")
+    if error:
+        return render_template('EDIT_THEATERS_1.html',theater_details = theater_detail, error = error)
+    return render_template('EDIT_THEATERS_1.html',theater_details = theater_detail)
 
 
 
 @app.route('/create_tm')
 def create_tm():
-    def gc(theater_id):
-        # Calculate hue based on theater_id (values between 0 and 360)
-        hue = (int(theater_id) * 137.508) % 360  # Golden angle approximation
-
-        # Convert HSL to RGB
-        h = hue / 360
-        s = 0.5  # Set saturation to a constant value (0.5)
-        l = 0.5  # Set lightness to a constant value (0.5)
-        r, g, b = [int(c * 255) for c in colorsys.hls_to_rgb(h, l, s)]
-
-        # Format RGB values as hexadecimal color code
-        color_code = "#{:02x}{:02x}{:02x}".format(r, g, b)
-
-        return color_code
-
-    conn = connect_to_database()
-    cursor = conn.cursor()
-    cursor.execute("""SELECT THEATERS.THEATER_ID, THEATERS.THEATER_NAME, MOVIES.MOVIE_ID, MOVIES.MOVIE_NAME, TM.SCREEN_ID, TM.SHOW_DATE, TM.SHOW_TIME FROM TM JOIN THEATERS ON TM.THEATER_ID = THEATERS.THEATER_ID JOIN MOVIES ON TM.MOVIE_ID = MOVIES.MOVIE_ID ORDER BY TM.THEATER_ID, TM.SHOW_TIME;""")
-    tm_detail = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    #t_detail = cursor.fetchall()
-    return render_template('EDIT_TM_1.html', tm_details = tm_detail, generate_color=gc)
+    # One keyset page of shows, filtered by ?theater=, ?movie= and ?date=; ?after=
+    # is the position the previous page ended at
+    filters = parse_filters(request.args)
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        tm_detail, next_after = load_page(cursor, filters, parse_key(request.args.get('after')))
+        cursor.close()
+    colors = {tm[0]: theater_color(tm[0]) for tm in tm_detail}
+    filter_args = {name: str(value) for name, value in filters.items()}
+    return render_template('EDIT_TM_1.html', tm_details = tm_detail, colors = colors, filters = filter_args, next_after = next_after)
 
 @app.route('/insert_tm')
 def insert_tm():
@@ -1162,76 +816,101 @@ def insert_tm():
 @app.route('/update_tm/<int:theater_id>/<int:movie_id>/<int:screen_id>/<string:show_date>/<string:show_time>')
 def update_tm(theater_id, movie_id, screen_id, show_date, show_time):
     tm_detail = ([theater_id, movie_id, screen_id, show_date, show_time])
-    return render_template('EDIT_TM_2.html', tm_details = tm_detail, operation='update')
+    # The slot being edited rides along in hidden fields, so updated_tm changes that row
+    original = (theater_id, screen_id, show_date, show_time)
+    return render_template('EDIT_TM_2.html', tm_details = tm_detail, original = original, operation='update')
 
-@app.route('/updated_tm', methods=['POST'])
-def updated_tm():
-    theater_id = request.form['theater_id']
-    movie_id = request.form['movie_id']
-    screen_id = request.form['screen_id']
-    show_date = request.form['show_date']
-    show_time = request.form['show_time']
-    
+def write_tm(original, operation):
+    tm_detail = (request.form['theater_id'], request.form['movie_id'], request.form['screen_id'], request.form['show_date'], request.form['show_time'])
     try:
-        conn = connect_to_database()
-        cursor = conn.cursor()
-        update_query = "UPDATE TM SET THEATER_ID = %s, MOVIE_ID = %s, SCREEN_ID = %s, SHOW_DATE = %s, SHOW_TIME = %s WHERE (THEATER_ID = %s AND SCREEN_ID = %s AND SHOW_DATE = %s AND SHOW_TIME = %s);"
-        cursor.execute(update_query, (theater_id, movie_id, screen_id, show_date, show_time, theater_id, screen_id, show_date, show_time))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return redirect(url_for('create_tm'))
+        with db_pool.connection() as conn:
+            accepted, errors = schedule_validator.commit(conn, [tm_detail], originals = [original])
+    except mysql.connector.IntegrityError:
+        # Lost a race for the slot to a concurrent write (uq_screen_slot)
+        return render_template('EDIT_TM_2.html', tm_details = tm_detail, original = original, error2 = DUPLICATE, operation = operation)
+    if errors:
+        er = errors[0].message
+        if er in (DUPLICATE, TOO_CLOSE):
+            return render_template('EDIT_TM_2.html', tm_details = tm_detail, original = original, error2 = er, operation = operation)
+        return render_template('EDIT_TM_2.html', tm_details = tm_detail, original = original, error1 = er, operation = operation)
+    catalog_cache.invalidate('TM')
+    return redirect(url_for('create_tm'))
 
-    except Exception as e:
-        tm_detail = (theater_id, movie_id, screen_id, show_date, show_time)
-        er = "MOVIE DOESN'T EXIST."
-        return render_template('EDIT_TM_2.html', tm_details = tm_detail, error1 = er, operation = 'update')
+@app.route('/updated_tm', methods=['POST'])
+def updated_tm():
+    # Updates the show in the original slot posted by update_tm's form; it must still exist
+    original = (request.form.get('original_theater_id'), request.form.get('original_screen_id'), request.form.get('original_show_date'), request.form.get('original_show_time'))
+    return write_tm(original, 'update')
 
 @app.route('/commit_tm', methods=['POST'])
 def commit_tm():
-    theater_id = request.form['theater_id']
-    movie_id = request.form['movie_id']
-    screen_id = request.form['screen_id']
-    show_date = request.form['show_date']
-    show_time = request.form['show_time']
-    
-    try:
-        conn = connect_to_database()
-        cursor = conn.cursor()
-        insert_query = "INSERT INTO TM (theater_id, movie_id, screen_id, show_date, show_time) VALUES (%s, %s, %s, %s, %s)"
-        cursor.execute(insert_query, (theater_id, movie_id, screen_id, show_date, show_time))
-        conn.commit()
-        cursor.close()
-        conn.close()
-        return redirect(url_for('create_tm'))
-
-    except mysql.connector.IntegrityError as e:
-        tm_detail = (theater_id, movie_id, screen_id, show_date, show_time)
-        er = "GIVEN MOVIE OR THEATER OR SCREEN DOESN'T EXIST"
-        return render_template('EDIT_TM_2.html', tm_details = tm_detail, error1 = er, operation = 'insert')
-    except mysql.connector.Error as e:
-        tm_detail = (theater_id, movie_id, screen_id, show_date, show_time)
-        er = "TIME GAP BETWEEN 2 MOVIES SHOULD BE ATLEAST 1 HOUR."
-        return render_template('EDIT_TM_2.html', tm_details = tm_detail, error2 = er, operation = 'insert')
+    return write_tm(None, 'insert')
+
+@app.route('/import_tm', methods=['POST'])
+def import_tm():
+    # A CSV or JSON schedule uploaded as the 'schedule' file (TM_BULK.read_rows);
+    # answers with the rows inserted and the rejected ones
+    upload = request.files.get('schedule')
+    if upload is None:
+        return jsonify(error = "upload the schedule as the 'schedule' file"), 400
+    fmt = request.form.get('format') or file_format(upload.filename)
+    report = import_schedule(db_pool, schedule_validator, read_rows(upload.stream, fmt))
+    if report['inserted']:
+        catalog_cache.invalidate('TM')
+    return jsonify(report), 400 if 'file_error' in report else 200
+
+@app.route('/export_tm')
+def export_tm():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORTERS:
+        return jsonify(error = "format must be one of %s" % ', '.join(sorted(EXPORTERS))), 400
+    # Streamed as the rows are fetched, filtered like create_tm
+    response = Response(EXPORTERS[fmt](export_rows(db_pool, parse_filters(request.args))), mimetype = 'text/csv' if fmt == 'csv' else 'application/json')
+    response.headers['Content-Disposition'] = 'attachment; filename=tm.%s' % fmt
+    return response
 
 @app.route('/commit_screen', methods=['POST'])
 def commit_screen():
     sc = session.get('sc')
-    for i in range(sc):
-        theater_id = request.form[f'theater_id{i}']
-        screen_id = request.form[f'screen_id{i}']
-        screen_name = request.form[f'screen_name{i}']
-        elite_seats = request.form[f'elite_seats{i}']
-        premium_seats = request.form[f'premium_seats{i}']
-        conn = connect_to_database()
+    with db_pool.connection() as conn:
         cursor = conn.cursor()
-        insert_query = "INSERT INTO SCREENS (theater_id, screen_id, screen_name, elite_seats, premium_seats) VALUES (%s, %s, %s, %s, %s)"
-        cursor.execute(insert_query, (theater_id, screen_id, screen_name, elite_seats, premium_seats))
+        for i in range(sc):
+            theater_id = request.form[f'theater_id{i}']
+            screen_id = request.form[f'screen_id{i}']
+            screen_name = request.form[f'screen_name{i}']
+            elite_seats = request.form[f'elite_seats{i}']
+            premium_seats = request.form[f'premium_seats{i}']
+            insert_query = "INSERT INTO SCREENS (theater_id, screen_id, screen_name, elite_seats, premium_seats) VALUES (%s, %s, %s, %s, %s)"
+            cursor.execute(insert_query, (theater_id, screen_id, screen_name, elite_seats, premium_seats))
         conn.commit()
         cursor.close()
-        conn.close()
+    catalog_cache.invalidate('SCREENS')
     return redirect(url_for('create_theater'))
 
+@app.route('/pool_stats')
+def pool_stats():
+    return jsonify(db_pool.metrics())
+
+@app.route('/metrics')
+def metrics():
+    return jsonify(request_metrics.metrics())
+
+@app.route('/session_stats')
+def session_stats():
+    return jsonify(app.session_interface.store.metrics())
+
+@app.route('/catalog_stats')
+def catalog_stats():
+    return jsonify(catalog_cache.metrics())
+
+@app.route('/page_stats')
+def page_stats():
+    return jsonify(pages.metrics())
+
 if __name__ == '__main__':
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        email_registry.warm(cursor)
+        cursor.close()
     app.run(debug=True)
     app.debug = True
\ No newline at end of file
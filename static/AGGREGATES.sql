@@ -0,0 +1,117 @@
+--DASHBOARD AGGREGATES, KEPT CURRENT BY TRIGGERS ON BOOKINGS SO THE ADMIN PAGE NEVER SCANS BOOKINGS
+--REVENUE SUMS BOOKINGS.SEAT_TOTAL, ADDED BY PRICING.sql (RUN THAT FIRST)
+CREATE TABLE IF NOT EXISTS MOVIE_STATS (
+    MOVIE_ID INT NOT NULL PRIMARY KEY,
+    BOOKINGS INT NOT NULL DEFAULT 0,
+    ELITE_SEATS INT NOT NULL DEFAULT 0,
+    PREMIUM_SEATS INT NOT NULL DEFAULT 0,
+    REVENUE DECIMAL(12, 2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS THEATER_STATS (
+    THEATER_ID INT NOT NULL PRIMARY KEY,
+    BOOKINGS INT NOT NULL DEFAULT 0,
+    ELITE_SEATS INT NOT NULL DEFAULT 0,
+    PREMIUM_SEATS INT NOT NULL DEFAULT 0,
+    REVENUE DECIMAL(12, 2) NOT NULL DEFAULT 0
+);
+
+--ONE ROW PER USER WITH AT LEAST ONE BOOKING, COUNT(*) IS THE ACTIVE USER COUNT
+CREATE TABLE IF NOT EXISTS USER_STATS (
+    USER_ID INT NOT NULL PRIMARY KEY,
+    BOOKINGS INT NOT NULL DEFAULT 0
+);
+
+
+--ADD EVERY NEW BOOKING TO ITS MOVIE, THEATER AND USER TOTALS (REVENUE AS IN calculate_movie_revenue)
+DELIMITER //
+
+CREATE OR REPLACE TRIGGER after_booking_insert_stats
+AFTER INSERT ON BOOKINGS FOR EACH ROW
+BEGIN
+    DECLARE booking_revenue DECIMAL(12, 2);
+    SET booking_revenue = NEW.seat_total;
+
+    INSERT INTO MOVIE_STATS (MOVIE_ID, BOOKINGS, ELITE_SEATS, PREMIUM_SEATS, REVENUE)
+    VALUES (NEW.movie_id, 1, NEW.no_of_elite_seats, NEW.no_of_premium_seats, booking_revenue)
+    ON DUPLICATE KEY UPDATE
+        BOOKINGS = BOOKINGS + 1,
+        ELITE_SEATS = ELITE_SEATS + NEW.no_of_elite_seats,
+        PREMIUM_SEATS = PREMIUM_SEATS + NEW.no_of_premium_seats,
+        REVENUE = REVENUE + booking_revenue;
+
+    INSERT INTO THEATER_STATS (THEATER_ID, BOOKINGS, ELITE_SEATS, PREMIUM_SEATS, REVENUE)
+    VALUES (NEW.theater_id, 1, NEW.no_of_elite_seats, NEW.no_of_premium_seats, booking_revenue)
+    ON DUPLICATE KEY UPDATE
+        BOOKINGS = BOOKINGS + 1,
+        ELITE_SEATS = ELITE_SEATS + NEW.no_of_elite_seats,
+        PREMIUM_SEATS = PREMIUM_SEATS + NEW.no_of_premium_seats,
+        REVENUE = REVENUE + booking_revenue;
+
+    INSERT INTO USER_STATS (USER_ID, BOOKINGS)
+    VALUES (NEW.user_id, 1)
+    ON DUPLICATE KEY UPDATE BOOKINGS = BOOKINGS + 1;
+END //
+
+DELIMITER ;
+
+
+--TAKE A DELETED BOOKING BACK OUT OF THE TOTALS
+DELIMITER //
+
+CREATE OR REPLACE TRIGGER after_booking_delete_stats
+AFTER DELETE ON BOOKINGS FOR EACH ROW
+BEGIN
+    DECLARE booking_revenue DECIMAL(12, 2);
+    SET booking_revenue = OLD.seat_total;
+
+    UPDATE MOVIE_STATS
+    SET BOOKINGS = BOOKINGS - 1,
+        ELITE_SEATS = ELITE_SEATS - OLD.no_of_elite_seats,
+        PREMIUM_SEATS = PREMIUM_SEATS - OLD.no_of_premium_seats,
+        REVENUE = REVENUE - booking_revenue
+    WHERE MOVIE_ID = OLD.movie_id;
+
+    UPDATE THEATER_STATS
+    SET BOOKINGS = BOOKINGS - 1,
+        ELITE_SEATS = ELITE_SEATS - OLD.no_of_elite_seats,
+        PREMIUM_SEATS = PREMIUM_SEATS - OLD.no_of_premium_seats,
+        REVENUE = REVENUE - booking_revenue
+    WHERE THEATER_ID = OLD.theater_id;
+
+    UPDATE USER_STATS SET BOOKINGS = BOOKINGS - 1 WHERE USER_ID = OLD.user_id;
+    DELETE FROM USER_STATS WHERE USER_ID = OLD.user_id AND BOOKINGS <= 0;
+END //
+
+DELIMITER ;
+
+
+--RECOMPUTE ALL TOTALS FROM BOOKINGS (FIRST LOAD, OR AFTER verify FINDS DRIFT)
+DELIMITER //
+
+CREATE OR REPLACE PROCEDURE rebuild_dashboard_stats()
+BEGIN
+    DELETE FROM MOVIE_STATS;
+    INSERT INTO MOVIE_STATS (MOVIE_ID, BOOKINGS, ELITE_SEATS, PREMIUM_SEATS, REVENUE)
+    SELECT movie_id, COUNT(*), SUM(no_of_elite_seats), SUM(no_of_premium_seats),
+           SUM(seat_total)
+    FROM BOOKINGS
+    GROUP BY movie_id;
+
+    DELETE FROM THEATER_STATS;
+    INSERT INTO THEATER_STATS (THEATER_ID, BOOKINGS, ELITE_SEATS, PREMIUM_SEATS, REVENUE)
+    SELECT theater_id, COUNT(*), SUM(no_of_elite_seats), SUM(no_of_premium_seats),
+           SUM(seat_total)
+    FROM BOOKINGS
+    GROUP BY theater_id;
+
+    DELETE FROM USER_STATS;
+    INSERT INTO USER_STATS (USER_ID, BOOKINGS)
+    SELECT user_id, COUNT(*)
+    FROM BOOKINGS
+    GROUP BY user_id;
+END //
+
+DELIMITER ;
+
+CALL rebuild_dashboard_stats();
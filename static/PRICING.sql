@@ -0,0 +1,49 @@
+--PRICING ENGINE MIGRATION (RUN ONCE ON AN EXISTING MOVIE DATABASE, THEN RE-RUN AGGREGATES.sql AND TPFC_V2.sql)
+
+
+--SEAT PRICES PER THEATER, SCREEN, SHOW, DAY PART AND WEEKDAY. A NULL COLUMN MATCHES ANY VALUE AND THE
+--MOST SPECIFIC MATCHING ROW WINS (SEE PRICING.py): THE THEATER'S OWN ROWS > CHAIN-WIDE ROWS, THEN SHOW > SCREEN > ANY,
+--THEN DAY PART > WEEKDAY
+CREATE TABLE IF NOT EXISTS PRICE_RULES (
+    RULE_ID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    THEATER_ID INT NULL,
+    SCREEN_ID INT NULL,
+    SHOW_DATE DATE NULL,
+    SHOW_TIME TIME NULL,
+    DAY_PART ENUM('MORNING', 'MATINEE', 'EVENING', 'NIGHT') NULL,
+    DAY_OF_WEEK TINYINT NULL,
+    ELITE_PRICE DECIMAL(8, 2) NOT NULL,
+    PREMIUM_PRICE DECIMAL(8, 2) NOT NULL,
+    KEY idx_price_rules_theater (THEATER_ID),
+    CONSTRAINT chk_price_rules_weekday CHECK (DAY_OF_WEEK BETWEEN 0 AND 6)
+);
+
+--THE OLD FIXED PRICES BECOME THE CHAIN-WIDE DEFAULT
+INSERT INTO PRICE_RULES (ELITE_PRICE, PREMIUM_PRICE)
+SELECT 150, 190 FROM DUAL
+WHERE NOT EXISTS (SELECT 1 FROM PRICE_RULES WHERE THEATER_ID IS NULL AND SCREEN_ID IS NULL AND SHOW_DATE IS NULL
+                  AND SHOW_TIME IS NULL AND DAY_PART IS NULL AND DAY_OF_WEEK IS NULL);
+
+
+--OCCUPANCY SURGE: ONCE MIN_OCCUPANCY OF A SHOW'S SEATS (0 TO 1) ARE SOLD, SEAT PRICES ARE MULTIPLIED BY MULTIPLIER.
+--THE HIGHEST THRESHOLD REACHED APPLIES; THEATER_ID NULL MEANS EVERY THEATER
+CREATE TABLE IF NOT EXISTS SURGE_RULES (
+    RULE_ID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    THEATER_ID INT NULL,
+    MIN_OCCUPANCY DECIMAL(4, 3) NOT NULL,
+    MULTIPLIER DECIMAL(4, 2) NOT NULL,
+    KEY idx_surge_rules_theater (THEATER_ID)
+);
+
+
+--WHAT THE SEATS OF A BOOKING SOLD FOR, BEFORE TAX AND THE BOOKING FEE (PRICE KEEPS THE AMOUNT PAID).
+--REVENUE IS SUM(SEAT_TOTAL); EXISTING BOOKINGS WERE SOLD AT THE OLD FIXED PRICES
+ALTER TABLE BOOKINGS
+    ADD COLUMN IF NOT EXISTS SEAT_TOTAL DECIMAL(10, 2) NULL;
+
+UPDATE BOOKINGS
+SET SEAT_TOTAL = NO_OF_ELITE_SEATS * 150 + NO_OF_PREMIUM_SEATS * 190
+WHERE SEAT_TOTAL IS NULL;
+
+ALTER TABLE BOOKINGS
+    MODIFY SEAT_TOTAL DECIMAL(10, 2) NOT NULL;
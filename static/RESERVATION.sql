@@ -0,0 +1,33 @@
+--RESERVATION ENGINE MIGRATION (RUN ONCE ON AN EXISTING MOVIE DATABASE)
+
+
+--BOOKING ID COMES FROM AUTO_INCREMENT (READ BACK THROUGH lastrowid) INSTEAD OF THE MAX()+1 TRIGGER
+DROP TRIGGER IF EXISTS set_booking_id;
+
+ALTER TABLE BOOKINGS
+    MODIFY BOOKING_ID INT NOT NULL AUTO_INCREMENT;
+
+
+--EVERY BOOKED SEAT CARRIES ITS SHOW SO ONE SEAT CAN BE SOLD ONLY ONCE PER SHOW
+ALTER TABLE SEATS_BOOKED
+    ADD COLUMN THEATER_ID INT NULL,
+    ADD COLUMN SCREEN_ID INT NULL,
+    ADD COLUMN DAY DATE NULL,
+    ADD COLUMN SHOW_TIME TIME NULL;
+
+UPDATE SEATS_BOOKED sb
+JOIN BOOKINGS b ON b.BOOKING_ID = sb.BOOKING_ID
+SET sb.THEATER_ID = b.THEATER_ID,
+    sb.SCREEN_ID = b.SCREEN_ID,
+    sb.DAY = b.DAY,
+    sb.SHOW_TIME = b.SHOW_TIME;
+
+--FAILS IF THE TABLE ALREADY HOLDS DOUBLE-SOLD SEATS, LIST THEM WITH:
+--SELECT THEATER_ID, SCREEN_ID, DAY, SHOW_TIME, SEATS, COUNT(*) FROM SEATS_BOOKED
+--GROUP BY THEATER_ID, SCREEN_ID, DAY, SHOW_TIME, SEATS HAVING COUNT(*) > 1;
+ALTER TABLE SEATS_BOOKED
+    MODIFY THEATER_ID INT NOT NULL,
+    MODIFY SCREEN_ID INT NOT NULL,
+    MODIFY DAY DATE NOT NULL,
+    MODIFY SHOW_TIME TIME NOT NULL,
+    ADD UNIQUE KEY uq_show_seat (THEATER_ID, SCREEN_ID, DAY, SHOW_TIME, SEATS);
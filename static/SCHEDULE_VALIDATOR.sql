@@ -0,0 +1,16 @@
+--SCHEDULE VALIDATOR MIGRATION (RUN ONCE ON AN EXISTING MOVIE DATABASE)
+
+
+--THE 1 HOUR GAP AND DUPLICATE SLOT CHECKS MOVE TO SCHEDULE_VALIDATOR.py, WHICH CHECKS A WHOLE
+--BATCH OF SHOWS AGAINST THE SCHEDULE AT ONCE INSTEAD OF SEVERAL SUB-SELECTS PER INSERTED ROW
+DROP TRIGGER IF EXISTS before_tm_insert_1hour_hibernation;
+DROP TRIGGER IF EXISTS prevent_duplicate_movie;
+DROP TRIGGER IF EXISTS before_tm_insert;
+
+
+--ONE SHOW PER SCREEN AND TIME STAYS ENFORCED BY THE DATABASE (MOVIE_ID IS PART OF THE PRIMARY KEY,
+--SO THE KEY ALONE ALLOWED TWO MOVIES IN ONE SLOT). FAILS IF TM ALREADY HOLDS SUCH PAIRS, LIST THEM WITH:
+--SELECT THEATER_ID, SCREEN_ID, SHOW_DATE, SHOW_TIME, COUNT(*) FROM TM
+--GROUP BY THEATER_ID, SCREEN_ID, SHOW_DATE, SHOW_TIME HAVING COUNT(*) > 1;
+ALTER TABLE TM
+    ADD UNIQUE KEY uq_screen_slot (THEATER_ID, SCREEN_ID, SHOW_DATE, SHOW_TIME);
@@ -0,0 +1,111 @@
+--TPFC VERSION 2: SET-BASED REPLACEMENTS FOR THE CURSOR LOOPS AND DOUBLE-SCAN REVENUE FUNCTIONS IN TPFC.sql
+--SAME NAMES AND RESULT SHAPES, SO USER_BACK.py AND EXISTING CALLERS NEED NO CHANGE
+--REVENUE IS THE SUM OF BOOKINGS.SEAT_TOTAL, THE PRICES ACTUALLY CHARGED (ADDED BY PRICING.sql, RUN THAT FIRST)
+
+CREATE TABLE IF NOT EXISTS SCHEMA_VERSION (
+    MODULE VARCHAR(30) NOT NULL PRIMARY KEY,
+    VERSION INT NOT NULL,
+    APPLIED_AT TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+
+--SUPPORTING INDEXES: EACH REVENUE LOOKUP AND THE DISTINCT USER COUNT BECOME INDEX RANGE SCANS
+DROP INDEX IF EXISTS idx_bookings_movie ON BOOKINGS;
+DROP INDEX IF EXISTS idx_bookings_theater ON BOOKINGS;
+CREATE INDEX IF NOT EXISTS idx_bookings_movie_revenue ON BOOKINGS (movie_id, seat_total);
+CREATE INDEX IF NOT EXISTS idx_bookings_theater_revenue ON BOOKINGS (theater_id, seat_total);
+CREATE INDEX IF NOT EXISTS idx_bookings_user ON BOOKINGS (user_id);
+
+
+--FUNCTION TO RETURN REVENUE OF EACH THEATER (ONE PASS OVER THE THEATER'S BOOKINGS)
+DELIMITER //
+
+CREATE OR REPLACE FUNCTION calculate_theater_revenue(theater_id_param INT)
+RETURNS DECIMAL(10, 2)
+READS SQL DATA
+BEGIN
+    DECLARE total DECIMAL(10, 2);
+
+    SELECT COALESCE(SUM(seat_total), 0) INTO total
+    FROM BOOKINGS
+    WHERE theater_id = theater_id_param;
+
+    RETURN total;
+END //
+
+DELIMITER ;
+
+
+--FUNCTION TO RETURN REVENUE OF EACH MOVIE (ONE PASS OVER THE MOVIE'S BOOKINGS)
+DELIMITER //
+
+CREATE OR REPLACE FUNCTION calculate_movie_revenue(movie_id_param INT)
+RETURNS DECIMAL(10, 2)
+READS SQL DATA
+BEGIN
+    DECLARE total DECIMAL(10, 2);
+
+    SELECT COALESCE(SUM(seat_total), 0) INTO total
+    FROM BOOKINGS
+    WHERE movie_id = movie_id_param;
+
+    RETURN total;
+END //
+
+DELIMITER ;
+
+
+--REVENUE OF EVERY MOVIE / THEATER IN ONE GROUP BY, FOR LISTINGS THAT WOULD OTHERWISE CALL THE FUNCTIONS PER ROW
+CREATE OR REPLACE VIEW MOVIE_REVENUE AS
+SELECT m.MOVIE_ID, m.MOVIE_NAME, m.RDATE, COALESCE(r.total_revenue, 0) AS total_revenue
+FROM MOVIES m
+LEFT JOIN (
+    SELECT movie_id, SUM(seat_total) AS total_revenue
+    FROM BOOKINGS
+    GROUP BY movie_id
+) r ON r.movie_id = m.MOVIE_ID;
+
+CREATE OR REPLACE VIEW THEATER_REVENUE AS
+SELECT t.THEATER_ID, t.THEATER_NAME, t.LOCATION, COALESCE(r.total_price, 0) AS total_price
+FROM THEATERS t
+LEFT JOIN (
+    SELECT theater_id, SUM(seat_total) AS total_price
+    FROM BOOKINGS
+    GROUP BY theater_id
+) r ON r.theater_id = t.THEATER_ID;
+
+
+--ACTIVE USERS: ONE COUNT(DISTINCT) OVER idx_bookings_user INSTEAD OF A FETCH LOOP
+DELIMITER //
+
+CREATE OR REPLACE PROCEDURE active_users()
+BEGIN
+    SELECT CONCAT('Total active users: ', COUNT(DISTINCT user_id)) AS user_count FROM BOOKINGS;
+END//
+
+DELIMITER ;
+
+
+--TOTAL MOVIES
+DELIMITER //
+
+CREATE OR REPLACE PROCEDURE calculate_movie_count()
+BEGIN
+    SELECT COUNT(*) AS movie_count FROM MOVIES;
+END//
+
+DELIMITER ;
+
+
+--TOTAL THEATERS
+DELIMITER //
+
+CREATE OR REPLACE PROCEDURE calculate_theater_count()
+BEGIN
+    SELECT COUNT(*) AS theater_count FROM THEATERS;
+END//
+
+DELIMITER ;
+
+
+REPLACE INTO SCHEMA_VERSION (MODULE, VERSION) VALUES ('TPFC', 2);
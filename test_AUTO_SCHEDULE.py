@@ -0,0 +1,116 @@
+import math
+from datetime import date, timedelta
+
+import pytest
+
+from AUTO_SCHEDULE import AutoScheduler, round_up, shortfall
+from SCHEDULE_VALIDATOR import ScheduleValidator, Show, occupied, show_row
+
+DAY = date(2024, 5, 23)
+H = timedelta(hours=1)
+SCREENS = [(1, 1), (1, 2)]
+
+
+class FakeCatalog:
+    # Movie 1 runs 150 minutes (3h on screen, a 4h slot with the gap), movie 2
+    # runs 90 (2h, 3h), movie 3 runs 60 (1h, 2h)
+    def __init__(self):
+        self.movies = {1: (1, 'A', '', '', '', '', 150), 2: (2, 'B', '', '', '', '', 90), 3: (3, 'C', '', '', '', '', 60)}
+
+    def movie_index(self):
+        return self.movies
+
+    def screen(self, theater_id, screen_id):
+        return (theater_id, screen_id, 10, 10) if (theater_id, screen_id) in SCREENS else None
+
+
+class FakeCursor:
+    # Answers EXISTING_QUERY from the stored shows `tm`
+    def __init__(self, tm):
+        self.tm = tm
+        self.rows = []
+
+    def execute(self, query, params):
+        theater_id, first, last = params
+        self.rows = [row for row in self.tm if row[0] == theater_id and first <= row[3] <= last]
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+
+def plan(targets, tm=(), days=1, screens=SCREENS, **hours):
+    scheduler = AutoScheduler(FakeCatalog(), **hours)
+    return scheduler.plan(FakeCursor(list(tm)), screens, targets, DAY, days)
+
+
+def end(show):
+    # When the movie itself is over
+    return show.show_time + timedelta(hours=math.ceil(FakeCatalog().movies[show.movie_id][6] / 60))
+
+
+def counts(shows):
+    placed = {}
+    for show in shows:
+        placed[show.movie_id, show.show_date] = placed.get((show.movie_id, show.show_date), 0) + 1
+    return placed
+
+
+def test_plan_passes_the_validator():
+    tm = [Show(1, 1, 1, DAY, 12 * H), Show(1, 3, 2, DAY + timedelta(days=1), 20 * H)]
+    shows = plan({1: 3, 2: 4, 3: 2}, tm, days=2)
+    assert shows
+    accepted, errors = ScheduleValidator(FakeCatalog()).validate(FakeCursor(tm), [show_row(show) for show in shows])
+    assert errors == [] and accepted == shows
+
+
+def test_plan_works_around_stored_shows():
+    # Movie 1 at 12:00 holds screen 1 until 16:00, movie 3 at 20:00 holds screen 2 until 22:00
+    tm = [Show(1, 1, 1, DAY, 12 * H), Show(1, 3, 2, DAY, 20 * H)]
+    shows = plan({2: 8}, tm)
+    for stored in tm:
+        stored_end = stored.show_time + occupied(FakeCatalog().movies[stored.movie_id][6])
+        for show in shows:
+            if (show.screen_id, show.show_date) == (stored.screen_id, stored.show_date):
+                assert show.show_time + occupied(90) <= stored.show_time or show.show_time >= stored_end
+    # The screen is used again once the stored show is over
+    assert Show(1, 2, 1, DAY, 16 * H) in shows
+
+
+def test_no_show_runs_past_closing():
+    for closing in (20 * H, 22 * H + timedelta(minutes=30), 24 * H):
+        shows = plan({1: 10, 2: 10, 3: 10}, closing=closing)
+        assert shows and all(end(show) <= closing for show in shows)
+        assert all(show.show_time >= 9 * H for show in shows)
+
+
+def test_show_times_are_on_the_step():
+    step = timedelta(minutes=15)
+    shows = plan({1: 2, 2: 2}, opening=9 * H + timedelta(minutes=10), step=step)
+    assert all(show.show_time % step == timedelta(0) for show in shows)
+    assert min(show.show_time for show in shows) == round_up(9 * H + timedelta(minutes=10), step)
+
+
+def test_targets_met_when_they_fit():
+    targets = {1: 3, 2: 4, 3: 2}
+    shows = plan(targets, days=3)
+    assert shortfall(shows, targets, 3) == {}
+    # Targets are shows per day, and not exceeded
+    assert counts(shows) == {(movie_id, DAY + timedelta(days=n)): count for movie_id, count in targets.items() for n in range(3)}
+
+
+def test_targets_reported_short_when_they_dont():
+    # One screen from 09:00 to 24:00 takes five 3h slots of movie 2 a day
+    targets = {2: 7}
+    shows = plan(targets, days=2, screens=[(1, 1)])
+    assert len(shows) == 10
+    assert shortfall(shows, targets, 2) == {2: 4}
+    # Short movies share what's left: each gets shows before any gets its full target
+    shows = plan({1: 4, 2: 4}, screens=[(1, 1)])
+    short = shortfall(shows, {1: 4, 2: 4}, 1)
+    assert short and sum(short.values()) == 8 - len(shows) and set(counts(shows)) == {(1, DAY), (2, DAY)}
+
+
+def test_unknown_movie():
+    with pytest.raises(ValueError, match="movie 9"):
+        plan({9: 1})
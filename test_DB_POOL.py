@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from DB_POOL import ConnectionPool, PoolTimeout
+
+
+class FakeConn:
+    def __init__(self, number):
+        self.number = number
+        self.alive = True
+        self.in_transaction = False
+        self.rollbacks = 0
+        self.closed = False
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise OSError("MySQL server has gone away")
+
+    def rollback(self):
+        if not self.alive:
+            raise OSError("MySQL server has gone away")
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+class Factory:
+    def __init__(self):
+        self.made = []
+
+    def __call__(self):
+        self.made.append(FakeConn(len(self.made) + 1))
+        return self.made[-1]
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_connections_are_opened_lazily_and_reused():
+    factory = Factory()
+    pool = ConnectionPool(factory, size=2)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn and len(factory.made) == 1
+    assert pool.metrics()['open'] == 1 and pool.metrics()['checkouts'] == 2
+
+
+def test_acquire_times_out_and_counts_waiters():
+    pool = ConnectionPool(Factory(), size=1, timeout=0.3)
+    pool.acquire()
+    errors = []
+
+    def blocked():
+        try:
+            pool.acquire()
+        except PoolTimeout as e:
+            errors.append(e)
+    thread = threading.Thread(target=blocked)
+    thread.start()
+    wait_for(lambda: pool.metrics()['waiters'] == 1)
+    thread.join()
+    assert len(errors) == 1
+    metrics = pool.metrics()
+    assert (metrics['waiters'], metrics['timeouts'], metrics['in_use']) == (0, 1, 1)
+
+
+def test_release_wakes_a_waiter():
+    pool = ConnectionPool(Factory(), size=1, timeout=2.0)
+    conn = pool.acquire()
+    got = []
+    thread = threading.Thread(target=lambda: got.append(pool.acquire()))
+    thread.start()
+    wait_for(lambda: pool.metrics()['waiters'] == 1)
+    pool.release(conn)
+    thread.join()
+    assert got == [conn] and pool.metrics()['waiters'] == 0 and pool.metrics()['wait_max'] > 0
+
+
+def test_leaked_connection_is_reported_once(caplog):
+    pool = ConnectionPool(Factory(), size=3, leak_after=0.01)
+    leaked = pool.acquire()
+    time.sleep(0.02)
+    with caplog.at_level(logging.WARNING, logger='DB_POOL'):
+        pool.release(pool.acquire())
+        pool.release(pool.acquire())
+    assert pool.metrics()['leaks'] == 1
+    assert len(caplog.records) == 1 and 'checked out at' in caplog.records[0].getMessage()
+    # Returning it late doesn't count as another leak
+    pool.release(leaked)
+    assert pool.metrics()['leaks'] == 1
+
+
+def test_ping_replaces_a_broken_idle_connection():
+    factory = Factory()
+    pool = ConnectionPool(factory, size=1, max_idle=0.0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.alive = False
+    fresh = pool.acquire()
+    assert fresh is not conn and conn.closed
+    metrics = pool.metrics()
+    assert (metrics['created'], metrics['discarded'], metrics['open']) == (2, 1, 1)
+
+
+def test_idle_connection_is_not_pinged_before_max_idle():
+    pool = ConnectionPool(Factory(), size=1, max_idle=60.0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.alive = False
+    assert pool.acquire() is conn
+
+
+def test_failed_open_frees_the_slot():
+    def factory():
+        raise OSError("Can't connect to MySQL server")
+    pool = ConnectionPool(factory, size=1)
+    with pytest.raises(OSError):
+        pool.acquire()
+    assert pool.metrics()['open'] == 0
+
+
+def test_release_rolls_back_an_open_transaction():
+    pool = ConnectionPool(Factory(), size=1)
+    conn = pool.acquire()
+    conn.in_transaction = True
+    pool.release(conn)
+    assert conn.rollbacks == 1 and pool.metrics()['idle'] == 1
+
+
+def test_connection_rolls_back_and_returns_when_the_body_raises():
+    pool = ConnectionPool(Factory(), size=1)
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError("bad row")
+    assert conn.rollbacks == 1
+    metrics = pool.metrics()
+    assert (metrics['in_use'], metrics['idle'], metrics['open']) == (0, 1, 1)
+    assert pool.acquire() is conn
+
+
+def test_connection_discards_one_that_cannot_roll_back():
+    pool = ConnectionPool(Factory(), size=1)
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            conn.alive = False
+            raise ValueError("bad row")
+    assert conn.closed
+    metrics = pool.metrics()
+    assert (metrics['in_use'], metrics['idle'], metrics['open'], metrics['discarded']) == (0, 0, 0, 1)
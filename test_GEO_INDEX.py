@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from GEO_INDEX import TheaterGrid, haversine_km
+
+
+def brute_force(points, lat, lon, k, radius_km=None, allowed=None):
+    hits = sorted((float(haversine_km(lat, lon, plat, plon)), theater_id) for theater_id, (plat, plon) in points.items()
+                  if allowed is None or theater_id in allowed)
+    if radius_km is not None:
+        hits = [hit for hit in hits if hit[0] <= radius_km]
+    return hits[:k]
+
+
+def same(got, want):
+    assert [theater_id for _, theater_id in got] == [theater_id for _, theater_id in want]
+    assert [distance for distance, _ in got] == pytest.approx([distance for distance, _ in want])
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_grid_matches_brute_force(seed):
+    rng = random.Random(seed)
+    cell_deg = rng.choice([0.01, 0.05, 0.2])
+    # Clustered around Chennai with a few far outliers, so both the ring walk
+    # and the flat-scan fallback get exercised
+    points = {}
+    for theater_id in range(rng.randint(0, 300)):
+        if rng.random() < 0.9:
+            points[theater_id] = (13.05 + rng.gauss(0, 0.1), 80.22 + rng.gauss(0, 0.1))
+        else:
+            points[theater_id] = (rng.uniform(-60, 60), rng.uniform(-179, 179))
+    grid = TheaterGrid(cell_deg)
+    for theater_id, (lat, lon) in points.items():
+        grid.add(theater_id, lat, lon)
+    # Moves and removals update the grid in place
+    for theater_id in rng.sample(sorted(points), min(20, len(points))):
+        if rng.random() < 0.5:
+            grid.remove(theater_id)
+            del points[theater_id]
+        else:
+            points[theater_id] = (13.05 + rng.gauss(0, 0.2), 80.22 + rng.gauss(0, 0.2))
+            grid.add(theater_id, *points[theater_id])
+
+    for _ in range(25):
+        lat, lon = 13.05 + rng.gauss(0, 0.3), 80.22 + rng.gauss(0, 0.3)
+        k = rng.choice([1, 3, 10, 50, 1000])
+        radius_km = rng.choice([None, None, 2.0, 15.0])
+        allowed = set(rng.sample(sorted(points), len(points) // 2)) if points and rng.random() < 0.3 else None
+        same(grid.nearest(lat, lon, k, radius_km, allowed), brute_force(points, lat, lon, k, radius_km, allowed))
+
+
+def test_grid_empty_and_removed():
+    grid = TheaterGrid()
+    assert grid.nearest(13.0, 80.2, 5) == []
+    grid.add(1, 13.0, 80.2)
+    grid.add(1, 13.5, 80.2)
+    assert grid.cells == {grid._cell(13.5, 80.2): {1: (13.5, 80.2)}}
+    grid.remove(1)
+    grid.remove(1)
+    assert grid.cells == {} and grid.nearest(13.0, 80.2, 5) == []
@@ -0,0 +1,80 @@
+import base64
+
+import pytest
+
+from OCCUPANCY import OccupancyCache, ShowOccupancy
+
+
+def js_is_taken(packed, seat):
+    # BOOKINGS.html's unpackOccupancy(), line for line
+    raw = base64.b64decode(packed)
+    premium = raw[0] | (raw[1] << 8)
+    elite = raw[2] | (raw[3] << 8)
+    kind, number = seat[0], int(seat[5:])
+    n = number - 1
+    if n < 0 or n >= (premium if kind == 'p' else elite):
+        return False
+    i = (0 if kind == 'p' else premium) + n
+    return (raw[4 + (i >> 3)] >> (i & 7)) & 1 == 1
+
+
+def all_seats(premium, elite):
+    return ['pseat%d' % n for n in range(1, premium + 1)] + ['eseat%d' % n for n in range(1, elite + 1)]
+
+
+@pytest.mark.parametrize('premium, elite', [(0, 0), (1, 0), (0, 9), (7, 1), (8, 8), (120, 180), (300, 65535)])
+def test_round_trip(premium, elite):
+    occ = ShowOccupancy(premium, elite)
+    booked = all_seats(premium, elite)[::3]
+    occ.update(booked)
+    back = ShowOccupancy.from_bytes(occ.to_bytes())
+    assert (back.premium, back.elite, back.bits) == (premium, elite, occ.bits)
+    assert list(back.seats()) == booked
+    assert back.booked_count() == len(booked)
+    assert back.available() == premium + elite - len(booked)
+
+
+def test_pack_header_and_layout():
+    occ = ShowOccupancy(300, 2)
+    occ.update(['pseat1', 'pseat9', 'pseat300', 'eseat2'])
+    raw = base64.b64decode(occ.pack())
+    # little-endian uint16 premium and elite counts, then one bit per seat
+    assert raw[:4] == bytes([44, 1, 2, 0])
+    assert len(raw) == 4 + (302 + 7) // 8
+    assert raw[4] == 0b1 and raw[5] == 0b1
+    # premium seat 300 is bit 299, elite seat 2 is bit 301
+    assert raw[4 + 299 // 8] == 1 << (299 % 8) | 1 << (301 % 8)
+
+
+def test_js_decoder_agrees():
+    occ = ShowOccupancy(13, 21)
+    occ.update(['pseat1', 'pseat8', 'pseat13', 'eseat1', 'eseat5', 'eseat21'])
+    packed = occ.pack()
+    for seat in all_seats(13, 21) + ['pseat0', 'pseat14', 'eseat22']:
+        assert js_is_taken(packed, seat) == (seat in set(occ.seats())), seat
+
+
+def test_seats_off_the_screen():
+    occ = ShowOccupancy(2, 2)
+    with pytest.raises(ValueError):
+        occ.set('pseat3')
+    with pytest.raises(ValueError):
+        occ.test('xseat1')
+    occ.update(['pseat3', 'eseat0', 'eseat2'])
+    assert list(occ.seats()) == ['eseat2'] and occ.load_factor() == 0.25
+    assert ShowOccupancy(0, 0).load_factor() == 0.0
+    with pytest.raises(ValueError):
+        ShowOccupancy(8, 1, b'\x00')
+
+
+def test_cache_hands_out_copies():
+    cache, loads = OccupancyCache(), []
+    load = lambda: loads.append(1) or ['pseat1']
+    occ = cache.get('show', (5, 5), load)
+    occ.set('pseat2')
+    assert list(cache.get('show', (5, 5), load).seats()) == ['pseat1'] and len(loads) == 1
+    cache.add('show', ['eseat1'])
+    assert list(cache.get('show', (5, 5), load).seats()) == ['pseat1', 'eseat1']
+    # A new layout reloads
+    cache.get('show', (6, 5), load)
+    assert len(loads) == 2
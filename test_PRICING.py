@@ -0,0 +1,111 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from PRICING import BOOKING_FEE, DEFAULT_PRICES, PricingEngine, TheaterPrices
+
+# 2024-05-23 is a Thursday (weekday 3)
+DAY = date(2024, 5, 23)
+EVENING = timedelta(hours=18)
+
+
+def price(theater_id=None, screen_id=None, show_date=None, show_time=None, part=None, weekday=None, elite='100', premium='200'):
+    return ('PRICE', theater_id, screen_id, show_date, show_time, part, weekday, Decimal(elite), Decimal(premium))
+
+
+def surge(theater_id, threshold, multiplier):
+    return ('SURGE', theater_id, None, None, None, None, None, Decimal(threshold), Decimal(multiplier))
+
+
+def base(rows, screen_id=1, show_date=DAY, show_time=EVENING):
+    return TheaterPrices(rows).base(screen_id, show_date, show_time)
+
+
+def test_no_rules_is_the_old_fixed_prices():
+    assert base([]) == DEFAULT_PRICES
+
+
+def test_more_specific_rules_win():
+    rules = [
+        price(elite='1'),
+        price(weekday=3, elite='2'),
+        price(part='EVENING', elite='3'),
+        price(theater_id=1, elite='4'),
+        price(theater_id=1, screen_id=1, elite='5'),
+        price(theater_id=1, show_date=DAY, elite='6'),
+        price(theater_id=1, show_date=DAY, show_time=EVENING, elite='7'),
+    ]
+    # The order the rows come back in doesn't matter
+    for n in range(len(rules)):
+        assert base(rules[:n + 1])[0] == Decimal(n + 1)
+        assert base(list(reversed(rules[:n + 1])))[0] == Decimal(n + 1)
+
+
+def test_theater_rules_beat_chain_wide_ones():
+    # A chain holiday price doesn't override the theater's own screen price
+    rules = [price(show_date=DAY, show_time=EVENING, elite='1'), price(theater_id=1, screen_id=1, elite='2')]
+    assert base(rules)[0] == Decimal('2')
+    # but still applies on the theater's other screens
+    assert base(rules, screen_id=2)[0] == Decimal('1')
+
+
+def test_rules_that_dont_match_are_skipped():
+    rules = [price(theater_id=1, elite='1'), price(theater_id=1, screen_id=2, elite='2'), price(theater_id=1, part='MORNING', elite='3'),
+             price(theater_id=1, weekday=4, elite='4'), price(theater_id=1, show_date=DAY + timedelta(days=1), elite='5')]
+    assert base(rules)[0] == Decimal('1')
+    assert base(rules, show_time=timedelta(hours=9))[0] == Decimal('3')
+
+
+def test_surge_thresholds():
+    prices = TheaterPrices([surge(None, '0.5', '1.2'), surge(None, '0.9', '1.5'), surge(1, '0.5', '1.1')])
+    assert prices.multiplier(0.0) == 1
+    assert prices.multiplier(0.49) == 1
+    # The theater's own rule wins a tie on the threshold
+    assert prices.multiplier(0.5) == Decimal('1.1')
+    assert prices.multiplier(Decimal('0.899')) == Decimal('1.1')
+    assert prices.multiplier(0.9) == Decimal('1.5')
+    assert prices.multiplier(1) == Decimal('1.5')
+
+
+class FakeCache:
+    def get(self, table, key, load):
+        return load()
+
+
+class FakeCatalog:
+    def __init__(self, rows):
+        self.rows = rows
+        self.cache = FakeCache()
+
+    def query(self, query, params=()):
+        return self.rows
+
+
+def quote(rows, seats, load_factor=0.0):
+    return PricingEngine(FakeCatalog(rows)).quote(1, 1, DAY.isoformat(), '18:00', seats, load_factor)
+
+
+def test_quote_totals():
+    q = quote([price(elite='150', premium='190')], ['eseat1', 'pseat2', 'pseat3'])
+    assert (q.elite_count, q.premium_count) == (1, 2)
+    assert (q.elite_cost, q.premium_cost, q.seat_total) == (Decimal('150.00'), Decimal('380.00'), Decimal('530.00'))
+    assert q.tax == Decimal('95.40')
+    assert q.fee == BOOKING_FEE and q.total == Decimal('650.40')
+
+
+@pytest.mark.parametrize('elite, tax', [('99.99', '18.00'), ('100.03', '18.01'), ('102.75', '18.50')])
+def test_quote_rounds_tax_half_up_to_paise(elite, tax):
+    # 99.99 * 0.18 = 17.9982, 100.03 * 0.18 = 18.0054, 102.75 * 0.18 = 18.495
+    q = quote([price(elite=elite)], ['eseat1'])
+    assert q.tax == Decimal(tax)
+    assert q.total == Decimal(elite) + Decimal(tax) + BOOKING_FEE
+
+
+def test_quote_surge_rounds_seat_prices_to_rupees():
+    rows = [price(elite='150', premium='190'), surge(None, '0.8', '1.15')]
+    # 150 * 1.15 = 172.5 -> 173, 190 * 1.15 = 218.5 -> 219
+    q = quote(rows, ['eseat1', 'pseat2'], load_factor=0.8)
+    assert (q.multiplier, q.elite_price, q.premium_price) == (Decimal('1.15'), Decimal('173'), Decimal('219'))
+    assert q.seat_total == Decimal('392.00')
+    assert quote(rows, ['eseat1'], load_factor=0.79).elite_price == Decimal('150')
@@ -0,0 +1,25 @@
+from datetime import date
+
+import pytest
+
+from SCHEDULE import day_label, parse_day
+
+
+def test_parse_day_iso_and_label():
+    assert parse_day('2024-05-23') == date(2024, 5, 23)
+    assert parse_day('23rd May', today=date(2024, 5, 20)) == date(2024, 5, 23)
+    assert parse_day(day_label(date(2024, 5, 23)), today=date(2024, 5, 23)) == date(2024, 5, 23)
+
+
+def test_parse_day_label_takes_the_year_nearest_the_window():
+    # Followed late in December, an early January label is next year's
+    assert parse_day('2nd January', today=date(2026, 12, 28)) == date(2027, 1, 2)
+    # and early in January a late December one is last year's
+    assert parse_day('30th December', today=date(2027, 1, 2)) == date(2026, 12, 30)
+    assert parse_day('29th February', today=date(2027, 12, 30)) == date(2028, 2, 29)
+
+
+@pytest.mark.parametrize('value', ['garbage', '2024-13-01', '31st April', '5th Smarch', ''])
+def test_parse_day_rejects(value):
+    with pytest.raises(ValueError):
+        parse_day(value, today=date(2024, 5, 23))
@@ -0,0 +1,185 @@
+from datetime import date, timedelta
+
+from SCHEDULE_VALIDATOR import DUPLICATE, NO_MOVIE, NO_SCREEN, NO_SHOW, TOO_CLOSE, ScheduleValidator, ScreenDay, Show, occupied
+
+DAY = date(2024, 5, 23)
+H = timedelta(hours=1)
+
+
+class FakeCatalog:
+    # Movie 1 runs 90 minutes (a 3h slot with the gap), movie 2 runs 60 (2h)
+    def __init__(self):
+        self.movies = {1: (1, 'A', '', '', '', '', 90), 2: (2, 'B', '', '', '', '', 60)}
+
+    def movie_index(self):
+        return self.movies
+
+    def screen(self, theater_id, screen_id):
+        return (theater_id, screen_id, 10, 10) if theater_id == 1 and screen_id in (1, 2) else None
+
+
+class FakeCursor:
+    # Answers EXISTING_QUERY from `tm` and records the writes
+    def __init__(self, tm):
+        self.tm = tm
+        self.rows = []
+        self.queries = []
+        self.written = []
+
+    def execute(self, query, params):
+        self.queries.append(query)
+        theater_id, first, last = params
+        self.rows = [row for row in self.tm if row[0] == theater_id and first <= row[3] <= last]
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def executemany(self, query, rows):
+        self.written.append((query.split()[0], list(rows)))
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, tm):
+        self.cur = FakeCursor(tm)
+        self.committed = self.rolled_back = False
+
+    def cursor(self):
+        return self.cur
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+def show(movie_id, hours, screen_id=1, theater_id=1, day=DAY):
+    return Show(theater_id, movie_id, screen_id, day, timedelta(hours=hours))
+
+
+def row(movie_id, time, screen_id=1, theater_id=1, day=DAY):
+    return (theater_id, movie_id, screen_id, day.isoformat(), time)
+
+
+def validate(tm, rows, originals=None):
+    return ScheduleValidator(FakeCatalog()).validate(FakeCursor(tm), rows, originals)
+
+
+def test_occupied_rounds_up_to_hours_plus_gap():
+    assert occupied(90) == 3 * H
+    assert occupied(60) == 2 * H
+    assert occupied(None) == H
+
+
+def test_screen_day_checks_both_neighbours():
+    day = ScreenDay()
+    day.add(10 * H, 13 * H, 'ten')
+    day.add(16 * H, 19 * H, 'sixteen')
+    # Fits the hole between the two exactly
+    assert day.clash(13 * H, 16 * H) is None
+    # Overlaps the end of the earlier neighbour
+    assert day.clash(12 * H, 14 * H) == 'ten'
+    # Runs into the start of the later neighbour
+    assert day.clash(14 * H, 17 * H) == 'sixteen'
+    assert day.clash(9 * H, 10 * H) is None
+    assert day.clash(9 * H, 11 * H) == 'ten'
+    assert day.clash(19 * H, 20 * H) is None
+
+
+def test_screen_day_remove():
+    day = ScreenDay()
+    day.add(10 * H, 13 * H, 'ten')
+    assert day.remove(11 * H) is None
+    assert day.remove(10 * H) == (10 * H, 13 * H, 'ten')
+    assert day.starts == [] and day.shows == []
+
+
+def test_equal_start_is_duplicate():
+    accepted, errors = validate([show(1, 10)], [row(2, '10:00')])
+    assert accepted == []
+    assert [(e.index, e.message, e.other) for e in errors] == [(0, DUPLICATE, show(1, 10))]
+
+
+def test_gap_under_an_hour_is_too_close():
+    # Movie 1 at 10:00 holds the screen until 13:00
+    accepted, errors = validate([show(1, 10)], [row(2, '12:30'), row(2, '13:00'), row(2, '12:00', screen_id=2)])
+    assert [e.message for e in errors] == [TOO_CLOSE]
+    assert errors[0].index == 0
+    assert accepted == [show(2, 13), show(2, 12, screen_id=2)]
+    # A new show must also leave the gap before a stored one
+    accepted, errors = validate([show(1, 10)], [row(2, '08:30'), row(2, '08:00')])
+    assert [(e.index, e.message) for e in errors] == [(0, TOO_CLOSE)]
+    assert accepted == [show(2, 8)]
+
+
+def test_batch_rows_are_taken_in_order():
+    accepted, errors = validate([], [row(1, '10:00'), row(2, '11:00'), row(2, '13:00'), row(1, '10:00')])
+    assert accepted == [show(1, 10), show(2, 13)]
+    assert [(e.index, e.message) for e in errors] == [(1, TOO_CLOSE), (3, DUPLICATE)]
+
+
+def test_unknown_movie_screen_and_bad_rows():
+    accepted, errors = validate([], [row(9, '10:00'), row(1, '10:00', screen_id=5), row(1, '25:00'), (1, 2)])
+    assert accepted == []
+    assert [e.message for e in errors[:2]] == [NO_MOVIE, NO_SCREEN]
+    assert all(e.message.startswith("invalid row") for e in errors[2:])
+
+
+def test_edit_may_keep_or_shift_its_own_slot():
+    tm = [show(1, 10), show(2, 14)]
+    # Same slot, other movie: the show being edited doesn't block itself
+    accepted, errors = validate(tm, [row(2, '10:00')], [(1, 1, DAY.isoformat(), '10:00:00')])
+    assert accepted == [show(2, 10)] and errors == []
+    # Moving 10:00 to 11:00 only clears 14:00 because the 10:00 show leaves
+    accepted, errors = validate(tm, [row(1, '11:00')], [(1, 1, DAY.isoformat(), '10:00')])
+    assert accepted == [show(1, 11)] and errors == []
+
+
+def test_edit_restores_its_show_when_rejected():
+    tm = [show(1, 10), show(2, 14)]
+    rows = [row(1, '13:00'), row(2, '10:00', screen_id=2), row(2, '12:00')]
+    originals = [(1, 1, DAY.isoformat(), '10:00'), None, None]
+    accepted, errors = validate(tm, rows, originals)
+    # 13:00 runs into the 14:00 show, so the 10:00 show stays and still blocks 12:00
+    assert accepted == [show(2, 10, screen_id=2)]
+    assert [(e.index, e.message, e.other) for e in errors] == [(0, TOO_CLOSE, show(2, 14)), (2, TOO_CLOSE, show(1, 10))]
+
+
+def test_edit_of_a_missing_show():
+    accepted, errors = validate([show(1, 10)], [row(1, '18:00'), row(1, '20:00')],
+                                [(1, 1, DAY.isoformat(), '11:00'), (1, 1, DAY.isoformat(), '10:00')])
+    assert accepted == [show(1, 20)]
+    assert [(e.index, e.message) for e in errors] == [(0, NO_SHOW)]
+    # Two edits of one show: the second finds it gone
+    accepted, errors = validate([show(1, 10)], [row(1, '18:00'), row(1, '20:00')], [(1, 1, DAY.isoformat(), '10:00')] * 2)
+    assert [(e.index, e.message) for e in errors] == [(1, NO_SHOW)]
+
+
+def test_edit_reads_the_original_day():
+    # Moving a show to another day still finds (and frees) the original
+    tm = [show(1, 10, theater_id=1, day=DAY + timedelta(days=1))]
+    accepted, errors = validate(tm, [row(1, '10:00', screen_id=2)], [(1, 1, (DAY + timedelta(days=1)).isoformat(), '10:00')])
+    assert accepted == [show(1, 10, screen_id=2)] and errors == []
+
+
+def test_commit_updates_edits_and_inserts_new_shows():
+    conn = FakeConn([show(1, 10)])
+    accepted, errors = ScheduleValidator(FakeCatalog()).commit(conn, [row(2, '10:00'), row(1, '18:00')],
+                                                              [(1, 1, DAY.isoformat(), '10:00:00'), None])
+    assert errors == [] and conn.committed
+    assert [query.endswith('FOR UPDATE') for query in conn.cur.queries] == [True]
+    assert conn.cur.written == [
+        ('UPDATE', [(1, 2, 1, '2024-05-23', '10:00:00', 1, 1, '2024-05-23', '10:00:00')]),
+        ('INSERT', [(1, 1, 1, '2024-05-23', '18:00:00')]),
+    ]
+
+
+def test_commit_all_or_nothing():
+    conn = FakeConn([show(1, 10)])
+    accepted, errors = ScheduleValidator(FakeCatalog()).commit(conn, [row(2, '18:00'), row(2, '11:00')], all_or_nothing=True)
+    assert accepted == [] and len(errors) == 1
+    assert conn.rolled_back and conn.cur.written == []
@@ -0,0 +1,180 @@
+import contextlib
+import io
+from datetime import date, timedelta
+
+import mysql.connector
+import pytest
+
+from SCHEDULE_VALIDATOR import DUPLICATE, RowError, Show
+from TM_BULK import import_schedule, json_values, print_report, read_rows
+
+CHUNKS = (1, 2, 3, 65536)
+CLASH = Show(1, 9, 1, date(2024, 5, 23), timedelta(hours=10))
+
+
+def values(text, chunk_size):
+    return list(json_values(io.StringIO(text), chunk_size))
+
+
+@pytest.mark.parametrize('chunk_size', CHUNKS)
+def test_json_array_across_chunk_boundaries(chunk_size):
+    text = ' [ {"a": [1, 2]}, 3.5, -10, "x,]y", true, null, 1e3 ]\n'
+    assert values(text, chunk_size) == [{'a': [1, 2]}, 3.5, -10, 'x,]y', True, None, 1000.0]
+
+
+@pytest.mark.parametrize('chunk_size', CHUNKS)
+def test_json_lines_across_chunk_boundaries(chunk_size):
+    # A number cut off at '3.' or '12' must not be taken as a whole value
+    assert values('{"a": 1}\n3.25\n\n120\n[1, 2]', chunk_size) == [{'a': 1}, 3.25, 120, [1, 2]]
+    assert values('', chunk_size) == []
+    assert values('[]', chunk_size) == []
+
+
+@pytest.mark.parametrize('chunk_size', CHUNKS)
+@pytest.mark.parametrize('text', ['[1, 2', '[1, {"a": 1]', '{"a": 1', '1 2x', '[1]garbage', '[1] [2]', '[1]\n]'])
+def test_json_bad_or_truncated(text, chunk_size):
+    with pytest.raises(ValueError):
+        values(text, chunk_size)
+
+
+@pytest.mark.parametrize('chunk_size', CHUNKS)
+def test_json_values_before_an_error_are_yielded(chunk_size):
+    decoded = json_values(io.StringIO('[1, 2] x'), chunk_size)
+    assert next(decoded) == 1 and next(decoded) == 2
+    with pytest.raises(ValueError):
+        next(decoded)
+
+
+def rows(text, fmt='csv'):
+    return list(read_rows(io.BytesIO(text.encode('utf-8')), fmt))
+
+
+def test_csv_header_any_order_case_and_bom():
+    text = '﻿Show_Time, theater_id,MOVIE_ID,screen_id,show_date,movie_name\n10:00,1,2,3,2024-05-23,A\n'
+    assert rows(text) == [(1, ('1', '2', '3', '2024-05-23', '10:00'), None)]
+
+
+def test_csv_header_missing_columns():
+    with pytest.raises(ValueError, match='movie_id, show_time'):
+        rows('theater_id,screen_id,show_date\n1,2,2024-05-23\n')
+    with pytest.raises(ValueError):
+        rows('')
+
+
+def test_csv_short_and_blank_rows():
+    text = 'theater_id,movie_id,screen_id,show_date,show_time\n1,2,3,2024-05-23,10:00\n\n , \n1,2,3\n1,2,3,2024-05-23,11:00,extra\n'
+    assert rows(text) == [
+        (1, ('1', '2', '3', '2024-05-23', '10:00'), None),
+        (4, ['1', '2', '3'], "expected 5 columns, got 3"),
+        (5, ('1', '2', '3', '2024-05-23', '11:00'), None),
+    ]
+
+
+def test_json_rows():
+    text = '[{"THEATER_ID": 1, "movie_id": 2, "screen_id": 3, "show_date": "2024-05-23", "show_time": "10:00"},' \
+           ' {"theater_id": 1, "movie_id": ""}, [1, 2, 3, "2024-05-23", "11:00"], [1, 2], 7]'
+    numbers = [(number, problem) for number, _, problem in rows(text, 'json')]
+    assert numbers[0] == (1, None) and numbers[2] == (3, None)
+    assert numbers[1] == (2, "missing movie_id, screen_id, show_date, show_time")
+    assert [number for number, problem in numbers if problem and problem.startswith('expected')] == [4, 5]
+
+
+class FakeConn:
+    def __init__(self):
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakePool:
+    def __init__(self):
+        self.conn = FakeConn()
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield self.conn
+
+
+class FakeValidator:
+    # Rejects rows whose movie id is 0, and raises IntegrityError for the first `races` commits
+    def __init__(self, races=0):
+        self.races = races
+        self.chunks = []
+
+    def commit(self, conn, rows):
+        self.chunks.append(len(rows))
+        if self.races:
+            self.races -= 1
+            raise mysql.connector.IntegrityError("Duplicate entry for key 'uq_screen_slot'")
+        accepted, errors = [], []
+        for index, row in enumerate(rows):
+            if row[1] == '0':
+                errors.append(RowError(index, row, "MOVIE DOESN'T EXIST.", CLASH))
+            else:
+                accepted.append(row)
+        return accepted, errors
+
+
+def csv_rows(movies):
+    # One 10:00 show per movie id; None makes a short row
+    lines = ['1,%s,1,2024-05-23,10:00\n' % movie if movie is not None else '1,2\n' for movie in movies]
+    text = 'theater_id,movie_id,screen_id,show_date,show_time\n' + ''.join(lines)
+    return read_rows(io.BytesIO(text.encode('utf-8')), 'csv')
+
+
+def test_import_report_in_chunks():
+    validator = FakeValidator()
+    report = import_schedule(FakePool(), validator, csv_rows(['1', '0', '2', None, '3', '0', '4']), chunk_size=2)
+    assert validator.chunks == [2, 2, 2]
+    assert (report['rows'], report['inserted'], report['rejected']) == (7, 4, 3)
+    assert [error['row'] for error in report['errors']] == [2, 4, 6]
+    assert report['errors'][0]['conflicts_with'] == [1, 9, 1, '2024-05-23', '10:00:00']
+    assert report['errors'][1]['error'] == "expected 5 columns, got 2" and 'file_error' not in report
+
+
+def test_import_keeps_only_max_errors():
+    report = import_schedule(FakePool(), FakeValidator(), csv_rows(['0'] * 5), max_errors=2)
+    assert report['rejected'] == 5 and len(report['errors']) == 2
+
+
+def test_import_file_error_keeps_earlier_rows():
+    stream = io.BytesIO(b'[[1, 1, 1, "2024-05-23", "10:00"], [1, 2, 1, "2024-05-23", "13:00"], [1, 3')
+    report = import_schedule(FakePool(), FakeValidator(), read_rows(stream, 'json'))
+    assert report['inserted'] == 2 and report['file_error'] == "bad or truncated JSON"
+
+
+def test_import_retries_a_chunk_that_lost_a_slot_race():
+    pool, validator = FakePool(), FakeValidator(races=1)
+    report = import_schedule(pool, validator, csv_rows(['1', '2', '3']), chunk_size=2)
+    assert validator.chunks == [2, 2, 1] and pool.conn.rollbacks == 1
+    assert report['inserted'] == 3 and report['rejected'] == 0
+
+
+def test_import_rejects_a_chunk_that_keeps_losing():
+    pool, validator = FakePool(), FakeValidator(races=2)
+    report = import_schedule(pool, validator, csv_rows(['1', '2', '3']), chunk_size=2)
+    assert (report['inserted'], report['rejected']) == (1, 2)
+    assert [(error['row'], error['error']) for error in report['errors']] == [(1, DUPLICATE), (2, DUPLICATE)]
+
+
+def test_import_database_errors_are_not_file_errors():
+    class Broken(FakeValidator):
+        def commit(self, conn, rows):
+            raise ValueError("not a file problem")
+
+    with pytest.raises(ValueError, match="not a file problem"):
+        import_schedule(FakePool(), Broken(), csv_rows(['1']))
+
+
+def test_report_lines_for_any_json_value():
+    # Scalars and objects that aren't rows are reported as JSON, lists as fields
+    stream = io.BytesIO(b'5\n"x"\n{"theater_id": 1}\n[1, 2]\n[1, "0", 1, "2024-05-23", "10:00"]\n')
+    report = import_schedule(FakePool(), FakeValidator(), read_rows(stream, 'json'))
+    out, err = io.StringIO(), io.StringIO()
+    print_report(report, out, err)
+    lines = err.getvalue().splitlines()
+    assert [line.split(' ', 2)[:2] for line in lines] == [['row', '%d:' % n] for n in range(1, 6)]
+    assert lines[0].endswith(' 5') and lines[1].endswith(' "x"') and lines[2].endswith(' {"theater_id": 1}')
+    assert lines[3].endswith(' 1,2') and lines[4] == "row 5: MOVIE DOESN'T EXIST. 1,0,1,2024-05-23,10:00"
+    assert out.getvalue() == "5 rows, 0 inserted, 5 rejected\n"
@@ -0,0 +1,139 @@
+import mysql.connector
+import pytest
+
+import USER_BACK
+from DB_POOL import ConnectionPool
+from RESERVATION import SeatConflict
+from SEAT_HOLDS import MemoryHoldStore, show_key
+
+SHOW = show_key(1, 2, '2024-05-23', '13:00:00')
+SEATS = ['pseat1', 'eseat4']
+PROFILE = (7, 'Asha', 'asha@example.com', '9999999999', 'ADYAR', 'secret', 'USER')
+
+
+class FakeCursor:
+    def __init__(self):
+        self.rows = []
+
+    def execute(self, query, params=()):
+        self.rows = [PROFILE] if 'FROM users' in query and params[0] == PROFILE[2] else []
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    in_transaction = False
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor()
+
+    def ping(self, reconnect=False):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCatalog:
+    def movie(self, movie_id):
+        return (movie_id, 'M', 'Drama', '8.1', 'd', 'http://img', 120, None)
+
+    def theater(self, theater_id):
+        return (theater_id, 'T', 'ADYAR')
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(USER_BACK, 'db_pool', ConnectionPool(FakeConn, size=2, timeout=1.0))
+    monkeypatch.setattr(USER_BACK, 'hold_store', MemoryHoldStore())
+    monkeypatch.setattr(USER_BACK, 'catalog', FakeCatalog())
+    return USER_BACK.app.test_client()
+
+
+def sid(client):
+    cookie = client.get_cookie(USER_BACK.app.config['SESSION_COOKIE_NAME'])
+    return cookie.value if cookie else None
+
+
+def checkout(client):
+    # The session /bookings and /proceed leave behind for pay()
+    with client.session_transaction() as session:
+        session.update({'id': 7, 'email': PROFILE[2], 'mv_s': 3, 'th_s': '1', 'sc_s': '2', 'date_iso': '2024-05-23',
+                        'ti_s': '13:00:00', 'se_s': SEATS, 'p_count': 1, 'e_count': 1, 'price': 425.0, 'seat_total': 340})
+    assert USER_BACK.hold_store.hold(SHOW, SEATS, 7) == []
+
+
+def test_failed_purchase_keeps_the_holds(client, monkeypatch):
+    checkout(client)
+
+    def reserve_seats(*args):
+        raise mysql.connector.errors.OperationalError("Lost connection to MySQL server during query")
+    monkeypatch.setattr(USER_BACK, 'reserve_seats', reserve_seats)
+
+    assert client.get('/pay').status_code == 500
+    assert USER_BACK.hold_store.held(SHOW) == set(SEATS)
+    # Nobody else can take the seats while the user retries
+    assert USER_BACK.hold_store.hold(SHOW, ['pseat1'], 8) == ['pseat1']
+
+
+def test_purchase_drops_the_holds_after_booking(client, monkeypatch):
+    checkout(client)
+    booked = []
+
+    def reserve_seats(conn, user_id, movie, theater, screen, day, time, seats, *rest):
+        # Still held while the booking is written
+        assert USER_BACK.hold_store.held(SHOW, exclude_owner=8) == set(SEATS)
+        booked.append(seats)
+    monkeypatch.setattr(USER_BACK, 'reserve_seats', reserve_seats)
+
+    assert client.get('/pay').status_code == 200
+    assert booked == [SEATS] and USER_BACK.hold_store.held(SHOW) == set()
+
+
+def test_seat_conflict_releases_the_holds(client, monkeypatch):
+    checkout(client)
+
+    def reserve_seats(*args):
+        raise SeatConflict(['eseat4'])
+    monkeypatch.setattr(USER_BACK, 'reserve_seats', reserve_seats)
+
+    response = client.get('/pay')
+    assert response.status_code == 302 and 'conflict=eseat4' in response.headers['Location']
+    assert USER_BACK.hold_store.held(SHOW) == set()
+
+
+def test_login_issues_a_fresh_session_id(client):
+    # An id planted before login (here: one the attacker got by visiting the site)
+    with client.session_transaction() as session:
+        session['location'] = 'ADYAR'
+    planted = sid(client)
+    assert planted and USER_BACK.app.session_interface.load(planted)
+
+    assert client.post('/check', data={'emaill': PROFILE[2], 'passwordl': 'secret'}).status_code == 200
+    fresh = sid(client)
+    assert fresh and fresh != planted
+    # The planted id is gone, the new one is signed in
+    assert USER_BACK.app.session_interface.load(planted) == {}
+    assert USER_BACK.app.session_interface.load(fresh)['id'] == 7
+
+
+def test_failed_login_keeps_the_session_id(client):
+    with client.session_transaction() as session:
+        session['location'] = 'ADYAR'
+    before = sid(client)
+    client.post('/check', data={'emaill': PROFILE[2], 'passwordl': 'wrong'})
+    assert sid(client) == before